@@ -0,0 +1,123 @@
+"""
+Compare the hot flow queries on direct Postgres and on Supabase (PostgREST).
+
+    python -m app.db.benchmark --station TST --iterations 50 --batch-size 100
+
+Each repository runs the per-station latest-lines lookup, a 24h history
+at 15 minute buckets and a batch insert. Inserted rows are dated
+2000-01-01 on a BENCH line, so they never replace a real station-line's
+latest, and are deleted afterwards with the flow_latest row they create.
+"""
+import argparse
+import logging
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from sqlalchemy import text
+
+from app.db.database import engine, get_supabase
+from app.db.repository import PostgresFlowRepository, RepositoryUnavailable, SupabaseFlowRepository
+
+BENCHMARK_TIMESTAMP = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def time_calls(call: Callable[[], object], iterations: int) -> Dict[str, float]:
+    """Mean, p50 and p95 latency in ms; the first (warm-up) call is not counted."""
+    call()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def insert_payload(station_code: str, batch_size: int) -> List[Dict]:
+    return [
+        {
+            "station_code": station_code,
+            "line_code": "BENCH",
+            "timestamp": (BENCHMARK_TIMESTAMP + timedelta(seconds=i)).isoformat(),
+            "next_train_minutes": 3.0,
+            "train_frequency": 4.0,
+            "crowding_level": "low",
+            "is_delay": False,
+        }
+        for i in range(batch_size)
+    ]
+
+
+def delete_benchmark_rows(station_code: str) -> None:
+    cutoff = BENCHMARK_TIMESTAMP + timedelta(days=1)
+    try:
+        with engine.begin() as conn:
+            for table in ("flow_data", "flow_latest"):
+                conn.execute(
+                    text(f"DELETE FROM {table} WHERE station_code = :code AND line_code = 'BENCH' AND timestamp < :cutoff"),
+                    {"code": station_code, "cutoff": cutoff},
+                )
+    except Exception:
+        supabase = get_supabase()
+        if supabase:
+            for table in ("flow_data", "flow_latest"):
+                (
+                    supabase.table(table).delete()
+                    .eq("station_code", station_code)
+                    .eq("line_code", "BENCH")
+                    .lt("timestamp", cutoff.isoformat())
+                    .execute()
+                )
+
+
+def run_benchmark(repo, station_code: str, iterations: int, batch_size: int) -> Dict[str, Dict[str, float]]:
+    end_time = datetime.now(timezone.utc)
+    start_time = end_time - timedelta(hours=24)
+    payload = insert_payload(station_code, batch_size)
+    return {
+        "latest_lines": time_calls(lambda: repo.latest_lines(station_code), iterations),
+        "history": time_calls(lambda: repo.history(station_code, start_time, end_time, 900), iterations),
+        "insert_rows": time_calls(lambda: repo.insert_rows("flow_data", payload), iterations),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time flow queries on direct Postgres vs Supabase.")
+    parser.add_argument("--station", default="TST", help="Station code to query (default: TST)")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed calls per query")
+    parser.add_argument("--batch-size", type=int, default=100, help="Rows per insert batch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+
+    repos = [PostgresFlowRepository(retry_seconds=0)]
+    try:
+        repos.append(SupabaseFlowRepository(get_supabase()))
+    except RepositoryUnavailable:
+        print("Supabase client not configured, timing Postgres only")
+
+    try:
+        for repo in repos:
+            try:
+                results = run_benchmark(repo, args.station, args.iterations, args.batch_size)
+            except RepositoryUnavailable as e:
+                print(f"{repo.name}: unavailable ({e})")
+                continue
+            for query, stats in results.items():
+                print(
+                    f"{repo.name:<9} {query:<12} mean {stats['mean']:8.2f} ms  "
+                    f"p50 {stats['p50']:8.2f} ms  p95 {stats['p95']:8.2f} ms"
+                )
+    finally:
+        delete_benchmark_rows(args.station)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
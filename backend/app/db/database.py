@@ -2,8 +2,10 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+from typing import Optional
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import AsyncClient, AsyncClientOptions, acreate_client, create_client, Client
 
 load_dotenv()
 
@@ -11,11 +13,37 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_PUBLISHABLE_KEY")
 
+# Connection pool of the async client shared by all requests of a worker.
+# Requests beyond the pool size wait (up to the pool timeout) for a free
+# connection without holding a thread.
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "100"))
+SUPABASE_POOL_KEEPALIVE = int(os.getenv("SUPABASE_POOL_KEEPALIVE", "20"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+SUPABASE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "5"))
+SUPABASE_POOL_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_POOL_TIMEOUT_SECONDS", "30"))
+
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
+# Pool behind the direct Postgres repository (app.db.repository) and the
+# batch jobs. Connections are checked before use and recycled, so ones
+# dropped by the server or a pooler are replaced instead of failing a query.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+
 # SQLAlchemy setup
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=True,
+    connect_args={"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS},
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -29,6 +57,41 @@ if SUPABASE_URL and SUPABASE_KEY:
         print(f"Warning: Failed to initialize Supabase client: {e}")
         supabase = None
 
+# Async Supabase client for request handlers, opened in the app lifespan.
+# Background jobs running in threads keep using the sync client above.
+async_supabase: Optional[AsyncClient] = None
+
+async def open_async_supabase() -> None:
+    global async_supabase
+    if async_supabase is not None or not (SUPABASE_URL and SUPABASE_KEY):
+        return
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_SIZE,
+            max_keepalive_connections=SUPABASE_POOL_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(
+            SUPABASE_TIMEOUT_SECONDS,
+            connect=SUPABASE_CONNECT_TIMEOUT_SECONDS,
+            pool=SUPABASE_POOL_TIMEOUT_SECONDS,
+        ),
+        follow_redirects=True,
+    )
+    try:
+        async_supabase = await acreate_client(
+            SUPABASE_URL, SUPABASE_KEY, options=AsyncClientOptions(httpx_client=http_client)
+        )
+    except Exception as e:
+        print(f"Warning: Failed to initialize async Supabase client: {e}")
+        await http_client.aclose()
+
+async def close_async_supabase() -> None:
+    global async_supabase
+    if async_supabase is not None:
+        # Closes the shared connection pool
+        await async_supabase.postgrest.aclose()
+        async_supabase = None
+
 def get_db():
     """Dependency for database sessions"""
     db = SessionLocal()
@@ -40,3 +103,7 @@ def get_db():
 def get_supabase():
     """Dependency for Supabase client"""
     return supabase
+
+def get_async_supabase():
+    """Dependency for the pooled async Supabase client"""
+    return async_supabase
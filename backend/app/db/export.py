@@ -0,0 +1,139 @@
+"""
+Streaming bulk export of flow tables.
+
+Rows are read through a server-side (named) cursor, so Postgres hands them
+over in batches as the scan progresses: the first bytes go out before the
+query finishes and memory stays flat regardless of the range size.
+
+The connection is opened and the query started before the response goes
+out, so a database failure is reported as an error status instead of a
+200 with a truncated body; only fetching happens while streaming.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+from app.db.database import engine
+from app.db.repository import RepositoryUnavailable
+
+EXPORT_COLUMNS = [
+    "id",
+    "station_code",
+    "line_code",
+    "timestamp",
+    "next_train_minutes",
+    "train_frequency",
+    "crowding_level",
+    "is_delay",
+]
+EXPORT_TABLES = ("flow_data", "training_flow_data")
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 5000
+# Flush to the client once this many bytes are buffered
+CHUNK_BYTES = 64 * 1024
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_rows(rows, fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps({col: _format_value(val) for col, val in zip(EXPORT_COLUMNS, row)}) + "\n"
+            for row in rows
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([[_format_value(val) for val in row] for row in rows])
+    return buffer.getvalue()
+
+
+def stream_export(
+    table: str,
+    fmt: str = "csv",
+    compress: bool = False,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    station_code: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    Start the export of `table` and return an iterator over it as CSV (with
+    header) or NDJSON, optionally gzipped. Raises RepositoryUnavailable if
+    the connection or the query fails.
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unsupported table: {table}")
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    conditions = []
+    params = {}
+    if start_time:
+        conditions.append("timestamp >= %(start_time)s")
+        params["start_time"] = start_time
+    if end_time:
+        conditions.append("timestamp < %(end_time)s")
+        params["end_time"] = end_time
+    if station_code:
+        conditions.append("station_code = %(station_code)s")
+        params["station_code"] = station_code
+
+    query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY timestamp, id"
+
+    try:
+        conn = engine.raw_connection()
+    except Exception as e:
+        raise RepositoryUnavailable(str(e)) from e
+    try:
+        # Named cursors live inside a transaction, closed by the rollback in _stream
+        cur = conn.cursor(name=f"export_{table}")
+        cur.itersize = FETCH_SIZE
+        cur.execute(query, params)
+    except Exception as e:
+        conn.close()
+        raise RepositoryUnavailable(str(e)) from e
+
+    return _stream(conn, cur, fmt, compress)
+
+
+def _stream(conn, cur, fmt: str, compress: bool) -> Iterator[bytes]:
+    # gzip container (wbits=31) so the output is a regular .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    try:
+        with cur:
+            pending = []
+            if fmt == "csv":
+                pending.append(emit(",".join(EXPORT_COLUMNS) + "\n"))
+
+            while True:
+                rows = cur.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                pending.append(emit(_encode_rows(rows, fmt)))
+                if sum(len(part) for part in pending) >= CHUNK_BYTES:
+                    yield b"".join(pending)
+                    pending = []
+
+            if compressor:
+                pending.append(compressor.flush())
+            if pending:
+                yield b"".join(pending)
+        conn.rollback()
+    finally:
+        conn.close()
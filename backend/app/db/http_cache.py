@@ -0,0 +1,57 @@
+"""
+HTTP conditional caching for read endpoints.
+
+Responses served from in-memory state carry a strong ETag derived from
+the version of that state (collector cycle, forecast version, station
+registry contents), so a matching If-None-Match is answered with 304
+before any database or upstream work. Cache-Control lets the browser or
+a CDN reuse the body until the next version is due.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over the version parts of a representation."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison: a W/ prefix is ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def cache_control(max_age: float, stale_while_revalidate: float = 0) -> str:
+    value = f"public, max-age={max(0, int(max_age))}"
+    if stale_while_revalidate > 0:
+        value += f", stale-while-revalidate={int(stale_while_revalidate)}"
+    return value
+
+
+def not_modified(
+    request: Request,
+    response: Response,
+    *version: Any,
+    max_age: float,
+    stale_while_revalidate: float = 0,
+) -> Optional[Response]:
+    """
+    Set ETag and Cache-Control for `version` on `response`. Returns a 304
+    response to send instead if the client already holds this version.
+    """
+    headers = {
+        "ETag": make_etag(request.url.path, request.url.query, *version),
+        "Cache-Control": cache_control(max_age, stale_while_revalidate),
+    }
+    response.headers.update(headers)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return None
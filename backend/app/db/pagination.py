@@ -0,0 +1,64 @@
+"""
+Opaque keyset cursors for list endpoints.
+
+A cursor encodes the sort key of the last row of a page; the next page is
+everything strictly after it, which Postgres serves as an index range scan
+no matter how deep into the listing the client is.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, List
+
+# List endpoints keep returning plain JSON arrays; the cursor for the
+# following page travels in this header (absent on the last page).
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """An ISO-8601 timestamp string; one without an offset is taken as UTC."""
+    if not isinstance(value, str):
+        raise TypeError("timestamp must be a string")
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _integer(value: Any) -> int:
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError("id must be an integer")
+    return value
+
+
+def _string(value: Any) -> str:
+    if not isinstance(value, str):
+        raise TypeError("key must be a string")
+    return value
+
+
+# Cursor values are client input: each is parsed to its type, and only the
+# parsed value ever reaches a query filter
+CURSOR_PARSERS = {datetime: parse_timestamp, int: _integer, str: _string}
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> List[Any]:
+    """Decode a cursor into one value of each of `types` (datetime, int or str)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidCursor("Malformed cursor")
+    try:
+        return [CURSOR_PARSERS[kind](value) for kind, value in zip(types, values)]
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
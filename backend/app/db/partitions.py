@@ -0,0 +1,238 @@
+"""
+Daily range partitions of flow_data and training_flow_data.
+
+The tables are partitioned by timestamp (migrations/007). The manager
+keeps partitions created a few days ahead, so inserts always have a
+partition to land in, and retention detaches and drops whole expired
+partitions: constant time, no row deletes, no bloat left behind.
+
+Rows for a day without a partition land in the DEFAULT partition
+(<table>_default). It is empty unless maintenance fell behind; such rows
+are moved into their day's partition when it is created.
+"""
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.db.database import engine
+from app.db.repository import RepositoryUnavailable
+
+logger = logging.getLogger(__name__)
+
+PARTITION_DAYS_AHEAD = int(os.getenv("PARTITION_DAYS_AHEAD", "7"))
+PARTITION_MAINTENANCE_SECONDS = float(os.getenv("PARTITION_MAINTENANCE_SECONDS", "3600"))
+PARTITIONED_TABLES = ("flow_data", "training_flow_data")
+# DDL on the parent waits for running queries; give up rather than stall
+# every insert queued behind it
+LOCK_TIMEOUT = "5s"
+
+LIST_PARTITIONS = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+"""
+BOUND_PATTERN = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+class NotPartitioned(Exception):
+    """The table has not been converted by migrations/007 yet."""
+
+
+def _bound(value: str) -> Optional[datetime]:
+    """A partition bound literal; None for MINVALUE/MAXVALUE."""
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'")).astimezone(timezone.utc)
+
+
+def partition_name(table: str, day: datetime) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+class PartitionManager:
+    def __init__(
+        self,
+        days_ahead: int = PARTITION_DAYS_AHEAD,
+        interval: float = PARTITION_MAINTENANCE_SECONDS,
+    ) -> None:
+        self.days_ahead = days_ahead
+        self.interval = interval
+        self.created = 0
+        self.dropped = 0
+        self.last_run_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def stats(self) -> Dict:
+        return {
+            "created": self.created,
+            "dropped": self.dropped,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+    @staticmethod
+    def _partitions(cur, table: str) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+        """(name, lower, upper) of each partition; None bounds are unbounded."""
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", (table,))
+        if cur.fetchone()[0] != "p":
+            raise NotPartitioned(f"{table} is not partitioned; apply migrations/007_partition_flow_tables.sql")
+
+        # Bounds print in the session time zone
+        cur.execute("SET LOCAL TimeZone = 'UTC'")
+        cur.execute(LIST_PARTITIONS, (table,))
+        partitions = []
+        for name, bound in cur.fetchall():
+            match = BOUND_PATTERN.search(bound)
+            if match:
+                partitions.append((name, _bound(match.group(1)), _bound(match.group(2))))
+        return partitions
+
+    @staticmethod
+    def _connect():
+        try:
+            return engine.raw_connection()
+        except Exception as e:
+            raise RepositoryUnavailable(str(e)) from e
+
+    @staticmethod
+    def _default_partition(cur, table: str) -> Optional[str]:
+        cur.execute(LIST_PARTITIONS, (table,))
+        return next((name for name, bound in cur.fetchall() if bound == "DEFAULT"), None)
+
+    @staticmethod
+    def _create(cur, table: str, name: str, start: datetime, end: datetime, default: Optional[str]) -> None:
+        """
+        Create the partition for [start, end). Postgres refuses while the
+        default partition holds rows in that range, so those are moved into
+        the new table before it is attached.
+        """
+        stray = 0
+        if default:
+            cur.execute(
+                f'SELECT count(*) FROM "{default}" WHERE timestamp >= %s AND timestamp < %s', (start, end)
+            )
+            stray = cur.fetchone()[0]
+        if not stray:
+            cur.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', (start, end)
+            )
+            return
+
+        logger.warning(f"Moving {stray} rows of {table} from {default} into {name}")
+        cur.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+        cur.execute(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE timestamp >= %s AND timestamp < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            (start, end),
+        )
+        cur.execute(
+            f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', (start, end)
+        )
+
+    def ensure(self, table: str, days_ahead: Optional[int] = None) -> List[str]:
+        """Create the daily partitions from today to `days_ahead` days out."""
+        days_ahead = self.days_ahead if days_ahead is None else days_ahead
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        created = []
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                partitions = self._partitions(cur, table)
+                default = self._default_partition(cur, table)
+                for offset in range(days_ahead + 1):
+                    start = today + timedelta(days=offset)
+                    end = start + timedelta(days=1)
+                    # Days already covered (e.g. by the legacy partition) are skipped
+                    if any(
+                        (lower is None or lower < end) and (upper is None or upper > start)
+                        for _, lower, upper in partitions
+                    ):
+                        continue
+                    name = partition_name(table, start)
+                    self._create(cur, table, name, start, end, default)
+                    created.append(name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        self.created += len(created)
+        if created:
+            logger.info(f"Created partitions {', '.join(created)}")
+        return created
+
+    def drop_expired(self, table: str, cutoff: datetime) -> List[str]:
+        """
+        Detach and drop every partition of `table` holding only rows older
+        than `cutoff`. A partition straddling the cutoff is kept until the
+        next run after it has fully expired. Expired rows that landed in the
+        default partition are deleted.
+        """
+        dropped = []
+        stray = 0
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                for name, _, upper in sorted(self._partitions(cur, table), key=lambda p: p[2] or cutoff):
+                    if upper is None or upper > cutoff:
+                        continue
+                    cur.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                    cur.execute(f'DROP TABLE "{name}"')
+                    dropped.append(name)
+                default = self._default_partition(cur, table)
+                if default:
+                    cur.execute(f'DELETE FROM "{default}" WHERE timestamp < %s', (cutoff,))
+                    stray = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        self.dropped += len(dropped)
+        if dropped:
+            logger.info(f"Dropped expired partitions {', '.join(dropped)}")
+        if stray:
+            logger.info(f"Deleted {stray} expired rows from the default partition of {table}")
+        return dropped
+
+    def run_once(self) -> None:
+        for table in PARTITIONED_TABLES:
+            try:
+                self.ensure(table)
+            except (NotPartitioned, RepositoryUnavailable) as e:
+                logger.warning(str(e))
+            except Exception as e:
+                logger.error(f"Partition maintenance for {table} failed: {e}")
+        self.last_run_at = datetime.now(timezone.utc)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="partition-manager")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.run_once)
+            await asyncio.sleep(self.interval)
+
+
+partition_manager = PartitionManager()
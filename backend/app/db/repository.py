@@ -0,0 +1,359 @@
+"""
+Flow data repository: the hot reads and writes, straight on Postgres.
+
+Queries run on the SQLAlchemy engine's connection pool as server-side
+prepared statements (PREPARE once per pooled connection, EXECUTE after),
+so Postgres parses and plans them once. A batch insert is one EXECUTE
+over column arrays, returning the stored rows. Rows come back in the same
+shape PostgREST returns, so callers do not care which backend served them.
+
+The Supabase (PostgREST) client is the fallback while Postgres cannot be
+reached, and the baseline that app.db.benchmark compares against.
+"""
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from app.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+# After a failed connection attempt, skip Postgres for this long
+POSTGRES_RETRY_SECONDS = float(os.getenv("POSTGRES_RETRY_SECONDS", "30"))
+# Prepared statements do not survive across transactions behind a
+# transaction-mode pooler (PgBouncer, Supabase port 6543): disable there
+POSTGRES_PREPARE = os.getenv("POSTGRES_PREPARE", "true").lower() in ("1", "true", "yes")
+PAGE_SIZE = 1000
+
+FLOW_COLUMNS = (
+    "id",
+    "station_code",
+    "line_code",
+    "timestamp",
+    "next_train_minutes",
+    "train_frequency",
+    "crowding_level",
+    "is_delay",
+)
+INSERT_COLUMNS = FLOW_COLUMNS[1:]
+INSERT_TYPES = ("text[]", "text[]", "timestamptz[]", "double precision[]", "double precision[]", "text[]", "boolean[]")
+FLOW_TABLES = ("flow_data", "training_flow_data")
+
+# flow_latest holds one row per station-line, kept current by triggers on
+# flow_data (migrations/006_flow_latest.sql)
+LATEST_LINES_QUERY = f"""
+    SELECT {", ".join(FLOW_COLUMNS)}
+    FROM flow_latest
+    WHERE station_code = $1
+"""
+
+NETWORK_LATEST_QUERY = f"""
+    SELECT {", ".join(FLOW_COLUMNS)}
+    FROM flow_latest
+"""
+
+# Aggregation runs in Postgres; only one row per bucket crosses the wire
+HISTORY_QUERY = """
+    SELECT
+        to_timestamp(floor(extract(epoch FROM timestamp) / $4) * $4) AS bucket_start,
+        COUNT(*) AS samples,
+        AVG(train_frequency) AS headway_mean,
+        MIN(train_frequency) AS headway_min,
+        MAX(train_frequency) AS headway_max,
+        AVG(next_train_minutes) AS next_train_mean,
+        MIN(next_train_minutes) AS next_train_min,
+        MAX(next_train_minutes) AS next_train_max,
+        COUNT(*) FILTER (WHERE crowding_level = 'low') AS crowding_low,
+        COUNT(*) FILTER (WHERE crowding_level = 'medium') AS crowding_medium,
+        COUNT(*) FILTER (WHERE crowding_level = 'high') AS crowding_high,
+        COUNT(*) FILTER (WHERE crowding_level IS NULL
+                         OR crowding_level NOT IN ('low', 'medium', 'high')) AS crowding_unknown,
+        AVG(CASE WHEN is_delay THEN 1.0 ELSE 0.0 END) AS delay_ratio
+    FROM flow_data
+    WHERE station_code = $1
+      AND timestamp >= $2
+      AND timestamp < $3
+      AND ($5::text IS NULL OR line_code = $5)
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+INSERT_ROWS_QUERY = """
+    INSERT INTO {table} ({columns})
+    SELECT * FROM unnest({arrays})
+    RETURNING {returning}
+"""
+
+STATEMENTS = {
+    "flow_latest_lines": (("text",), LATEST_LINES_QUERY),
+    "flow_network_latest": ((), NETWORK_LATEST_QUERY),
+    "flow_history": (("text", "timestamptz", "timestamptz", "double precision", "text"), HISTORY_QUERY),
+    **{
+        f"{table}_insert": (
+            INSERT_TYPES,
+            INSERT_ROWS_QUERY.format(
+                table=table,
+                columns=", ".join(INSERT_COLUMNS),
+                arrays=", ".join(f"${n}::{t}" for n, t in enumerate(INSERT_TYPES, start=1)),
+                returning=", ".join(FLOW_COLUMNS),
+            ),
+        )
+        for table in FLOW_TABLES
+    },
+}
+
+
+def latest_lines_query(supabase, station_code: Optional[str] = None):
+    """flow_latest over PostgREST (sync or async Supabase client)."""
+    query = supabase.table("flow_latest").select(", ".join(FLOW_COLUMNS))
+    if station_code is not None:
+        query = query.eq("station_code", station_code)
+    return query
+
+
+class RepositoryUnavailable(Exception):
+    """The backend cannot be reached; callers fall back to the other one."""
+
+
+def _json_row(row: Dict) -> Dict:
+    """A result row as PostgREST would return it (ISO-8601 UTC timestamps)."""
+    return {
+        key: value.astimezone(timezone.utc).isoformat() if isinstance(value, datetime) else value
+        for key, value in row.items()
+    }
+
+
+def _insert_arrays(payload: List[Dict]) -> Tuple[List, ...]:
+    return tuple([item.get(column) for item in payload] for column in INSERT_COLUMNS)
+
+
+def aggregate_history(rows: List[Dict], bucket_seconds: int) -> List[Dict]:
+    """HISTORY_QUERY over raw rows, for backends that cannot aggregate."""
+    buckets: Dict[int, List[Dict]] = {}
+    for row in rows:
+        ts = datetime.fromisoformat(str(row["timestamp"]).replace("Z", "+00:00"))
+        buckets.setdefault(int(ts.timestamp()) // bucket_seconds * bucket_seconds, []).append(row)
+
+    def stats(values: List[float]) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        if not values:
+            return None, None, None
+        return sum(values) / len(values), min(values), max(values)
+
+    points = []
+    for start in sorted(buckets):
+        rows = buckets[start]
+        headway = stats([r["train_frequency"] for r in rows if r.get("train_frequency") is not None])
+        next_train = stats([r["next_train_minutes"] for r in rows if r.get("next_train_minutes") is not None])
+        levels = [r.get("crowding_level") for r in rows]
+        known = sum(levels.count(level) for level in ("low", "medium", "high"))
+        points.append({
+            "bucket_start": datetime.fromtimestamp(start, tz=timezone.utc),
+            "samples": len(rows),
+            "headway_mean": headway[0],
+            "headway_min": headway[1],
+            "headway_max": headway[2],
+            "next_train_mean": next_train[0],
+            "next_train_min": next_train[1],
+            "next_train_max": next_train[2],
+            "crowding_low": levels.count("low"),
+            "crowding_medium": levels.count("medium"),
+            "crowding_high": levels.count("high"),
+            "crowding_unknown": len(rows) - known,
+            "delay_ratio": sum(1 for r in rows if r.get("is_delay")) / len(rows),
+        })
+    return points
+
+
+class PostgresFlowRepository:
+    name = "postgres"
+
+    def __init__(self, retry_seconds: float = POSTGRES_RETRY_SECONDS) -> None:
+        self.retry_seconds = retry_seconds
+        self._retry_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        """False while backing off after a failed connection."""
+        return time.monotonic() >= self._retry_at
+
+    @contextmanager
+    def _cursor(self) -> Iterator:
+        """Pooled connection with a dict cursor, committed on success."""
+        if time.monotonic() < self._retry_at:
+            raise RepositoryUnavailable("Postgres unavailable, retrying later")
+        try:
+            conn = engine.raw_connection()
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.retry_seconds
+            logger.warning(f"Postgres unavailable, falling back to Supabase: {e}")
+            raise RepositoryUnavailable(str(e)) from e
+
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                yield conn, cur
+            conn.commit()
+        except psycopg2.OperationalError as e:
+            # Connection lost mid-query
+            conn.invalidate()
+            self._retry_at = time.monotonic() + self.retry_seconds
+            raise RepositoryUnavailable(str(e)) from e
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _execute(conn, cur, statement: str, params: Tuple) -> None:
+        if not POSTGRES_PREPARE:
+            query = re.sub(r"\$(\d+)", r"%(p\1)s", STATEMENTS[statement][1])
+            cur.execute(query, {f"p{n}": value for n, value in enumerate(params, start=1)})
+            return
+        # Prepared once per pooled connection; the set lives with the connection
+        types, query = STATEMENTS[statement]
+        prepared = conn.info.setdefault("prepared", set())
+        if statement not in prepared:
+            signature = f" ({', '.join(types)})" if types else ""
+            cur.execute(f"PREPARE {statement}{signature} AS {query}")
+            prepared.add(statement)
+        # Explicit casts: a text[] literal is not implicitly a timestamptz[]
+        args = f" ({', '.join(f'%s::{t}' for t in types)})" if types else ""
+        cur.execute(f"EXECUTE {statement}{args}", params)
+
+    def latest_lines(self, station_code: Optional[str] = None) -> List[Dict]:
+        """The latest row of each of the station's lines (every station's if None)."""
+        with self._cursor() as (conn, cur):
+            if station_code is None:
+                self._execute(conn, cur, "flow_network_latest", ())
+            else:
+                self._execute(conn, cur, "flow_latest_lines", (station_code,))
+            return [_json_row(row) for row in cur.fetchall()]
+
+    def history(
+        self,
+        station_code: str,
+        start_time: datetime,
+        end_time: datetime,
+        bucket_seconds: int,
+        line_code: Optional[str] = None,
+    ) -> List[Dict]:
+        with self._cursor() as (conn, cur):
+            self._execute(
+                conn, cur, "flow_history",
+                (station_code, start_time, end_time, bucket_seconds, line_code),
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def insert_rows(self, table: str, payload: List[Dict]) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+        """
+        Insert payload rows in one statement. If it is rejected, rows are
+        retried one by one, each under a savepoint, so one bad row does not
+        sink the rest. Returns (inserted, errors) keyed by payload position.
+        """
+        if table not in FLOW_TABLES:
+            raise ValueError(f"Unsupported table: {table}")
+        inserted: Dict[int, Dict] = {}
+        errors: Dict[int, str] = {}
+        if not payload:
+            return inserted, errors
+
+        statement = f"{table}_insert"
+        with self._cursor() as (conn, cur):
+            cur.execute("SAVEPOINT batch")
+            try:
+                self._execute(conn, cur, statement, _insert_arrays(payload))
+                # unnest preserves order, and so does RETURNING for one INSERT
+                inserted = {pos: _json_row(row) for pos, row in enumerate(cur.fetchall())}
+                return inserted, errors
+            except psycopg2.OperationalError:
+                raise
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT batch")
+                logger.warning(f"Bulk insert into {table} failed, retrying per row: {e}")
+
+            for pos, item in enumerate(payload):
+                cur.execute("SAVEPOINT row")
+                try:
+                    self._execute(conn, cur, statement, _insert_arrays([item]))
+                    inserted[pos] = _json_row(cur.fetchone())
+                    cur.execute("RELEASE SAVEPOINT row")
+                except psycopg2.OperationalError:
+                    raise
+                except psycopg2.Error as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT row")
+                    errors[pos] = e.diag.message_primary or str(e)
+        return inserted, errors
+
+
+class SupabaseFlowRepository:
+    """The same queries over PostgREST with the sync Supabase client."""
+
+    name = "supabase"
+
+    def __init__(self, supabase) -> None:
+        if not supabase:
+            raise RepositoryUnavailable("Supabase client not configured")
+        self.supabase = supabase
+
+    def latest_lines(self, station_code: Optional[str] = None) -> List[Dict]:
+        query = latest_lines_query(self.supabase, station_code)
+        return query.execute().data
+
+    def history(
+        self,
+        station_code: str,
+        start_time: datetime,
+        end_time: datetime,
+        bucket_seconds: int,
+        line_code: Optional[str] = None,
+    ) -> List[Dict]:
+        # PostgREST cannot group by time bucket: page the raw rows and aggregate here
+        rows: List[Dict] = []
+        last_id = 0
+        while True:
+            query = (
+                self.supabase.table("flow_data")
+                .select(", ".join(FLOW_COLUMNS))
+                .eq("station_code", station_code)
+                .gte("timestamp", start_time.isoformat())
+                .lt("timestamp", end_time.isoformat())
+                .gt("id", last_id)
+            )
+            if line_code:
+                query = query.eq("line_code", line_code)
+            page = query.order("id").limit(PAGE_SIZE).execute().data
+            if not page:
+                break
+            rows.extend(page)
+            last_id = page[-1]["id"]
+        return aggregate_history(rows, bucket_seconds)
+
+    def insert_rows(self, table: str, payload: List[Dict]) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+        inserted: Dict[int, Dict] = {}
+        errors: Dict[int, str] = {}
+        if not payload:
+            return inserted, errors
+        try:
+            response = self.supabase.table(table).insert(payload).execute()
+            # PostgREST returns the representation in insertion order
+            inserted = dict(enumerate(response.data))
+        except Exception as e:
+            logger.warning(f"Bulk insert into {table} failed, retrying per row: {e}")
+
+            for pos, item in enumerate(payload):
+                try:
+                    response = self.supabase.table(table).insert(item).execute()
+                    inserted[pos] = response.data[0]
+                except Exception as e:
+                    errors[pos] = str(e)
+        return inserted, errors
+
+
+flow_repository = PostgresFlowRepository()
@@ -1,8 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import stations, flow_data, predictions, training_flow_data
+from app.ml.collector import COLLECTOR_ENABLED, collector
+from app.ml.external_data import weather_provider
+from app.ml.flow_stream import flow_broadcaster
+from app.ml.mtr_api import get_schedule_cache_stats
+from app.ml.prediction_cache import prediction_cache
+from app.ml.station_registry import station_registry
+from app.db.database import close_async_supabase, open_async_supabase
+from app.db.pagination import NEXT_CURSOR_HEADER
+from app.db.partitions import partition_manager
+from app.routers import stations, flow_data, predictions, training_flow_data, ingest, stream
 
-app = FastAPI(title="MTR Flow Analytics API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled async client used by the request handlers
+    await open_async_supabase()
+    # Keep flow table partitions created ahead of the data
+    partition_manager.start()
+    # Station lookups are served from memory
+    station_registry.start()
+    # Push ingest cycles to /api/stream/flow subscribers
+    flow_broadcaster.start()
+    # Keep the HKO observation warm so ingest never waits on it
+    weather_provider.start()
+    # Serve predictions from memory, reloading when a new forecast is published
+    prediction_cache.start()
+    # Optional in-process replacement for the n8n collection workflow
+    if COLLECTOR_ENABLED:
+        collector.start()
+    yield
+    await collector.stop()
+    await prediction_cache.stop()
+    await weather_provider.stop()
+    await station_registry.stop()
+    await partition_manager.stop()
+    await flow_broadcaster.stop()
+    await close_async_supabase()
+
+app = FastAPI(title="MTR Flow Analytics API", version="1.0.0", lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -15,6 +51,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
@@ -24,6 +61,8 @@ app.include_router(predictions.router, prefix="/api/predictions", tags=["predict
 app.include_router(
     training_flow_data.router, prefix="/api/training-flow", tags=["training-flow"]
 )
+app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"])
+app.include_router(stream.router, prefix="/api/stream", tags=["stream"])
 
 @app.get("/")
 async def root():
@@ -31,4 +70,11 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "schedule_cache": get_schedule_cache_stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "station_registry": station_registry.stats(),
+        "flow_stream": flow_broadcaster.stats(),
+        "partitions": partition_manager.stats(),
+    }
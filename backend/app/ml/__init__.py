@@ -1 +1 @@
-from .crowding import classify_crowding
+from .crowding import classify_crowding, classify_crowding_batch, CrowdingThresholds
@@ -0,0 +1,186 @@
+"""
+In-process TTL cache with request coalescing and stale-while-revalidate.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "stale_until")
+
+    def __init__(self, value: Any, expires_at: float, stale_until: float) -> None:
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class TTLCache:
+    """
+    Thread-safe cache around a loader function.
+
+    - Each entry expires `ttl` seconds after it was loaded.
+    - At most `maxsize` entries are kept; the least recently used is evicted.
+    - Concurrent misses for the same key share one loader call.
+    - For `stale_ttl` seconds after expiry the old value is still served
+      while a single background refresh runs.
+    - A loader result of None is cached for `negative_ttl` seconds only and
+      is never served stale. A failed refresh of a stale entry keeps the old
+      value and waits `negative_ttl` seconds before trying again.
+    - Callers joining another caller's load give up after `wait_timeout`
+      seconds and get None.
+
+    Background refreshes run on `executor`. It must not be a pool whose
+    workers call get(): a refresh queued behind workers waiting on that
+    same refresh would never run.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[..., Optional[Any]],
+        ttl: float,
+        maxsize: int = 512,
+        stale_ttl: float = 0.0,
+        negative_ttl: float = 0.0,
+        executor: Optional[Executor] = None,
+        wait_timeout: Optional[float] = None,
+    ) -> None:
+        self._loader = loader
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._stale_ttl = stale_ttl
+        self._negative_ttl = negative_ttl
+        self._executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+        self._wait_timeout = wait_timeout
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "evictions": 0,
+            "load_errors": 0,
+            "wait_timeouts": 0,
+        }
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for `key`, loading it if needed."""
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now < entry.expires_at:
+                    self._entries.move_to_end(key)
+                    self._stats["negative_hits" if entry.value is None else "hits"] += 1
+                    return entry.value
+
+                if entry.value is not None and now < entry.stale_until:
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if key not in self._inflight:
+                        self._stats["refreshes"] += 1
+                        self._inflight[key] = Future()
+                        self._executor.submit(self._load, key)
+                    return entry.value
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                owner = False
+            else:
+                self._stats["misses"] += 1
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+
+        if owner:
+            return self._load(key)
+        return self._wait(key, future)
+
+    def refresh(self, key: Hashable) -> Optional[Any]:
+        """Load `key` now regardless of freshness, joining any in-flight load."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+            else:
+                self._stats["refreshes"] += 1
+                self._inflight[key] = Future()
+
+        if future is not None:
+            return self._wait(key, future)
+        return self._load(key)
+
+    def _wait(self, key: Hashable, future: Future) -> Optional[Any]:
+        """Join an in-flight load, giving up after wait_timeout."""
+        try:
+            return future.result(timeout=self._wait_timeout)
+        except FutureTimeout:
+            logger.warning(f"Timed out waiting for in-flight load of {key}")
+            with self._lock:
+                self._stats["wait_timeouts"] += 1
+            return None
+
+    def _load(self, key: Hashable) -> Optional[Any]:
+        """Run the loader for `key`, store the result and wake any waiters."""
+        try:
+            value = self._loader(*key) if isinstance(key, tuple) else self._loader(key)
+        except Exception as e:
+            logger.error(f"Cache loader failed for {key}: {e}")
+            with self._lock:
+                self._stats["load_errors"] += 1
+            value = None
+
+        now = time.monotonic()
+        with self._lock:
+            if value is None:
+                entry = _Entry(None, now + self._negative_ttl, now + self._negative_ttl)
+            else:
+                entry = _Entry(value, now + self._ttl, now + self._ttl + self._stale_ttl)
+
+            previous = self._entries.get(key)
+            if value is None and previous is not None and previous.value is not None and now < previous.stale_until:
+                # A failed refresh keeps serving the last good value until
+                # its stale window runs out, retrying at most once per
+                # negative_ttl rather than on every get()
+                previous.expires_at = min(now + self._negative_ttl, previous.stale_until)
+            else:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._maxsize:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+
+            future = self._inflight.pop(key, None)
+
+        if future is not None:
+            future.set_result(value)
+        return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for `key` if still servable, without loading."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry.stale_until:
+                return None
+            return entry.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "inflight": len(self._inflight)}
@@ -0,0 +1,266 @@
+"""
+In-process network collector.
+
+Polls every line-station pair on a fixed cycle, keeps the latest trains,
+headways and crowding per station-line in memory, and persists each cycle
+through the shared ingest path. Enabled with ENABLE_COLLECTOR=true; the
+n8n workflow can be retired once it is running.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.db.database import get_supabase
+from app.db.repository import flow_repository
+from app.ml.crowding import classify_crowding
+from app.ml.external_data import is_today_holiday, get_weather_status
+from app.ml.ingest import ingest_flow_rows
+from app.ml.latest_flow import aggregate_station_flow
+from app.ml.mtr_api import STATION_LINES, fetch_line_schedule, parse_line_schedule
+from app.ml.station_registry import station_registry
+
+logger = logging.getLogger(__name__)
+
+COLLECTOR_ENABLED = os.getenv("ENABLE_COLLECTOR", "false").lower() in ("1", "true", "yes")
+COLLECTOR_INTERVAL_SECONDS = float(os.getenv("COLLECTOR_INTERVAL_SECONDS", "30"))
+COLLECTOR_CONCURRENCY = int(os.getenv("COLLECTOR_CONCURRENCY", "8"))
+
+# MTR API times (curr_time / sys_time) are Hong Kong local time
+HKT = timezone(timedelta(hours=8))
+
+
+def _parse_mtr_time(value: Optional[str]) -> datetime:
+    if value:
+        try:
+            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=HKT)
+        except ValueError:
+            pass
+    return datetime.now(HKT)
+
+
+def build_flow_row(
+    line_code: str,
+    station_code: str,
+    api_response: Dict,
+    line_entry: Dict,
+    is_holiday: bool,
+    is_rainy: bool,
+) -> Optional[Dict]:
+    """
+    Derive a flow_data row from one parsed line schedule.
+
+    Mirrors the n8n collection script: next train is the soonest valid
+    arrival in either direction, headway is the best of the two directions
+    (falling back to the next train time), and crowding is classified on
+    that headway. Returns None when no valid arrival is listed.
+    """
+    ttnts = []
+    for train in line_entry["up_trains"] + line_entry["down_trains"]:
+        try:
+            ttnts.append(float(train["ttnt"]))
+        except (TypeError, ValueError):
+            continue
+    if not ttnts:
+        return None
+
+    next_train = min(ttnts)
+    headways = [
+        f for f in (line_entry["frequency_up"], line_entry["frequency_down"]) if f is not None
+    ]
+    frequency = min(headways) if headways else next_train
+
+    timestamp = _parse_mtr_time(api_response.get("sys_time") or api_response.get("curr_time"))
+    is_delay = api_response.get("isdelay") == "Y"
+
+    return {
+        "station_code": station_code,
+        "line_code": line_code,
+        "timestamp": timestamp.isoformat(),
+        "next_train_minutes": next_train,
+        "train_frequency": frequency,
+        "crowding_level": classify_crowding(
+            frequency=frequency,
+            hour=timestamp.hour,
+            is_holiday=is_holiday,
+            is_rainy=is_rainy,
+            is_delay=is_delay,
+        ),
+        "is_delay": is_delay,
+    }
+
+
+class NetworkCollector:
+    """
+    Background poller holding the latest state of every station-line.
+
+    The snapshot maps station code to
+    {"timestamp": <MTR curr_time>, "lines": {line_code: {"trains": ..., "flow": ...}}}
+    and is replaced as a whole at the end of each cycle, so readers never
+    see a half-updated network.
+    """
+
+    def __init__(self, interval: float, concurrency: int) -> None:
+        self.interval = interval
+        self.concurrency = concurrency
+        self.cycles = 0
+        self.last_cycle_at: Optional[datetime] = None
+        self._snapshot: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="network-collector")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def seconds_to_next_cycle(self) -> float:
+        """How long the current snapshot is expected to stay current."""
+        if not self.last_cycle_at:
+            return 0.0
+        age = (datetime.now(timezone.utc) - self.last_cycle_at).total_seconds()
+        return max(0.0, self.interval - age)
+
+    def get_station(self, station_code: str) -> Optional[Dict]:
+        """Latest snapshot for a station, or None if it has not been collected."""
+        return self._snapshot.get(station_code.upper())
+
+    def station_trains(self, station_code: str) -> Optional[Dict]:
+        """Train arrivals for a station in the /trains response shape."""
+        station_code = station_code.upper()
+        station = self.get_station(station_code)
+        if not station:
+            return None
+
+        lines = [
+            station["lines"][line_code]["trains"]
+            for line_code in STATION_LINES.get(station_code, [])
+            if line_code in station["lines"]
+        ]
+        return {
+            "station_code": station_code,
+            "station_name": station_registry.name(station_code) or station_code,
+            "timestamp": station["timestamp"] or datetime.now(HKT).strftime("%Y-%m-%d %H:%M:%S"),
+            "lines": lines,
+            "partial": False,
+            "timed_out_lines": [],
+        }
+
+    def station_flow(self, station_code: str) -> Optional[Dict]:
+        """
+        Aggregated latest flow record for a station, or None if any of its
+        rows has not been persisted yet (the response needs row ids).
+        """
+        station = self.get_station(station_code)
+        if not station:
+            return None
+
+        rows = [line["flow"] for line in station["lines"].values() if line["flow"]]
+        if not rows or any("id" not in row for row in rows):
+            return None
+        return aggregate_station_flow(rows)
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.collect_once()
+            except Exception as e:
+                logger.error(f"Collector cycle failed: {e}")
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+    async def collect_once(self) -> None:
+        """Poll every line-station pair once, swap in the new snapshot, persist."""
+        pairs: List[Tuple[str, str]] = [
+            (line_code, station_code)
+            for station_code, line_codes in STATION_LINES.items()
+            for line_code in line_codes
+        ]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(line_code: str, station_code: str) -> Optional[Dict]:
+            async with semaphore:
+                return await asyncio.to_thread(
+                    fetch_line_schedule, line_code, station_code, True
+                )
+
+        responses = await asyncio.gather(
+            *(fetch(line, station) for line, station in pairs), return_exceptions=True
+        )
+
+        is_holiday, weather = await asyncio.gather(
+            asyncio.to_thread(is_today_holiday), asyncio.to_thread(get_weather_status)
+        )
+
+        snapshot: Dict[str, Dict] = {}
+        rows: List[Dict] = []
+        for (line_code, station_code), api_response in zip(pairs, responses):
+            if not api_response or isinstance(api_response, Exception):
+                # Keep serving the previous state of a line that failed this cycle
+                previous = self._snapshot.get(station_code, {}).get("lines", {}).get(line_code)
+                if previous:
+                    snapshot.setdefault(station_code, {"timestamp": None, "lines": {}})["lines"][line_code] = previous
+                continue
+
+            line_entry = parse_line_schedule(line_code, station_code, api_response)
+            if not line_entry:
+                continue
+
+            row = build_flow_row(
+                line_code, station_code, api_response, line_entry,
+                is_holiday, weather["is_rainy"],
+            )
+            station = snapshot.setdefault(station_code, {"timestamp": None, "lines": {}})
+            station["timestamp"] = station["timestamp"] or api_response.get("curr_time")
+            station["lines"][line_code] = {"trains": line_entry, "flow": row}
+            if row:
+                rows.append(row)
+
+        self._snapshot = snapshot
+        self.cycles += 1
+        self.last_cycle_at = datetime.now(timezone.utc)
+
+        await asyncio.to_thread(self._persist, rows)
+
+    def _persist(self, rows: List[Dict]) -> None:
+        """Write the cycle through the ingest path and record the new row ids."""
+        if not rows:
+            return
+        # Written straight to Postgres, or through Supabase while it is down
+        supabase = get_supabase()
+        if not supabase and not flow_repository.available:
+            logger.warning(f"Collector cycle of {len(rows)} rows not persisted: no database connection")
+            return
+
+        results = ingest_flow_rows(supabase, rows)
+        failed = 0
+        for row, result in zip(rows, results):
+            target = result.get("targets", {}).get("flow_data")
+            if target and target["success"]:
+                row["id"] = target["id"]
+            if not result["success"]:
+                failed += 1
+        if failed:
+            logger.warning(f"Collector persisted {len(rows) - failed}/{len(rows)} rows")
+
+
+collector = NetworkCollector(COLLECTOR_INTERVAL_SECONDS, COLLECTOR_CONCURRENCY)
+
+
+def get_collector() -> Optional[NetworkCollector]:
+    """The collector, if it is running; read paths fall back otherwise."""
+    return collector if collector.running else None
@@ -1,4 +1,31 @@
-def classify_crowding(frequency: float, hour: int, is_holiday: bool = False, is_rainy: bool = False, is_delay: bool = False) -> str:
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+# Crowding codes used by the batch classifier; CROWDING_LEVELS[code] is the label
+CROWDING_LEVELS = ("low", "medium", "high")
+LOW, MEDIUM, HIGH = 0, 1, 2
+
+
+@dataclass(frozen=True)
+class CrowdingThresholds:
+    """
+    Rule set for crowding classification. Headway cutoffs are in minutes;
+    rush hour windows are inclusive hour ranges.
+    """
+    morning_rush: Tuple[int, int] = (7, 9)
+    evening_rush: Tuple[int, int] = (17, 19)
+    rush_high: float = 2.5
+    rush_medium: float = 4.0
+    off_peak_medium: float = 3.0
+    rain_adjustment: float = 0.5
+
+
+DEFAULT_THRESHOLDS = CrowdingThresholds()
+
+
+def classify_crowding(frequency: float, hour: int, is_holiday: bool = False, is_rainy: bool = False, is_delay: bool = False, thresholds: CrowdingThresholds = DEFAULT_THRESHOLDS) -> str:
     """
     Classify crowding level based on service frequency (headway), holidays, weather, and delays.
 
@@ -14,6 +41,7 @@ def classify_crowding(frequency: float, hour: int, is_holiday: bool = False, is_
         is_holiday: Whether today is a public holiday
         is_rainy: Whether there is significant rainfall/warnings
         is_delay: Whether a delay is reported by MTR
+        thresholds: Rule set to apply (defaults to the production rules)
         
     Returns:
         str: "low", "medium", or "high"
@@ -22,13 +50,15 @@ def classify_crowding(frequency: float, hour: int, is_holiday: bool = False, is_
     # On holidays, there is no traditional commuter rush hour
     is_rush_hour = False
     if not is_holiday:
-        if (7 <= hour <= 9) or (17 <= hour <= 19):
+        morning_start, morning_end = thresholds.morning_rush
+        evening_start, evening_end = thresholds.evening_rush
+        if (morning_start <= hour <= morning_end) or (evening_start <= hour <= evening_end):
             is_rush_hour = True
 
     # 2. Adjust thresholds for weather
     # Rain makes platforms busier (umbrellas, short trips).
     # We increase sensitivity by treating slightly longer wait times as "crowded"
-    rain_adj = 0.5 if is_rainy else 0.0
+    rain_adj = thresholds.rain_adjustment if is_rainy else 0.0
 
     if is_rush_hour:
         # Rush Hour Logic
@@ -38,9 +68,9 @@ def classify_crowding(frequency: float, hour: int, is_holiday: bool = False, is_
 
         # Strict: < 2.5m is High.
         # With rain: < 3.0m is High.
-        if frequency < (2.5 + rain_adj):
+        if frequency < (thresholds.rush_high + rain_adj):
             return "high"
-        elif frequency < (4.0 + rain_adj):
+        elif frequency < (thresholds.rush_medium + rain_adj):
             return "medium"
         else:
             return "low"
@@ -52,7 +82,51 @@ def classify_crowding(frequency: float, hour: int, is_holiday: bool = False, is_
 
         # Standard: < 3.0m is Medium.
         # With rain: < 3.5m is Medium.
-        if frequency < (3.0 + rain_adj):
+        if frequency < (thresholds.off_peak_medium + rain_adj):
             return "medium"
         else:
-            return "low"
\ No newline at end of file
+            return "low"
+
+
+def classify_crowding_batch(
+    frequency,
+    hour,
+    is_holiday=False,
+    is_rainy=False,
+    is_delay=False,
+    thresholds: CrowdingThresholds = DEFAULT_THRESHOLDS,
+) -> np.ndarray:
+    """
+    Vectorized classify_crowding over whole columns.
+
+    Arguments are array-likes (or scalars) that broadcast against each
+    other. Returns a uint8 array of crowding codes (LOW, MEDIUM, HIGH);
+    map back to labels with CROWDING_LEVELS. Gives exactly the same result
+    as the scalar function for every element, including NaN headways,
+    which fall through every cutoff to the low/delay branch.
+    """
+    frequency = np.asarray(frequency, dtype=np.float64)
+    hour = np.asarray(hour)
+    is_holiday = np.asarray(is_holiday, dtype=bool)
+    is_rainy = np.asarray(is_rainy, dtype=bool)
+    is_delay = np.asarray(is_delay, dtype=bool)
+
+    morning_start, morning_end = thresholds.morning_rush
+    evening_start, evening_end = thresholds.evening_rush
+    is_rush_hour = ~is_holiday & (
+        ((hour >= morning_start) & (hour <= morning_end))
+        | ((hour >= evening_start) & (hour <= evening_end))
+    )
+
+    rain_adj = np.where(is_rainy, thresholds.rain_adjustment, 0.0)
+
+    rush_level = np.where(
+        is_delay | (frequency < thresholds.rush_high + rain_adj),
+        HIGH,
+        np.where(frequency < thresholds.rush_medium + rain_adj, MEDIUM, LOW),
+    )
+    off_peak_level = np.where(
+        is_delay | (frequency < thresholds.off_peak_medium + rain_adj), MEDIUM, LOW
+    )
+
+    return np.where(is_rush_hour, rush_level, off_peak_level).astype(np.uint8)
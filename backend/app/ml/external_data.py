@@ -1,5 +1,8 @@
+import asyncio
 import requests
 import datetime
+import threading
+import time
 from typing import List, Dict, Optional
 import logging
 
@@ -61,51 +64,147 @@ def is_today_holiday() -> bool:
     holidays = get_public_holidays()
     return today in holidays
 
-def get_weather_status() -> Dict:
+# HKO updates the regional readings roughly every 10 minutes
+WEATHER_REFRESH_SECONDS = 600
+# Readings older than this are flagged as stale
+WEATHER_STALE_SECONDS = 2 * WEATHER_REFRESH_SECONDS
+# Minimum gap between on-demand refresh attempts while HKO is failing
+WEATHER_RETRY_SECONDS = 60
+
+def fetch_weather_status() -> Dict:
     """
     Fetch current weather status from Hong Kong Observatory.
-    Returns a dict with 'is_rainy' (bool) and 'warnings' (list of str).
+    Returns a dict with 'is_rainy' (bool), 'warnings' (list of str) and
+    'temperature'. Raises if the feed cannot be fetched or parsed.
     """
-    try:
-        url = "https://data.weather.gov.hk/weatherAPI/opendata/weather.php?dataType=rhrread&lang=en"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        warnings = data.get("warningMessage", [])
-        
-        # Determine if it's rainy
-        # 1. Check for Rainstorm warnings
-        is_rainy = False
-        rainstorm_keywords = ["Amber Rainstorm", "Red Rainstorm", "Black Rainstorm"]
-        for w in warnings:
-            if any(k in w for k in rainstorm_keywords):
-                is_rainy = True
-                break
-        
-        # 2. Check rainfall data if no warning yet
-        # If any major urban district has > 10mm rainfall (arbitrary threshold for "wet")
-        if not is_rainy and "rainfall" in data and "data" in data["rainfall"]:
-            # Urban districts to check
-            urban_districts = [
-                "Central & Western District", "Wan Chai", "Eastern District", 
-                "Southern District", "Yau Tsim Mong", "Sham Shui Po", 
-                "Kowloon City", "Wong Tai Sin", "Kwun Tong"
-            ]
-            
-            for district_data in data["rainfall"]["data"]:
-                if district_data.get("place") in urban_districts:
-                    # 'max' is the max rainfall in mm
-                    if district_data.get("max", 0) > 10:
-                        is_rainy = True
-                        break
-                        
-        return {
-            "is_rainy": is_rainy,
-            "warnings": warnings,
-            "temperature": data.get("temperature", {}).get("data", [{}])[0].get("value") # Just get first reading
-        }
-        
-    except Exception as e:
-        logger.error(f"Failed to fetch weather data: {e}")
-        return {"is_rainy": False, "warnings": []}
+    url = "https://data.weather.gov.hk/weatherAPI/opendata/weather.php?dataType=rhrread&lang=en"
+    response = requests.get(url, timeout=5)
+    response.raise_for_status()
+    data = response.json()
+
+    warnings = data.get("warningMessage", [])
+
+    # Determine if it's rainy
+    # 1. Check for Rainstorm warnings
+    is_rainy = False
+    rainstorm_keywords = ["Amber Rainstorm", "Red Rainstorm", "Black Rainstorm"]
+    for w in warnings:
+        if any(k in w for k in rainstorm_keywords):
+            is_rainy = True
+            break
+
+    # 2. Check rainfall data if no warning yet
+    # If any major urban district has > 10mm rainfall (arbitrary threshold for "wet")
+    if not is_rainy and "rainfall" in data and "data" in data["rainfall"]:
+        # Urban districts to check
+        urban_districts = [
+            "Central & Western District", "Wan Chai", "Eastern District",
+            "Southern District", "Yau Tsim Mong", "Sham Shui Po",
+            "Kowloon City", "Wong Tai Sin", "Kwun Tong"
+        ]
+
+        for district_data in data["rainfall"]["data"]:
+            if district_data.get("place") in urban_districts:
+                # 'max' is the max rainfall in mm
+                if district_data.get("max", 0) > 10:
+                    is_rainy = True
+                    break
+
+    return {
+        "is_rainy": is_rainy,
+        "warnings": warnings,
+        "temperature": data.get("temperature", {}).get("data", [{}])[0].get("value") # Just get first reading
+    }
+
+class WeatherProvider:
+    """
+    Keeps the latest HKO observation in memory.
+
+    A background task refreshes it every `refresh_seconds`; readers only
+    ever get the cached value. If HKO is down the last good observation
+    keeps being served, with its age and a stale flag. A read that finds
+    the value missing or overdue starts a refresh in a background thread
+    (so scripts without the app lifespan still get data) but never waits.
+    """
+
+    def __init__(self, refresh_seconds: float = WEATHER_REFRESH_SECONDS) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._status: Optional[Dict] = None
+        self._last_updated: Optional[datetime.datetime] = None
+        self._refreshing = False
+        self._last_attempt = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def refresh(self) -> bool:
+        """Fetch a new observation; returns False (keeping the old one) on failure."""
+        try:
+            status = fetch_weather_status()
+        except Exception as e:
+            logger.error(f"Failed to fetch weather data: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+        with self._lock:
+            self._status = status
+            self._last_updated = datetime.datetime.now(datetime.timezone.utc)
+        return True
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshing or now - self._last_attempt < WEATHER_RETRY_SECONDS:
+                return
+            self._refreshing = True
+            self._last_attempt = now
+        threading.Thread(target=self.refresh, name="weather-refresh", daemon=True).start()
+
+    def status(self) -> Dict:
+        """Latest observation plus 'last_updated', 'age_seconds' and 'stale'."""
+        with self._lock:
+            status = dict(self._status) if self._status else {"is_rainy": False, "warnings": [], "temperature": None}
+            last_updated = self._last_updated
+
+        age = None
+        if last_updated:
+            age = (datetime.datetime.now(datetime.timezone.utc) - last_updated).total_seconds()
+
+        if age is None or age > self.refresh_seconds:
+            self._refresh_in_background()
+
+        status["last_updated"] = last_updated.isoformat() if last_updated else None
+        status["age_seconds"] = round(age, 1) if age is not None else None
+        status["stale"] = age is None or age > WEATHER_STALE_SECONDS
+        return status
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="weather-refresh")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            with self._lock:
+                self._refreshing = True
+                self._last_attempt = time.monotonic()
+            await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(self.refresh_seconds)
+
+weather_provider = WeatherProvider()
+
+def get_weather_status() -> Dict:
+    """
+    Current weather status from the in-memory HKO observation.
+    Never blocks on the network; see WeatherProvider.
+    """
+    return weather_provider.status()
@@ -0,0 +1,170 @@
+"""
+Server-sent event stream of network crowding updates.
+
+The broadcaster listens to the latest-flow store, which every ingest path
+feeds. While anyone is subscribed it also reloads the store from
+flow_latest every LATEST_FLOW_SYNC_SECONDS, so rows ingested by other API
+instances are published too. Each ingest cycle is compared with what was last published, and
+only station-lines whose crowding, headway or delay changed go out, as
+one event encoded once and shared by every subscriber. A subscriber is an
+asyncio queue, not a query. When a slow client's queue fills up, its
+backlog is dropped and it gets a full snapshot instead.
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.db.database import get_async_supabase
+from app.ml.latest_flow import LATEST_FLOW_SYNC_SECONDS, latest_flow_store, sync_latest_flow
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "16"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+STREAM_RETRY_MS = 5000
+
+# A station-line is republished when any of these change
+CHANGE_FIELDS = ("crowding_level", "train_frequency", "is_delay")
+LINE_FIELDS = (
+    "id", "station_code", "line_code", "timestamp", "crowding_level",
+    "train_frequency", "next_train_minutes", "is_delay",
+)
+
+# Queue markers: send a full snapshot / end the stream
+RESYNC = "resync"
+CLOSE = "close"
+
+
+def line_entry(row: Dict) -> Dict:
+    return {field: row.get(field) for field in LINE_FIELDS}
+
+
+def sse_message(event: str, seq: int, data: Dict) -> str:
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    return f"event: {event}\nid: {seq}\ndata: {payload}\n\n"
+
+
+class FlowBroadcaster:
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self.seq = 0
+        self.resyncs = 0
+        self._published: Dict[Tuple[str, str], Tuple] = {}
+        self._lock = threading.Lock()
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            latest_flow_store.add_listener(self.publish)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="flow-stream-sync")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let open streams finish so the server can shut down
+        for queue in self._subscribers:
+            self._push(queue, CLOSE)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(LATEST_FLOW_SYNC_SECONDS)
+            if self._subscribers:
+                # Reloaded rows reach subscribers through publish()
+                await sync_latest_flow(get_async_supabase())
+
+    def stats(self) -> Dict:
+        return {"subscribers": len(self._subscribers), "seq": self.seq, "resyncs": self.resyncs}
+
+    def publish(self, rows: List[Dict]) -> None:
+        """
+        Store listener, called from ingest threads with the rows that
+        replaced a station-line's latest row.
+        """
+        changed = []
+        with self._lock:
+            for row in rows:
+                key = (row["station_code"], row.get("line_code") or "default")
+                values = tuple(row.get(field) for field in CHANGE_FIELDS)
+                if self._published.get(key) != values:
+                    self._published[key] = values
+                    changed.append(line_entry(row))
+            if not changed:
+                return
+            self.seq += 1
+            seq = self.seq
+
+        if self._loop and self._subscribers:
+            message = sse_message("update", seq, {"seq": seq, "lines": changed})
+            try:
+                self._loop.call_soon_threadsafe(self._fan_out, message)
+            except RuntimeError:
+                # Event loop already closed during shutdown
+                pass
+
+    def _fan_out(self, message: str) -> None:
+        for queue in self._subscribers:
+            self._push(queue, message)
+
+    def _push(self, queue: asyncio.Queue, message: str) -> None:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and catch up in one go
+            while not queue.empty():
+                queue.get_nowait()
+            if message == CLOSE:
+                queue.put_nowait(CLOSE)
+            else:
+                queue.put_nowait(RESYNC)
+                self.resyncs += 1
+
+    def snapshot_message(self) -> str:
+        """Every station-line's latest state as one event."""
+        with self._lock:
+            seq = self.seq
+        lines = [line_entry(row) for row in latest_flow_store.rows()]
+        return sse_message("snapshot", seq, {"seq": seq, "lines": lines})
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    async def events(self, queue: asyncio.Queue, is_disconnected) -> AsyncIterator[str]:
+        """
+        SSE body for one subscriber: a snapshot, then updates, with
+        keepalive comments while the network is quiet.
+        """
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            # Subscribed before the snapshot is taken, so no update is missed;
+            # an update already in the snapshot is harmless to apply twice
+            yield self.snapshot_message()
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if message == CLOSE:
+                    break
+                yield self.snapshot_message() if message == RESYNC else message
+        finally:
+            self.unsubscribe(queue)
+
+
+flow_broadcaster = FlowBroadcaster()
@@ -0,0 +1,398 @@
+"""
+Seasonal baseline forecast that fills the predictions table.
+
+Builds a station x line x hour-of-week profile from training_flow_data:
+the crowding-level distribution and mean headway of every Hong Kong
+hour-of-week slot, split by public holiday. The profile is updated
+incrementally from a (timestamp, id) watermark: each run has Postgres
+pre-aggregate only the rows that arrived since the previous one.
+
+A forecast takes the most likely level of each line for the target slot
+and combines the lines of a station with the interchange rule (highest
+level wins). While it is raining, the first hours are also reclassified
+from the expected headway with the rain adjustment. All stations are
+written in one bulk upsert, together with a prediction_versions row that
+tells the API to reload its prediction cache.
+
+Usage:
+    python -m app.ml.forecast --hours 24
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from psycopg2.extras import execute_values
+
+from app.db.database import engine
+from app.ml.collector import HKT
+from app.ml.crowding import CROWDING_LEVELS, DEFAULT_THRESHOLDS, classify_crowding_batch
+from app.ml.external_data import get_public_holidays, get_weather_status, weather_provider
+
+logger = logging.getLogger(__name__)
+
+HOURS_OF_WEEK = 7 * 24
+DEFAULT_HOURS_AHEAD = 24
+MAX_HOURS_AHEAD = 168
+# Current weather only says something about the next few hours
+RAIN_HORIZON_HOURS = 3
+# API endpoint that reloads the prediction cache (e.g. https://host/api/predictions/publish)
+PREDICTIONS_PUBLISH_URL = os.getenv("PREDICTIONS_PUBLISH_URL")
+DEFAULT_PROFILE_PATH = Path(__file__).resolve().parents[2] / ".forecast" / "profile.npz"
+
+SELECT_WATERMARK = """
+    SELECT timestamp, id
+    FROM training_flow_data
+    ORDER BY timestamp DESC, id DESC
+    LIMIT 1
+"""
+
+# Rows between the two watermarks, pre-aggregated per profile slot and
+# Hong Kong day (the holiday split is applied per day afterwards)
+AGGREGATE_ROWS = """
+    SELECT
+        station_code,
+        COALESCE(line_code, '') AS line_code,
+        (EXTRACT(isodow FROM timestamp AT TIME ZONE 'Asia/Hong_Kong')::int - 1) * 24
+            + EXTRACT(hour FROM timestamp AT TIME ZONE 'Asia/Hong_Kong')::int AS hour_of_week,
+        (timestamp AT TIME ZONE 'Asia/Hong_Kong')::date - DATE '1970-01-01' AS hk_day,
+        crowding_level,
+        COUNT(*) AS n,
+        COUNT(COALESCE(train_frequency, next_train_minutes)) AS headway_n,
+        COALESCE(SUM(COALESCE(train_frequency, next_train_minutes)), 0) AS headway_sum
+    FROM training_flow_data
+    WHERE (timestamp, id) > (%(after_ts)s, %(after_id)s)
+      AND (timestamp, id) <= (%(until_ts)s, %(until_id)s)
+      AND station_code IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+UPSERT_PREDICTIONS = """
+    INSERT INTO predictions (station_code, prediction_timestamp, predicted_crowding, confidence, created_at)
+    VALUES %s
+    ON CONFLICT (station_code, prediction_timestamp) DO UPDATE
+    SET predicted_crowding = EXCLUDED.predicted_crowding,
+        confidence = EXCLUDED.confidence,
+        created_at = EXCLUDED.created_at
+"""
+
+INSERT_VERSION = """
+    INSERT INTO prediction_versions (hours_ahead, predictions)
+    VALUES (%s, %s)
+    RETURNING id
+"""
+
+
+class SeasonalProfile:
+    """
+    Aggregates indexed [station, line, hour_of_week, is_holiday]:
+
+        counts        int64   [..., 3]  rows per crowding level
+        headway_sum   float64           sum of known headways
+        headway_n     int64             number of known headways
+    """
+
+    def __init__(self) -> None:
+        self.stations: List[str] = []
+        self.lines: List[str] = []
+        self.after_ts: Optional[datetime] = None
+        self.after_id = -1
+        self.counts = np.zeros((0, 0, HOURS_OF_WEEK, 2, len(CROWDING_LEVELS)), dtype=np.int64)
+        self.headway_sum = np.zeros((0, 0, HOURS_OF_WEEK, 2), dtype=np.float64)
+        self.headway_n = np.zeros((0, 0, HOURS_OF_WEEK, 2), dtype=np.int64)
+
+    @classmethod
+    def load(cls, path: Path) -> "SeasonalProfile":
+        profile = cls()
+        if not path.exists():
+            return profile
+        with np.load(path, allow_pickle=False) as data:
+            profile.stations = data["stations"].tolist()
+            profile.lines = data["lines"].tolist()
+            after_ts = str(data["after_ts"])
+            profile.after_ts = datetime.fromisoformat(after_ts) if after_ts else None
+            profile.after_id = int(data["after_id"])
+            profile.counts = data["counts"]
+            profile.headway_sum = data["headway_sum"]
+            profile.headway_n = data["headway_n"]
+        return profile
+
+    def save(self, path: Path) -> None:
+        # Write-then-rename so a crash never leaves a truncated profile
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                stations=np.array(self.stations, dtype=str),
+                lines=np.array(self.lines, dtype=str),
+                after_ts=np.array(self.after_ts.isoformat() if self.after_ts else ""),
+                after_id=np.array(self.after_id),
+                counts=self.counts,
+                headway_sum=self.headway_sum,
+                headway_n=self.headway_n,
+            )
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _codes(values, vocabulary: List[str]) -> np.ndarray:
+        index = {value: code for code, value in enumerate(vocabulary)}
+        codes = np.empty(len(values), dtype=np.int64)
+        for i, value in enumerate(values):
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(vocabulary)
+                vocabulary.append(value)
+            codes[i] = code
+        return codes
+
+    def _grow(self) -> None:
+        n_stations, n_lines = len(self.stations), len(self.lines)
+        old_stations, old_lines = self.counts.shape[:2]
+        if (n_stations, n_lines) == (old_stations, old_lines):
+            return
+        for name in ("counts", "headway_sum", "headway_n"):
+            old = getattr(self, name)
+            new = np.zeros((n_stations, n_lines) + old.shape[2:], dtype=old.dtype)
+            new[:old_stations, :old_lines] = old
+            setattr(self, name, new)
+
+    def update(self, rows: List[tuple], holidays: np.ndarray) -> None:
+        """Add AGGREGATE_ROWS results; `holidays` are days since the epoch."""
+        stations, lines, hour_of_week, days, labels, n, headway_n, headway_sum = zip(*rows)
+        station = self._codes(stations, self.stations)
+        line = self._codes(lines, self.lines)
+        self._grow()
+
+        how = np.array(hour_of_week, dtype=np.int64)
+        holiday = np.isin(np.array(days, dtype=np.int64), holidays).astype(np.int64)
+        level_index = {level: code for code, level in enumerate(CROWDING_LEVELS)}
+        level = np.array([level_index.get(label, -1) for label in labels], dtype=np.int64)
+        n = np.array(n, dtype=np.int64)
+
+        n_levels = len(CROWDING_LEVELS)
+        slot = ((station * len(self.lines) + line) * HOURS_OF_WEEK + how) * 2 + holiday
+        n_slots = self.headway_n.size
+
+        labelled = level >= 0
+        self.counts += np.bincount(
+            slot[labelled] * n_levels + level[labelled],
+            weights=n[labelled],
+            minlength=n_slots * n_levels,
+        ).astype(np.int64).reshape(self.counts.shape)
+        self.headway_sum += np.bincount(
+            slot, weights=np.array(headway_sum, dtype=np.float64), minlength=n_slots
+        ).reshape(self.headway_sum.shape)
+        self.headway_n += np.bincount(
+            slot, weights=np.array(headway_n, dtype=np.int64), minlength=n_slots
+        ).astype(np.int64).reshape(self.headway_n.shape)
+
+    def forecast(
+        self,
+        target_hours: List[datetime],
+        holidays: set,
+        is_rainy: bool = False,
+        rain_hours: int = RAIN_HORIZON_HOURS,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Predicted level code and confidence per station and target hour.
+        Returns {"level": int8 [station, hour] (-1 where there is no data),
+        "confidence": float64 [station, hour]}.
+        """
+        local = [t.astimezone(HKT) for t in target_hours]
+        how = np.array([(t.isoweekday() - 1) * 24 + t.hour for t in local])
+        hour = np.array([t.hour for t in local])
+        holiday = np.array([t.date() in holidays for t in local])
+
+        counts = self.counts[:, :, how, holiday.astype(np.int64)]  # [S, L, H, 3]
+        totals = counts.sum(axis=-1)
+        level = np.where(totals > 0, counts.argmax(axis=-1), -1)
+        confidence = np.divide(
+            counts.max(axis=-1), totals, out=np.zeros(totals.shape), where=totals > 0
+        )
+
+        if is_rainy and rain_hours > 0:
+            near = slice(0, rain_hours)
+            headway_n = self.headway_n[:, :, how[near], holiday[near].astype(np.int64)]
+            expected = np.divide(
+                self.headway_sum[:, :, how[near], holiday[near].astype(np.int64)],
+                headway_n,
+                out=np.full(headway_n.shape, np.nan),
+                where=headway_n > 0,
+            )
+            rainy_level = classify_crowding_batch(
+                frequency=expected,
+                hour=hour[near],
+                is_holiday=holiday[near],
+                is_rainy=True,
+                thresholds=DEFAULT_THRESHOLDS,
+            )
+            raised = (level[:, :, near] >= 0) & (headway_n > 0) & (rainy_level > level[:, :, near])
+            level[:, :, near] = np.where(raised, rainy_level, level[:, :, near])
+            # A rule-driven upgrade is as certain as the headway estimate
+            confidence[:, :, near] = np.where(raised, 1.0 - 1.0 / (headway_n + 1), confidence[:, :, near])
+
+        # Interchange rule: the busiest line sets the station level
+        station_level = level.max(axis=1)
+        station_confidence = np.where(level == station_level[:, None, :], confidence, 0.0).max(axis=1)
+        return {"level": station_level.astype(np.int8), "confidence": station_confidence}
+
+
+def update_profile(profile: SeasonalProfile) -> int:
+    """
+    Aggregate training rows past the profile watermark, up to the newest
+    row at the start of the run. Returns rows added.
+    """
+    epoch = datetime(1970, 1, 1).date()
+    holidays = np.array(sorted((day - epoch).days for day in get_public_holidays()), dtype=np.int64)
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SELECT_WATERMARK)
+            newest = cur.fetchone()
+            if not newest or (profile.after_ts, profile.after_id) == tuple(newest):
+                return 0
+            cur.execute(AGGREGATE_ROWS, {
+                "after_ts": profile.after_ts or datetime(1970, 1, 1, tzinfo=timezone.utc),
+                "after_id": profile.after_id,
+                "until_ts": newest[0],
+                "until_id": newest[1],
+            })
+            rows = cur.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    if rows:
+        profile.update(rows, holidays)
+    profile.after_ts, profile.after_id = newest
+    return sum(row[5] for row in rows)
+
+
+def write_predictions(
+    profile: SeasonalProfile, hours_ahead: int, now: Optional[datetime] = None
+) -> Tuple[int, Optional[int]]:
+    """
+    Forecast the next `hours_ahead` hours for every station, upsert them and
+    record a new prediction version in the same transaction. Returns the
+    number of predictions and the version id.
+    """
+    # First run, or no training rows yet: nothing to forecast from
+    if not profile.stations:
+        return 0, None
+
+    now = now or datetime.now(timezone.utc)
+    start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    target_hours = [start + timedelta(hours=h) for h in range(hours_ahead)]
+
+    # A one-shot job has no observation loaded yet, and the non-blocking
+    # read would answer "not raining": fetch one now (on failure the
+    # defaults apply)
+    weather_provider.refresh()
+    result = profile.forecast(
+        target_hours,
+        holidays=get_public_holidays(),
+        is_rainy=get_weather_status()["is_rainy"],
+    )
+    station_idx, hour_idx = np.nonzero(result["level"] >= 0)
+    rows = [
+        (
+            profile.stations[s],
+            target_hours[h],
+            CROWDING_LEVELS[result["level"][s, h]],
+            round(float(result["confidence"][s, h]), 4),
+            now,
+        )
+        for s, h in zip(station_idx.tolist(), hour_idx.tolist())
+    ]
+    if not rows:
+        return 0, None
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, UPSERT_PREDICTIONS, rows, page_size=5000)
+            cur.execute(INSERT_VERSION, (hours_ahead, len(rows)))
+            version = cur.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows), version
+
+
+def notify_api(publish_url: str) -> None:
+    """Ask the API to reload its prediction cache now instead of at its next poll."""
+    try:
+        requests.post(publish_url, timeout=10).raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"Could not notify {publish_url}: {e}")
+
+
+def run_forecast(
+    hours_ahead: int = DEFAULT_HOURS_AHEAD,
+    profile_path: Path = DEFAULT_PROFILE_PATH,
+    full: bool = False,
+    publish_url: Optional[str] = PREDICTIONS_PUBLISH_URL,
+) -> Dict:
+    """Update the profile from new training rows and publish a forecast."""
+    if not 1 <= hours_ahead <= MAX_HOURS_AHEAD:
+        raise ValueError(f"hours_ahead must be between 1 and {MAX_HOURS_AHEAD}")
+
+    started = time.monotonic()
+    profile = SeasonalProfile() if full else SeasonalProfile.load(profile_path)
+    added = update_profile(profile)
+    profile.save(profile_path)
+    profiled = time.monotonic()
+
+    written, version = write_predictions(profile, hours_ahead)
+    finished = time.monotonic()
+    if version is not None and publish_url:
+        notify_api(publish_url)
+
+    logger.info(
+        f"Profile: +{added} rows in {profiled - started:.2f}s "
+        f"(watermark {profile.after_ts}); forecast: {written} predictions in {finished - profiled:.2f}s "
+        f"(version {version})"
+    )
+    return {
+        "version": version,
+        "rows_added": added,
+        "stations": len(profile.stations),
+        "predictions": written,
+        "profile_seconds": round(profiled - started, 2),
+        "forecast_seconds": round(finished - profiled, 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the seasonal profile and publish predictions.")
+    parser.add_argument("--hours", type=int, default=DEFAULT_HOURS_AHEAD, help=f"Hours ahead to forecast (1-{MAX_HOURS_AHEAD})")
+    parser.add_argument("--profile", type=Path, default=DEFAULT_PROFILE_PATH, help="Profile file (default: backend/.forecast/profile.npz)")
+    parser.add_argument("--full", action="store_true", help="Rebuild the profile from all training data")
+    parser.add_argument("--publish-url", default=PREDICTIONS_PUBLISH_URL, help="POST here after publishing (default: $PREDICTIONS_PUBLISH_URL)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    summary = run_forecast(
+        hours_ahead=args.hours,
+        profile_path=args.profile,
+        full=args.full,
+        publish_url=args.publish_url,
+    )
+    print(
+        f"Profile +{summary['rows_added']} rows in {summary['profile_seconds']}s, "
+        f"{summary['predictions']} predictions for {summary['stations']} stations "
+        f"in {summary['forecast_seconds']}s (version {summary['version']})"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
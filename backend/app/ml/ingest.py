@@ -0,0 +1,267 @@
+"""
+Shared ingest helpers for flow data writes.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+
+from app.models import schemas
+from app.db.repository import RepositoryUnavailable, SupabaseFlowRepository, flow_repository
+from app.ml.crowding import CROWDING_LEVELS, classify_crowding_batch
+from app.ml.external_data import is_today_holiday, get_weather_status
+from app.ml.latest_flow import latest_flow_store
+
+logger = logging.getLogger(__name__)
+
+# Hot table read by the dashboard, and the long-lived store used for training
+INGEST_TABLES = ("flow_data", "training_flow_data")
+# Per-row error when neither Postgres nor Supabase is configured
+DATABASE_UNAVAILABLE = "Database connection unavailable"
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """Flatten a pydantic ValidationError into a single readable line."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+def validate_flow_rows(
+    rows: List[Dict[str, Any]]
+) -> Tuple[List[Tuple[int, schemas.FlowDataCreate]], Dict[int, str]]:
+    """
+    Validate raw rows against FlowDataCreate.
+
+    Returns (valid, errors) where valid is a list of (index, row) pairs in
+    request order and errors maps the index of each rejected row to a message.
+    """
+    valid: List[Tuple[int, schemas.FlowDataCreate]] = []
+    errors: Dict[int, str] = {}
+
+    for index, raw in enumerate(rows):
+        try:
+            valid.append((index, schemas.FlowDataCreate.model_validate(raw)))
+        except ValidationError as e:
+            errors[index] = format_validation_error(e)
+
+    return valid, errors
+
+
+def fill_crowding_levels(rows: List[schemas.FlowDataCreate]) -> None:
+    """
+    Classify every row that arrives without a crowding level.
+
+    The holiday calendar and HKO weather are looked up once for the whole
+    batch rather than once per row.
+    """
+    pending = [
+        row for row in rows
+        if row.crowding_level is None and row.next_train_minutes is not None
+    ]
+    if not pending:
+        return
+
+    try:
+        is_holiday = is_today_holiday()
+        weather = get_weather_status()
+    except Exception as e:
+        logger.error(f"Error loading crowding context: {e}")
+        return
+
+    # NOTE: Rows arrive pre-processed; where headway (seq 3 ttnt - seq 2 ttnt)
+    # was available the collector already computed it. next_train_minutes is
+    # only a fallback proxy here.
+    codes = classify_crowding_batch(
+        frequency=[row.next_train_minutes for row in pending],
+        hour=[row.timestamp.hour for row in pending],
+        is_holiday=is_holiday,
+        is_rainy=weather["is_rainy"],
+        is_delay=[bool(row.is_delay) for row in pending],
+    )
+    for row, code in zip(pending, codes):
+        row.crowding_level = CROWDING_LEVELS[code]
+
+
+def insert_flow_rows(
+    supabase, table: str, rows: List[Tuple[int, schemas.FlowDataCreate]]
+) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+    """
+    Write rows to `table` with one multi-row insert.
+
+    Goes straight to Postgres, or through Supabase while Postgres cannot be
+    reached. If the bulk insert is rejected (one bad row fails the whole
+    statement), the rows are retried one by one so a single failure does not
+    sink the rest of the batch. Returns (inserted, errors), both keyed by row
+    index.
+    """
+    if not rows:
+        return {}, {}
+
+    payload = [row.model_dump(mode="json") for _, row in rows]
+    try:
+        outcome = flow_repository.insert_rows(table, payload)
+    except RepositoryUnavailable:
+        if supabase:
+            outcome = SupabaseFlowRepository(supabase).insert_rows(table, payload)
+        else:
+            outcome = _unavailable(payload)
+
+    return _by_index(table, rows, *outcome)
+
+
+async def ainsert_flow_rows(
+    supabase, table: str, rows: List[Tuple[int, schemas.FlowDataCreate]]
+) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+    """insert_flow_rows for the async Supabase client."""
+    if not rows:
+        return {}, {}
+
+    payload = [row.model_dump(mode="json") for _, row in rows]
+    try:
+        # psycopg2 blocks: run off the event loop
+        outcome = await asyncio.to_thread(flow_repository.insert_rows, table, payload)
+    except RepositoryUnavailable:
+        if supabase:
+            outcome = await _ainsert_supabase(supabase, table, payload)
+        else:
+            outcome = _unavailable(payload)
+
+    return _by_index(table, rows, *outcome)
+
+
+async def ainsert_flow_row(
+    supabase, table: str, row: schemas.FlowDataCreate
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """Write a single row; returns (inserted row, None) or (None, error)."""
+    inserted, errors = await ainsert_flow_rows(supabase, table, [(0, row)])
+    if 0 in inserted:
+        return inserted[0], None
+    return None, errors.get(0, "Row was not inserted")
+
+
+async def _ainsert_supabase(
+    supabase, table: str, payload: List[Dict]
+) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+    inserted: Dict[int, Dict] = {}
+    errors: Dict[int, str] = {}
+    try:
+        response = await supabase.table(table).insert(payload).execute()
+        # PostgREST returns the representation in insertion order
+        inserted = dict(enumerate(response.data))
+    except Exception as e:
+        logger.warning(f"Bulk insert into {table} failed, retrying per row: {e}")
+
+        async def insert_one(pos: int, item: Dict) -> None:
+            try:
+                response = await supabase.table(table).insert(item).execute()
+                inserted[pos] = response.data[0]
+            except Exception as e:
+                errors[pos] = str(e)
+
+        await asyncio.gather(*(insert_one(pos, item) for pos, item in enumerate(payload)))
+
+    return inserted, errors
+
+
+def _unavailable(payload: List[Dict]) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+    return {}, {pos: DATABASE_UNAVAILABLE for pos in range(len(payload))}
+
+
+def _by_index(
+    table: str,
+    rows: List[Tuple[int, schemas.FlowDataCreate]],
+    inserted: Dict[int, Dict],
+    errors: Dict[int, str],
+) -> Tuple[Dict[int, Dict], Dict[int, str]]:
+    """Re-key a repository outcome from payload position to row index."""
+    indexes = [index for index, _ in rows]
+    by_index = {indexes[pos]: data for pos, data in sorted(inserted.items())}
+
+    if table == "flow_data":
+        latest_flow_store.update(by_index.values())
+
+    return by_index, {indexes[pos]: error for pos, error in errors.items()}
+
+
+def ingest_flow_rows(
+    supabase, rows: List[Dict[str, Any]], tables: Sequence[str] = INGEST_TABLES
+) -> List[Dict[str, Any]]:
+    """
+    Validate and enrich rows once, then write them to every target table.
+
+    The per-table inserts run concurrently. Each result reports the outcome
+    for each target separately, so a failure in the training store does not
+    hide a successful write to the hot table (or vice versa).
+    """
+    valid, validation_errors = validate_flow_rows(rows)
+    fill_crowding_levels([row for _, row in valid])
+
+    with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+        futures = {
+            table: pool.submit(insert_flow_rows, supabase, table, valid)
+            for table in tables
+        }
+        outcomes = {table: future.result() for table, future in futures.items()}
+
+    return ingest_results(len(rows), valid, validation_errors, outcomes)
+
+
+async def aingest_flow_rows(
+    supabase, rows: List[Dict[str, Any]], tables: Sequence[str] = INGEST_TABLES
+) -> List[Dict[str, Any]]:
+    """ingest_flow_rows for the async Supabase client."""
+    valid, validation_errors = validate_flow_rows(rows)
+    # The holiday lookup may block on 1823.gov.hk
+    await asyncio.to_thread(fill_crowding_levels, [row for _, row in valid])
+
+    inserts = await asyncio.gather(
+        *(ainsert_flow_rows(supabase, table, valid) for table in tables)
+    )
+    outcomes = dict(zip(tables, inserts))
+
+    return ingest_results(len(rows), valid, validation_errors, outcomes)
+
+
+def ingest_results(
+    n_rows: int,
+    valid: List[Tuple[int, schemas.FlowDataCreate]],
+    validation_errors: Dict[int, str],
+    outcomes: Dict[str, Tuple[Dict[int, Dict], Dict[int, str]]],
+) -> List[Dict[str, Any]]:
+    """One result per input row, reporting each target table separately."""
+    enriched = dict(valid)
+    results = []
+    for index in range(n_rows):
+        if index in validation_errors:
+            results.append({
+                "index": index,
+                "success": False,
+                "error": validation_errors[index],
+            })
+            continue
+
+        row = enriched[index]
+        targets = {}
+        for table, (inserted, errors) in outcomes.items():
+            if index in inserted:
+                targets[table] = {"success": True, "id": inserted[index].get("id")}
+            else:
+                targets[table] = {
+                    "success": False,
+                    "error": errors.get(index, "Row was not inserted"),
+                }
+
+        results.append({
+            "index": index,
+            "success": all(t["success"] for t in targets.values()),
+            "station_code": row.station_code,
+            "line_code": row.line_code,
+            "crowding_level": row.crowding_level,
+            "targets": targets,
+        })
+
+    return results
@@ -0,0 +1,226 @@
+"""
+Aggregation of the latest flow records across the lines of a station, and
+an in-memory store of the latest record of every station-line.
+
+Each API instance has its own store, and rows ingested by another instance
+never pass through it. The store is therefore reloaded from flow_latest
+(one query) once it is older than a collection interval.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.db.repository import RepositoryUnavailable, flow_repository, latest_lines_query
+
+logger = logging.getLogger(__name__)
+
+# How long the store may go without a reload from flow_latest; defaults to
+# one collection interval
+LATEST_FLOW_SYNC_SECONDS = float(
+    os.getenv("LATEST_FLOW_SYNC_SECONDS", os.getenv("COLLECTOR_INTERVAL_SECONDS", "30"))
+)
+
+LEVEL_MAP = {"low": 1, "medium": 2, "high": 3}
+REV_LEVEL_MAP = {1: "low", 2: "medium", 3: "high"}
+
+
+def aggregate_station_flow(line_entries: Iterable[Dict]) -> Optional[Dict]:
+    """
+    Combine the latest record of each line into one station-level record.
+
+    Interchange rules: highest crowding level, best (minimum) headway,
+    soonest next train, delayed if any line is delayed, newest timestamp.
+    """
+    line_entries = list(line_entries)
+    if not line_entries:
+        return None
+
+    aggregated_entry = line_entries[0].copy()  # Start with one entry as base
+
+    crowding_levels = []
+    frequencies = []
+    next_trains = []
+    delays = []
+    timestamps = []
+
+    for line_entry in line_entries:
+        # Crowding
+        lvl = line_entry.get("crowding_level")
+        if lvl in LEVEL_MAP:
+            crowding_levels.append(LEVEL_MAP[lvl])
+
+        # Frequency
+        freq = line_entry.get("train_frequency")
+        if freq is not None:
+            frequencies.append(freq)
+
+        # Next Train
+        nt = line_entry.get("next_train_minutes")
+        if nt is not None:
+            next_trains.append(nt)
+
+        # Delay
+        delays.append(line_entry.get("is_delay", False))
+
+        # Timestamp
+        ts_str = line_entry.get("timestamp")
+        if ts_str:
+            timestamps.append(ts_str)
+
+    # Apply Aggregation Logic
+    if crowding_levels:
+        aggregated_entry["crowding_level"] = REV_LEVEL_MAP[max(crowding_levels)]
+
+    if frequencies:
+        # For dashboard, show the BEST frequency (min headway) available
+        aggregated_entry["train_frequency"] = min(frequencies)
+
+    if next_trains:
+        aggregated_entry["next_train_minutes"] = min(next_trains)
+
+    aggregated_entry["is_delay"] = any(delays)
+
+    # Use latest timestamp
+    if timestamps:
+        aggregated_entry["timestamp"] = sorted(timestamps, reverse=True)[0]
+
+    return aggregated_entry
+
+
+class LatestFlowStore:
+    """
+    Latest flow_data row per (station, line), fed by the ingest path and
+    reloaded from flow_latest.
+
+    The network-wide aggregate is computed at most once per version: every
+    update() bumps the version, and the first read afterwards rebuilds the
+    per-station aggregates that later reads reuse. Listeners are called
+    with the rows that replaced a station-line's latest row.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rows: Dict[Tuple[str, str], Dict] = {}
+        self._version = 0
+        self._updated_at: Optional[datetime] = None
+        self._network: Optional[Dict] = None
+        self._listeners: List[Callable[[List[Dict]], None]] = []
+        self._next_sync_at = 0.0
+        self.seeded = False
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def ready(self) -> bool:
+        """Has something to serve: seeded, or fed by an ingest since start."""
+        return self.seeded or self._version > 0
+
+    def sync_due(self) -> bool:
+        return time.monotonic() >= self._next_sync_at
+
+    def defer_sync(self, seconds: float) -> None:
+        self._next_sync_at = time.monotonic() + seconds
+
+    def add_listener(self, listener: Callable[[List[Dict]], None]) -> None:
+        self._listeners.append(listener)
+
+    def rows(self) -> List[Dict]:
+        """The latest row of every station-line."""
+        with self._lock:
+            return list(self._rows.values())
+
+    def update(self, rows: Iterable[Dict]) -> None:
+        """Merge newly stored rows, keeping the newest row per station-line."""
+        changed: Dict[Tuple[str, str], Dict] = {}
+        with self._lock:
+            for row in rows:
+                station = row.get("station_code")
+                if not station:
+                    continue
+                key = (station, row.get("line_code") or "default")
+                current = self._rows.get(key)
+                # A reload hands back rows the store already has: only a newer
+                # row, or a changed one at the same time (relabel), counts
+                if current is None or str(row.get("timestamp")) > str(current.get("timestamp")) or (
+                    str(row.get("timestamp")) == str(current.get("timestamp"))
+                    and any(current.get(field) != value for field, value in row.items())
+                ):
+                    self._rows[key] = row
+                    changed[key] = row
+            if changed:
+                self._version += 1
+                self._updated_at = datetime.now(timezone.utc)
+                self._network = None
+        if changed:
+            for listener in self._listeners:
+                listener(list(changed.values()))
+
+    def seed(self, rows: List[Dict]) -> None:
+        """Merge flow_latest rows, after a restart or on a periodic reload."""
+        self.update(rows)
+        self.seeded = True
+
+    def network(self) -> Dict:
+        """Aggregated latest record for every station, with its version."""
+        with self._lock:
+            if self._network is None:
+                per_station: Dict[str, list] = {}
+                for (station, _), row in self._rows.items():
+                    per_station.setdefault(station, []).append(row)
+                self._network = {
+                    "version": self._version,
+                    "updated_at": self._updated_at,
+                    "stations": {
+                        station: aggregate_station_flow(rows)
+                        for station, rows in sorted(per_station.items())
+                    },
+                }
+            return self._network
+
+
+latest_flow_store = LatestFlowStore()
+
+
+async def seed_latest_flow(supabase) -> bool:
+    """
+    Seed the store with every station-line's latest row in one query, from
+    Postgres or else the async Supabase client. False if neither is reachable.
+    """
+    try:
+        rows = await asyncio.to_thread(flow_repository.latest_lines)
+    except RepositoryUnavailable:
+        if not supabase:
+            return False
+        rows = (await latest_lines_query(supabase).execute()).data
+    latest_flow_store.seed(rows)
+    return True
+
+
+_sync_lock = asyncio.Lock()
+
+
+async def sync_latest_flow(supabase) -> bool:
+    """
+    Reload the store from flow_latest if it has not been for
+    LATEST_FLOW_SYNC_SECONDS; concurrent callers share one reload. A failed
+    reload is retried after the same interval while the store has something
+    to serve. False if it has nothing.
+    """
+    if not latest_flow_store.sync_due():
+        return latest_flow_store.ready
+    async with _sync_lock:
+        if latest_flow_store.sync_due():
+            try:
+                synced = await seed_latest_flow(supabase)
+            except Exception as e:
+                logger.warning(f"Reloading latest flow failed: {e}")
+                synced = False
+            if synced or latest_flow_store.ready:
+                latest_flow_store.defer_sync(LATEST_FLOW_SYNC_SECONDS)
+    return latest_flow_store.ready
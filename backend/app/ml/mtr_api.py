@@ -4,10 +4,12 @@ MTR Real-Time Train API Integration
 import requests
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Dict, List, Optional
 from datetime import datetime
 from pathlib import Path
-from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from app.ml.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -33,18 +35,44 @@ LINE_INFO = {
 
 MTR_API_URL = "https://rt.data.gov.hk/v1/transport/mtr/getSchedule.php"
 
-@lru_cache(maxsize=100)
-def _fetch_line_schedule_cached(line_code: str, station_code: str, cache_key: str) -> Optional[Dict]:
+# Overall budget for one station request. Lines still in flight when it
+# expires are reported as timed out instead of holding up the response.
+STATION_DEADLINE_SECONDS = 3.0
+
+# Largest interchange (ADM) serves 4 lines; leave headroom for concurrent requests
+_FETCH_WORKERS = 16
+
+# Pooled keep-alive session shared by all upstream fetches
+_session = requests.Session()
+_session.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=_FETCH_WORKERS),
+)
+_executor = ThreadPoolExecutor(max_workers=_FETCH_WORKERS, thread_name_prefix="mtr-api")
+
+# Schedule cache timings (seconds). Entries are fresh for SCHEDULE_TTL, then
+# served stale for up to SCHEDULE_STALE_TTL while one background refresh runs.
+# Failed fetches are remembered briefly so a down upstream is not hammered.
+SCHEDULE_TTL = 30
+SCHEDULE_STALE_TTL = 30
+SCHEDULE_NEGATIVE_TTL = 5
+# Comfortably above the number of line-station pairs in the network
+SCHEDULE_CACHE_SIZE = 512
+# Upstream request timeout; callers joining an in-flight fetch wait a little longer
+UPSTREAM_TIMEOUT_SECONDS = 5
+SCHEDULE_WAIT_SECONDS = UPSTREAM_TIMEOUT_SECONDS + 1
+
+def _fetch_line_schedule_uncached(line_code: str, station_code: str) -> Optional[Dict]:
     """
-    Internal cached function to fetch train schedule from MTR API.
-    cache_key includes timestamp to enable time-based cache invalidation.
+    Fetch train schedule from MTR API.
+    Returns None if the request fails or the API reports an error.
     """
     try:
         params = {
             "line": line_code,
             "sta": station_code
         }
-        response = requests.get(MTR_API_URL, params=params, timeout=5)
+        response = _session.get(MTR_API_URL, params=params, timeout=UPSTREAM_TIMEOUT_SECONDS)
         response.raise_for_status()
         data = response.json()
 
@@ -61,15 +89,29 @@ def _fetch_line_schedule_cached(line_code: str, station_code: str, cache_key: st
         logger.error(f"Failed to parse MTR API response for {line_code}-{station_code}: {e}")
         return None
 
-def fetch_line_schedule(line_code: str, station_code: str) -> Optional[Dict]:
+# Stale refreshes run on the cache's own pool, not _executor: fetch tasks
+# on _executor may be waiting on those very refreshes
+_schedule_cache = TTLCache(
+    _fetch_line_schedule_uncached,
+    ttl=SCHEDULE_TTL,
+    maxsize=SCHEDULE_CACHE_SIZE,
+    stale_ttl=SCHEDULE_STALE_TTL,
+    negative_ttl=SCHEDULE_NEGATIVE_TTL,
+    wait_timeout=SCHEDULE_WAIT_SECONDS,
+)
+
+def fetch_line_schedule(line_code: str, station_code: str, force_refresh: bool = False) -> Optional[Dict]:
     """
-    Fetch train schedule from MTR API with 30-second caching.
+    Fetch train schedule from MTR API through the shared schedule cache.
+    With force_refresh the upstream is queried even if a fresh entry exists.
     """
-    # Create cache key that changes every 30 seconds
-    current_time = datetime.now()
-    cache_key = f"{current_time.year}-{current_time.month}-{current_time.day}-{current_time.hour}-{current_time.minute}-{current_time.second // 30}"
+    if force_refresh:
+        return _schedule_cache.refresh((line_code, station_code))
+    return _schedule_cache.get((line_code, station_code))
 
-    return _fetch_line_schedule_cached(line_code, station_code, cache_key)
+def get_schedule_cache_stats() -> Dict[str, int]:
+    """Hit, miss and coalescing counters for the schedule cache."""
+    return _schedule_cache.stats()
 
 def calculate_frequency(trains: List[Dict]) -> Optional[float]:
     """
@@ -100,12 +142,66 @@ def calculate_frequency(trains: List[Dict]) -> Optional[float]:
 
     return None
 
-def get_station_trains(station_code: str) -> Dict:
+def _parse_trains(raw_trains: List[Dict]) -> List[Dict]:
+    """Convert raw MTR API train entries into the response format."""
+    trains = []
+    for train in raw_trains:
+        if train.get("valid") == "Y":
+            trains.append({
+                "platform": train.get("plat", ""),
+                "destination": train.get("dest", ""),
+                "destination_code": train.get("dest", ""),
+                "time": train.get("time", ""),
+                "ttnt": train.get("ttnt", ""),
+                "valid": True
+            })
+    return trains
+
+def parse_line_schedule(line_code: str, station_code: str, api_response: Dict) -> Optional[Dict]:
+    """
+    Extract one line's arrivals at a station from an MTR API response.
+
+    Returns None if the response has no data for this line-station pair.
+    """
+    # Find the data for this line-station combination
+    data_key = f"{line_code}-{station_code}"
+    line_data = api_response.get("data", {}).get(data_key, {})
+
+    if not line_data:
+        logger.warning(f"No data found for {data_key} in API response")
+        return None
+
+    # Raw lists for frequency calculation
+    raw_up = line_data.get("UP", [])
+    raw_down = line_data.get("DOWN", [])
+
+    # Get line info
+    line_info = LINE_INFO.get(line_code, {
+        "name": line_code,
+        "color": "#666666"
+    })
+
+    return {
+        "line_code": line_code,
+        "line_name": line_info["name"],
+        "color": line_info["color"],
+        "up_trains": _parse_trains(raw_up),
+        "down_trains": _parse_trains(raw_down),
+        "frequency_up": calculate_frequency(raw_up),
+        "frequency_down": calculate_frequency(raw_down)
+    }
+
+def get_station_trains(station_code: str, deadline: float = STATION_DEADLINE_SECONDS) -> Dict:
     """
     Get all train arrivals for a station across all lines it serves.
 
+    Lines are fetched concurrently. Any line that has not answered within
+    `deadline` seconds is left out and listed in `timed_out_lines`, with
+    `partial` set, rather than delaying the whole response.
+
     Args:
         station_code: 3-letter station code (e.g., 'CEN')
+        deadline: Overall time budget in seconds for all upstream fetches
 
     Returns:
         Dict with structure:
@@ -123,7 +219,9 @@ def get_station_trains(station_code: str) -> Dict:
                     "frequency_up": 3.0,
                     "frequency_down": 4.0
                 }
-            ]
+            ],
+            "partial": false,
+            "timed_out_lines": []
         }
     """
     station_code = station_code.upper()
@@ -137,15 +235,34 @@ def get_station_trains(station_code: str) -> Dict:
             "station_code": station_code,
             "station_name": station_code,
             "timestamp": datetime.now().isoformat(),
-            "lines": []
+            "lines": [],
+            "partial": False,
+            "timed_out_lines": []
         }
 
+    futures = {
+        line_code: _executor.submit(fetch_line_schedule, line_code, station_code)
+        for line_code in line_codes
+    }
+    wait(futures.values(), timeout=deadline)
+
     lines_data = []
+    timed_out_lines = []
     station_name = station_code  # Default to code
     timestamp = None
 
-    for line_code in line_codes:
-        api_response = fetch_line_schedule(line_code, station_code)
+    # Walk lines in their configured order so the response is stable
+    for line_code, future in futures.items():
+        if not future.done():
+            # Left running: a late answer still warms the schedule cache
+            timed_out_lines.append(line_code)
+            continue
+
+        try:
+            api_response = future.result()
+        except Exception as e:
+            logger.error(f"Unexpected error fetching {line_code}-{station_code}: {e}")
+            continue
 
         if not api_response:
             continue
@@ -154,69 +271,20 @@ def get_station_trains(station_code: str) -> Dict:
         if not timestamp:
             timestamp = api_response.get("curr_time", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-        # Find the data for this line-station combination
-        data_key = f"{line_code}-{station_code}"
-        line_data = api_response.get("data", {}).get(data_key, {})
-
-        if not line_data:
-            logger.warning(f"No data found for {data_key} in API response")
-            continue
+        line_entry = parse_line_schedule(line_code, station_code, api_response)
+        if line_entry:
+            lines_data.append(line_entry)
 
-        # Raw lists for frequency calculation
-        raw_up = line_data.get("UP", [])
-        raw_down = line_data.get("DOWN", [])
-
-        # Parse UP and DOWN trains
-        up_trains = []
-        down_trains = []
-
-        for train in raw_up:
-            if train.get("valid") == "Y":
-                up_trains.append({
-                    "platform": train.get("plat", ""),
-                    "destination": train.get("dest", ""),
-                    "destination_code": train.get("dest", ""),
-                    "time": train.get("time", ""),
-                    "ttnt": train.get("ttnt", ""),
-                    "valid": True
-                })
-
-        for train in raw_down:
-            if train.get("valid") == "Y":
-                down_trains.append({
-                    "platform": train.get("plat", ""),
-                    "destination": train.get("dest", ""),
-                    "destination_code": train.get("dest", ""),
-                    "time": train.get("time", ""),
-                    "ttnt": train.get("ttnt", ""),
-                    "valid": True
-                })
-
-        # Calculate frequency
-        freq_up = calculate_frequency(raw_up)
-        freq_down = calculate_frequency(raw_down)
-
-        # Get line info
-        line_info = LINE_INFO.get(line_code, {
-            "name": line_code,
-            "color": "#666666"
-        })
-
-        lines_data.append({
-            "line_code": line_code,
-            "line_name": line_info["name"],
-            "color": line_info["color"],
-            "up_trains": up_trains,
-            "down_trains": down_trains,
-            "frequency_up": freq_up,
-            "frequency_down": freq_down
-        })
+    if timed_out_lines:
+        logger.warning(f"Deadline exceeded for {station_code} lines: {', '.join(timed_out_lines)}")
 
     return {
         "station_code": station_code,
         "station_name": station_name,
         "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "lines": lines_data
+        "lines": lines_data,
+        "partial": bool(timed_out_lines),
+        "timed_out_lines": timed_out_lines
     }
 
 def get_lines_for_station(station_code: str) -> List[str]:
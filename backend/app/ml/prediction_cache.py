@@ -0,0 +1,232 @@
+"""
+In-memory serving cache for the predictions table.
+
+Predictions only change when a forecast batch is published, so the API
+keeps every upcoming prediction in memory, grouped per station and sorted
+by prediction_timestamp. Range reads are a binary search over those
+arrays. The cache is reloaded when a newer prediction_versions row
+appears: it is polled on an interval, or pushed through
+POST /api/predictions/publish by the batch job. The new snapshot (version,
+stations and load time together) is swapped in with one assignment; a
+reader takes it once, so its ETag and body always come from one version.
+"""
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.db.database import get_supabase
+from app.ml.crowding import CROWDING_LEVELS
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_POLL_SECONDS = float(os.getenv("PREDICTION_POLL_SECONDS", "60"))
+# Keep predictions this far in the past so a request started "now" is covered
+PREDICTION_CACHE_LOOKBACK = timedelta(hours=1)
+PAGE_SIZE = 1000
+
+_LEVEL_CODES = {level: code for code, level in enumerate(CROWDING_LEVELS)}
+
+
+def _to_us(value) -> int:
+    """Epoch microseconds of an ISO string or datetime (naive means UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+class StationPredictions:
+    """Predictions of one station, sorted by prediction_timestamp."""
+
+    __slots__ = ("timestamps", "levels", "confidence", "rows", "latest")
+
+    def __init__(self, rows: List[Dict]) -> None:
+        rows.sort(key=lambda row: (row["prediction_timestamp"], row["id"]))
+        self.rows = rows
+        self.timestamps = np.array([_to_us(row["prediction_timestamp"]) for row in rows], dtype=np.int64)
+        self.levels = np.array(
+            [_LEVEL_CODES.get(row["predicted_crowding"], -1) for row in rows], dtype=np.int8
+        )
+        self.confidence = np.array(
+            [np.nan if row.get("confidence") is None else row["confidence"] for row in rows],
+            dtype=np.float64,
+        )
+        self.latest = max(rows, key=lambda row: (row.get("created_at") or "", row["id"]))
+
+    def between(self, start: datetime, end: datetime) -> List[Dict]:
+        """Rows with start <= prediction_timestamp <= end."""
+        lo = np.searchsorted(self.timestamps, _to_us(start), side="left")
+        hi = np.searchsorted(self.timestamps, _to_us(end), side="right")
+        return self.rows[lo:hi]
+
+    def at(self, axis: np.ndarray):
+        """Level codes (-1 if missing) and confidences at exactly the axis timestamps."""
+        idx = np.searchsorted(self.timestamps, axis)
+        clipped = np.minimum(idx, len(self.timestamps) - 1)
+        hit = (idx < len(self.timestamps)) & (self.timestamps[clipped] == axis)
+        return np.where(hit, self.levels[clipped], -1), np.where(hit, self.confidence[clipped], np.nan)
+
+
+def group_by_station(rows: Iterable[Dict]) -> Dict[str, StationPredictions]:
+    per_station: Dict[str, List[Dict]] = {}
+    for row in rows:
+        per_station.setdefault(row["station_code"], []).append(row)
+    return {code: StationPredictions(rows) for code, rows in per_station.items()}
+
+
+def prediction_grid(stations: Dict[str, StationPredictions], timestamps: List[datetime]) -> Dict:
+    """
+    Column-oriented view of many stations on a shared time axis:
+    {"levels": [...], "timestamps": [...], "stations": {code: [level index
+    or None]}, "confidence": {code: [float or None]}}.
+    """
+    axis = np.array([_to_us(t) for t in timestamps], dtype=np.int64)
+    levels_by_station: Dict[str, List[Optional[int]]] = {}
+    confidence_by_station: Dict[str, List[Optional[float]]] = {}
+    for code, predictions in sorted(stations.items()):
+        levels, confidence = predictions.at(axis)
+        levels_by_station[code] = [None if level < 0 else level for level in levels.tolist()]
+        confidence_by_station[code] = [
+            None if np.isnan(value) else round(value, 4) for value in confidence.tolist()
+        ]
+    return {
+        "levels": list(CROWDING_LEVELS),
+        "timestamps": timestamps,
+        "stations": levels_by_station,
+        "confidence": confidence_by_station,
+    }
+
+
+@dataclass(frozen=True)
+class PredictionSnapshot:
+    """One published forecast version (treat stations as read-only)."""
+    version: Optional[int] = None
+    stations: Dict[str, StationPredictions] = field(default_factory=dict)
+    loaded_at: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.version is not None
+
+    def station(self, station_code: str) -> Optional[StationPredictions]:
+        return self.stations.get(station_code)
+
+    def select(self, station_codes: Optional[List[str]] = None) -> Dict[str, StationPredictions]:
+        """Stations of this version, optionally restricted to `station_codes`."""
+        if station_codes is None:
+            return dict(self.stations)
+        return {code: self.stations[code] for code in station_codes if code in self.stations}
+
+
+class PredictionCache:
+    def __init__(self, poll_seconds: float = PREDICTION_POLL_SECONDS) -> None:
+        self.poll_seconds = poll_seconds
+        self._snapshot = PredictionSnapshot()
+        self._refresh_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> PredictionSnapshot:
+        return self._snapshot
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot.ready
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._snapshot.version
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at.isoformat() if snapshot.loaded_at else None,
+            "stations": len(snapshot.stations),
+            "predictions": sum(len(s.rows) for s in snapshot.stations.values()),
+        }
+
+    def _latest_version(self, supabase) -> Optional[int]:
+        response = (
+            supabase.table("prediction_versions")
+            .select("id")
+            .order("id", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return response.data[0]["id"] if response.data else None
+
+    def _load_rows(self, supabase) -> List[Dict]:
+        since = (datetime.now(timezone.utc) - PREDICTION_CACHE_LOOKBACK).isoformat()
+        rows: List[Dict] = []
+        last_id = 0
+        while True:
+            page = (
+                supabase.table("predictions")
+                .select("*")
+                .gte("prediction_timestamp", since)
+                .gt("id", last_id)
+                .order("id")
+                .limit(PAGE_SIZE)
+                .execute()
+            ).data
+            if not page:
+                break
+            rows.extend(page)
+            last_id = page[-1]["id"]
+        return rows
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload if a newer version has been published (or always with
+        force). Returns True if a new snapshot was swapped in. Concurrent
+        calls do not stack: a refresh already in progress wins.
+        """
+        supabase = get_supabase()
+        if not supabase:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            version = self._latest_version(supabase)
+            if version is None or (version == self._snapshot.version and not force):
+                return False
+
+            stations = group_by_station(self._load_rows(supabase))
+
+            self._snapshot = PredictionSnapshot(version, stations, datetime.now(timezone.utc))
+            logger.info(f"Prediction cache loaded version {version} ({len(stations)} stations)")
+            return True
+        except Exception as e:
+            logger.error(f"Prediction cache refresh failed: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="prediction-cache")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(self.poll_seconds)
+
+
+prediction_cache = PredictionCache()
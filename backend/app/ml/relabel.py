@@ -0,0 +1,270 @@
+"""
+Resumable backfill that re-derives crowding_level with the current rules.
+
+Streams rows by keyset on (timestamp, id) over a time range, reclassifies
+each chunk with the vectorized classifier and the holiday calendar for the
+row's Hong Kong date, and writes back only the rows whose label changed.
+Progress is checkpointed after every chunk so an interrupted run resumes
+where it stopped.
+
+Usage:
+    python -m app.ml.relabel --table flow_data --start 2026-01-01 --end 2026-02-01
+
+Rain is not stored with historical rows. By default each row is classified
+both dry and rainy, and a stored label matching either is left alone; other
+rows get the dry label. --assume-dry or --assume-rainy forces one of them.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from app.db.database import engine
+from app.ml.crowding import CROWDING_LEVELS, DEFAULT_THRESHOLDS, classify_crowding_batch
+from app.ml.external_data import get_public_holidays
+from app.ml.ingest import INGEST_TABLES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 20000
+DEFAULT_CHECKPOINT_DIR = Path(__file__).resolve().parents[2] / ".relabel"
+
+SELECT_CHUNK = """
+    SELECT
+        id,
+        timestamp,
+        COALESCE(train_frequency, next_train_minutes) AS frequency,
+        EXTRACT(hour FROM timestamp AT TIME ZONE 'Asia/Hong_Kong')::int AS hk_hour,
+        (timestamp AT TIME ZONE 'Asia/Hong_Kong')::date AS hk_date,
+        COALESCE(is_delay, false) AS is_delay,
+        crowding_level
+    FROM {table}
+    WHERE timestamp >= %(start)s
+      AND timestamp < %(end)s
+      AND (timestamp, id) > (%(after_ts)s, %(after_id)s)
+      AND COALESCE(train_frequency, next_train_minutes) IS NOT NULL
+    ORDER BY timestamp, id
+    LIMIT %(limit)s
+"""
+
+UPDATE_LABELS = """
+    UPDATE {table} AS t
+    SET crowding_level = v.crowding_level
+    FROM (VALUES %s) AS v(id, crowding_level)
+    WHERE t.id = v.id
+"""
+
+
+def _load_checkpoint(path: Path, table: str, start: datetime, end: datetime) -> Dict:
+    """Resume state for this exact job, or a fresh one."""
+    fresh = {
+        "table": table,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "after_ts": start.isoformat(),
+        "after_id": -1,
+        "scanned": 0,
+        "updated": 0,
+        "done": False,
+    }
+    if not path.exists():
+        return fresh
+
+    state = json.loads(path.read_text())
+    if (state.get("table"), state.get("start"), state.get("end")) != (table, fresh["start"], fresh["end"]):
+        logger.warning(f"Checkpoint {path} belongs to a different job, starting over")
+        return fresh
+    return state
+
+
+def _save_checkpoint(path: Path, state: Dict) -> None:
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state, indent=2))
+    os.replace(tmp_path, path)
+
+
+def derive_labels(
+    frequency: np.ndarray,
+    hour: np.ndarray,
+    is_holiday: np.ndarray,
+    is_delay: np.ndarray,
+    labels: Sequence[Optional[str]],
+    assume_rainy: Optional[bool] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    New labels for a chunk and the positions whose label changes.
+
+    With assume_rainy None, a stored label that the rain adjustment explains
+    is kept: only rows matching neither the dry nor the rainy label change
+    (to the dry one).
+    """
+    levels = np.array(CROWDING_LEVELS, dtype=object)
+
+    def classify(is_rainy: bool) -> np.ndarray:
+        return levels[classify_crowding_batch(
+            frequency=frequency,
+            hour=hour,
+            is_holiday=is_holiday,
+            is_rainy=is_rainy,
+            is_delay=is_delay,
+            thresholds=DEFAULT_THRESHOLDS,
+        )]
+
+    stored = np.array(labels, dtype=object)
+    if assume_rainy is None:
+        new_labels = classify(False)
+        changed = np.flatnonzero((new_labels != stored) & (classify(True) != stored))
+    else:
+        new_labels = classify(assume_rainy)
+        changed = np.flatnonzero(new_labels != stored)
+    return new_labels, changed
+
+
+def relabel(
+    table: str,
+    start: datetime,
+    end: datetime,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint_path: Optional[Path] = None,
+    assume_rainy: Optional[bool] = None,
+    dry_run: bool = False,
+) -> Dict:
+    """
+    Reclassify every row of `table` in [start, end) and write back changes.
+    `assume_rainy` as in derive_labels. Returns the final job state
+    including throughput.
+    """
+    if table not in INGEST_TABLES:
+        raise ValueError(f"Unsupported table: {table}")
+
+    checkpoint_path = checkpoint_path or DEFAULT_CHECKPOINT_DIR / f"{table}.json"
+    state = _load_checkpoint(checkpoint_path, table, start, end)
+    if state["done"]:
+        logger.info(f"{table} already relabelled for this range ({checkpoint_path})")
+        return state
+
+    holidays = np.array(sorted(get_public_holidays()), dtype="datetime64[D]")
+    select_sql = SELECT_CHUNK.format(table=table)
+    update_sql = UPDATE_LABELS.format(table=table)
+
+    run_scanned = 0
+    run_updated = 0
+    started = time.monotonic()
+
+    conn = engine.raw_connection()
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(select_sql, {
+                    "start": start,
+                    "end": end,
+                    "after_ts": state["after_ts"],
+                    "after_id": state["after_id"],
+                    "limit": chunk_size,
+                })
+                rows = cur.fetchall()
+
+            if not rows:
+                break
+
+            ids, timestamps, frequency, hours, dates, delays, labels = zip(*rows)
+            dates = np.array(dates, dtype="datetime64[D]")
+
+            new_labels, changed = derive_labels(
+                frequency=np.array(frequency, dtype=np.float64),
+                hour=np.array(hours),
+                is_holiday=np.isin(dates, holidays),
+                is_delay=np.array(delays, dtype=bool),
+                labels=labels,
+                assume_rainy=assume_rainy,
+            )
+
+            if len(changed) and not dry_run:
+                with conn.cursor() as cur:
+                    execute_values(
+                        cur,
+                        update_sql,
+                        [(ids[i], new_labels[i]) for i in changed],
+                        page_size=1000,
+                    )
+            conn.commit()
+
+            run_scanned += len(rows)
+            run_updated += len(changed)
+            state["after_ts"] = timestamps[-1].isoformat()
+            state["after_id"] = ids[-1]
+            state["scanned"] += len(rows)
+            state["updated"] += len(changed)
+            if not dry_run:
+                _save_checkpoint(checkpoint_path, state)
+
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"{table}: scanned {state['scanned']} rows, updated {state['updated']} "
+                f"(up to {state['after_ts']}, {run_scanned / elapsed:,.0f} rows/s)"
+            )
+    finally:
+        conn.close()
+
+    elapsed = time.monotonic() - started
+    state["done"] = True
+    state["run_seconds"] = round(elapsed, 2)
+    state["rows_per_second"] = round(run_scanned / elapsed, 1) if elapsed else None
+    state["run_scanned"] = run_scanned
+    state["run_updated"] = run_updated
+    if not dry_run:
+        _save_checkpoint(checkpoint_path, state)
+    return state
+
+
+def _parse_datetime(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Re-derive crowding_level for stored rows.")
+    parser.add_argument("--table", choices=INGEST_TABLES, default="flow_data")
+    parser.add_argument("--start", type=_parse_datetime, required=True, help="ISO date/time (inclusive)")
+    # Required so a resumed run matches its checkpoint
+    parser.add_argument("--end", type=_parse_datetime, required=True, help="ISO date/time (exclusive)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", type=Path, default=None, help="Checkpoint file (default: backend/.relabel/<table>.json)")
+    rain = parser.add_mutually_exclusive_group()
+    rain.add_argument("--assume-dry", dest="assume_rainy", action="store_const", const=False,
+                      help="Classify every row as dry, overwriting rain-adjusted labels")
+    rain.add_argument("--assume-rainy", dest="assume_rainy", action="store_const", const=True,
+                      help="Classify every row with the rain adjustment applied")
+    parser.add_argument("--dry-run", action="store_true", help="Count changes without writing them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    state = relabel(
+        table=args.table,
+        start=args.start,
+        end=args.end,
+        chunk_size=args.chunk_size,
+        checkpoint_path=args.checkpoint,
+        assume_rainy=args.assume_rainy,
+        dry_run=args.dry_run,
+    )
+    print(
+        f"{args.table}: scanned {state.get('run_scanned', 0)} rows, "
+        f"{'would update' if args.dry_run else 'updated'} {state.get('run_updated', 0)} "
+        f"in {state.get('run_seconds', 0)}s ({state.get('rows_per_second')} rows/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
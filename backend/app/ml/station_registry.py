@@ -0,0 +1,137 @@
+"""
+In-memory station registry.
+
+The stations table and STATION_LINES almost never change, so they are
+loaded once into an immutable snapshot indexed by station code. Every
+station lookup is then a dictionary hit. The snapshot is rebuilt on a slow
+interval, after a station is created, or on POST /api/stations/refresh.
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.db.database import get_supabase
+from app.ml.mtr_api import STATION_LINES
+
+logger = logging.getLogger(__name__)
+
+STATION_REGISTRY_REFRESH_SECONDS = float(os.getenv("STATION_REGISTRY_REFRESH_SECONDS", "3600"))
+PAGE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class RegistrySnapshot:
+    """
+    stations: station rows ordered by code (treat as read-only)
+    by_code: code -> station row
+    lines: code -> line codes serving the station
+    version: content hash, unchanged by a reload that finds no changes
+    """
+    stations: Tuple[Dict, ...] = ()
+    codes: Tuple[str, ...] = ()
+    by_code: Dict[str, Dict] = field(default_factory=dict)
+    lines: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    version: str = ""
+    loaded_at: Optional[datetime] = None
+
+
+def build_snapshot(rows: List[Dict]) -> RegistrySnapshot:
+    stations = tuple(sorted(rows, key=lambda row: row["code"]))
+    return RegistrySnapshot(
+        stations=stations,
+        codes=tuple(row["code"] for row in stations),
+        by_code={row["code"]: row for row in stations},
+        lines={code: tuple(lines) for code, lines in STATION_LINES.items()},
+        version=hashlib.sha1(
+            json.dumps(stations, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest(),
+        loaded_at=datetime.now(timezone.utc),
+    )
+
+
+class StationRegistry:
+    def __init__(self, refresh_seconds: float = STATION_REGISTRY_REFRESH_SECONDS) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[RegistrySnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def snapshot(self) -> RegistrySnapshot:
+        return self._snapshot or RegistrySnapshot()
+
+    def get(self, code: str) -> Optional[Dict]:
+        return self.snapshot.by_code.get(code)
+
+    def name(self, code: str) -> Optional[str]:
+        station = self.snapshot.by_code.get(code)
+        return station["name"] if station else None
+
+    def page(self, limit: int, after_code: Optional[str] = None, skip: int = 0) -> List[Dict]:
+        """Stations ordered by code, after `after_code` (or from offset `skip`)."""
+        snapshot = self.snapshot
+        start = bisect.bisect_right(snapshot.codes, after_code) if after_code is not None else skip
+        return list(snapshot.stations[start:start + limit])
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            "stations": len(snapshot.stations),
+            "version": snapshot.version[:12] or None,
+            "loaded_at": snapshot.loaded_at.isoformat() if snapshot.loaded_at else None,
+        }
+
+    def refresh(self) -> bool:
+        """Reload the stations table; keeps the previous snapshot on failure."""
+        supabase = get_supabase()
+        if not supabase:
+            return False
+        with self._refresh_lock:
+            try:
+                rows: List[Dict] = []
+                while True:
+                    query = supabase.table("stations").select("*").order("code").limit(PAGE_SIZE)
+                    if rows:
+                        query = query.gt("code", rows[-1]["code"])
+                    page = query.execute().data
+                    if not page:
+                        break
+                    rows.extend(page)
+            except Exception as e:
+                logger.error(f"Station registry refresh failed: {e}")
+                return False
+            self._snapshot = build_snapshot(rows)
+        logger.info(f"Station registry loaded {len(rows)} stations")
+        return True
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="station-registry")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(self.refresh_seconds)
+
+
+station_registry = StationRegistry()
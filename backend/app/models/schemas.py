@@ -0,0 +1,152 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, List, Optional
+from datetime import datetime
+
+
+# Stations
+class StationBase(BaseModel):
+    code: str
+    name: str
+    line: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class StationCreate(StationBase):
+    pass
+
+class StationResponse(StationBase):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+
+# Flow data
+class FlowDataBase(BaseModel):
+    station_code: str
+    line_code: Optional[str] = None
+    timestamp: datetime
+    next_train_minutes: Optional[float] = None
+    train_frequency: Optional[float] = None
+    crowding_level: Optional[str] = None
+    is_delay: Optional[bool] = False
+
+class FlowDataCreate(FlowDataBase):
+    pass
+
+class FlowDataResponse(FlowDataBase):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+class NetworkLatestFlowResponse(BaseModel):
+    """Aggregated latest record of every station, tagged with the store version."""
+    version: int
+    updated_at: Optional[datetime] = None
+    stations: Dict[str, FlowDataResponse] = {}
+
+class FlowHistoryPoint(BaseModel):
+    """Aggregates for one time bucket of a station's flow history."""
+    bucket_start: datetime
+    samples: int
+    headway_mean: Optional[float] = None
+    headway_min: Optional[float] = None
+    headway_max: Optional[float] = None
+    next_train_mean: Optional[float] = None
+    next_train_min: Optional[float] = None
+    next_train_max: Optional[float] = None
+    crowding_low: int = 0
+    crowding_medium: int = 0
+    crowding_high: int = 0
+    crowding_unknown: int = 0
+    delay_ratio: float = 0.0
+
+class FlowHistoryResponse(BaseModel):
+    station_code: str
+    line_code: Optional[str] = None
+    bucket: str
+    start_time: datetime
+    end_time: datetime
+    points: List[FlowHistoryPoint] = []
+
+class FlowDataBatchResult(BaseModel):
+    """Outcome of one row of a batch insert, in request order."""
+    index: int
+    success: bool
+    id: Optional[int] = None
+    station_code: Optional[str] = None
+    line_code: Optional[str] = None
+    crowding_level: Optional[str] = None
+    error: Optional[str] = None
+
+class IngestTargetResult(BaseModel):
+    success: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class IngestResult(BaseModel):
+    """Outcome of one ingested row, reported separately for each target table."""
+    index: int
+    success: bool
+    station_code: Optional[str] = None
+    line_code: Optional[str] = None
+    crowding_level: Optional[str] = None
+    targets: Dict[str, IngestTargetResult] = {}
+    error: Optional[str] = None
+
+
+# Predictions
+class PredictionBase(BaseModel):
+    station_code: str
+    prediction_timestamp: datetime
+    predicted_crowding: str
+    confidence: Optional[float] = None
+
+class PredictionCreate(PredictionBase):
+    pass
+
+class PredictionResponse(PredictionBase):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    created_at: Optional[datetime] = None
+
+class PredictionGridResponse(BaseModel):
+    """
+    Predictions of many stations on one hourly time axis. stations[code][i]
+    is the index into `levels` predicted for timestamps[i] (None if there is
+    no prediction for that hour); confidence is aligned the same way.
+    """
+    version: Optional[int] = None
+    hours_ahead: int
+    levels: List[str]
+    timestamps: List[datetime]
+    stations: Dict[str, List[Optional[int]]] = {}
+    confidence: Dict[str, List[Optional[float]]] = {}
+
+
+# Real-time train arrivals
+class TrainArrival(BaseModel):
+    platform: str
+    destination: str
+    destination_code: str
+    time: str
+    ttnt: str
+    valid: bool
+
+class LineTrains(BaseModel):
+    line_code: str
+    line_name: str
+    color: str
+    up_trains: List[TrainArrival] = []
+    down_trains: List[TrainArrival] = []
+    frequency_up: Optional[float] = None
+    frequency_down: Optional[float] = None
+
+class StationTrainsResponse(BaseModel):
+    station_code: str
+    station_name: str
+    timestamp: str
+    lines: List[LineTrains] = []
+    # Set when some lines missed the request deadline and were left out
+    partial: bool = False
+    timed_out_lines: List[str] = []
@@ -1,27 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
+import asyncio
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime, timedelta, timezone
-from app.db.database import get_supabase
+from app.db.database import get_async_supabase, get_supabase
+from app.db.export import MEDIA_TYPES, stream_export
+from app.db.http_cache import not_modified
+from app.db.partitions import NotPartitioned, partition_manager
+from app.db.pagination import NEXT_CURSOR_HEADER, InvalidCursor, decode_cursor, encode_cursor
+from app.db.repository import RepositoryUnavailable, SupabaseFlowRepository, flow_repository, latest_lines_query
 from app.models import schemas
-from app.ml.crowding import classify_crowding
-from app.ml.external_data import is_today_holiday, get_weather_status
-from supabase import Client
+from app.ml.ingest import (
+    DATABASE_UNAVAILABLE, validate_flow_rows, fill_crowding_levels, ainsert_flow_row, ainsert_flow_rows,
+)
+from app.ml.latest_flow import aggregate_station_flow, latest_flow_store, sync_latest_flow
+from app.ml.collector import get_collector
+from supabase import AsyncClient
 
 router = APIRouter()
 
 @router.delete("/cleanup")
-def cleanup_old_data(hours: int = 24, supabase: Client = Depends(get_supabase)):
-    """Delete flow data older than the specified number of hours (default: 24)"""
+async def cleanup_old_data(hours: int = 24, supabase: AsyncClient = Depends(get_async_supabase)):
+    """
+    Drop flow data older than the specified number of hours (default: 24).
+    Whole daily partitions are detached and dropped; the one straddling the
+    cutoff is kept until it has fully expired. Until migrations/007 has been
+    applied, or while Postgres cannot be reached directly, rows are deleted
+    through Supabase instead.
+    """
+    # Use timezone-aware UTC datetime to match the partition bounds
+    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours)
+
+    try:
+        dropped = await asyncio.to_thread(partition_manager.drop_expired, "flow_data", cutoff_time)
+    except (NotPartitioned, RepositoryUnavailable):
+        return await delete_old_rows(supabase, cutoff_time)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Cleanup failed: {str(e)}")
+
+    return {
+        "message": "Cleanup complete",
+        "partitions_dropped": len(dropped),
+        "partitions": dropped,
+        "cutoff_time": cutoff_time.isoformat()
+    }
+
+async def delete_old_rows(supabase: AsyncClient, cutoff_time: datetime) -> Dict[str, Any]:
+    """Row-by-row retention through Supabase, for an unpartitioned flow_data"""
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
 
-    # Use timezone-aware UTC datetime to match database column
-    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours)
-
     try:
         # Use RPC call to execute a more efficient server-side deletion
         # This avoids timeout issues with large datasets
-        result = supabase.rpc(
+        result = await supabase.rpc(
             'delete_old_flow_data',
             {'cutoff_timestamp': cutoff_time.isoformat()}
         ).execute()
@@ -29,11 +61,11 @@ def cleanup_old_data(hours: int = 24, supabase: Client = Depends(get_supabase)):
         deleted_count = result.data if result.data else 0
 
         return {
-            "message": f"Cleanup complete",
+            "message": "Cleanup complete",
             "deleted_count": deleted_count,
             "cutoff_time": cutoff_time.isoformat()
         }
-    except Exception as e:
+    except Exception:
         # Fallback: If RPC doesn't exist, try direct deletion with limit
         # This is less efficient but works as a backup
         try:
@@ -43,7 +75,7 @@ def cleanup_old_data(hours: int = 24, supabase: Client = Depends(get_supabase)):
 
             while True:
                 # Get batch of IDs to delete
-                batch_response = (
+                batch_response = await (
                     supabase.table("flow_data")
                     .select("id")
                     .lt("timestamp", cutoff_time.isoformat())
@@ -51,12 +83,12 @@ def cleanup_old_data(hours: int = 24, supabase: Client = Depends(get_supabase)):
                     .execute()
                 )
 
-                if not batch_response.data or len(batch_response.data) == 0:
+                if not batch_response.data:
                     break
 
                 # Delete this batch
                 ids_to_delete = [row['id'] for row in batch_response.data]
-                supabase.table("flow_data").delete().in_("id", ids_to_delete).execute()
+                await supabase.table("flow_data").delete().in_("id", ids_to_delete).execute()
 
                 total_deleted += len(ids_to_delete)
 
@@ -65,7 +97,7 @@ def cleanup_old_data(hours: int = 24, supabase: Client = Depends(get_supabase)):
                     break
 
             return {
-                "message": f"Cleanup complete (batched)",
+                "message": "Cleanup complete (batched)",
                 "deleted_count": total_deleted,
                 "cutoff_time": cutoff_time.isoformat()
             }
@@ -76,14 +108,19 @@ def cleanup_old_data(hours: int = 24, supabase: Client = Depends(get_supabase)):
             )
 
 @router.get("/", response_model=List[schemas.FlowDataResponse])
-def get_flow_data(
+async def get_flow_data(
+    response: Response,
     station_code: Optional[str] = None,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
     limit: int = Query(default=100, le=1000),
-    supabase: Client = Depends(get_supabase)
+    cursor: Optional[str] = None,
+    supabase: AsyncClient = Depends(get_async_supabase)
 ):
-    """Get flow data with optional filters"""
+    """
+    Get flow data with optional filters, newest first.
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one.
+    """
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
 
@@ -98,130 +135,211 @@ def get_flow_data(
     if end_time:
         query = query.lte("timestamp", end_time.isoformat())
 
-    # Limit must be applied after filters, and range is used for offset/limit
-    # range(0, limit - 1) gives 'limit' items
-    query = query.order("timestamp", desc=True).limit(limit)
-    
-    response = query.execute()
-    return response.data
+    if cursor:
+        try:
+            after_ts, after_id = decode_cursor(cursor, datetime, int)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Rows strictly after (timestamp, id) in descending order
+        after_ts = after_ts.isoformat()
+        query = query.or_(
+            f'timestamp.lt."{after_ts}",and(timestamp.eq."{after_ts}",id.lt.{after_id})'
+        )
+
+    # (timestamp, id) gives a total order, so pages never overlap or skip rows
+    query = query.order("timestamp", desc=True).order("id", desc=True).limit(limit)
+
+    result = await query.execute()
+    if len(result.data) == limit:
+        last = result.data[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last["timestamp"], last["id"])
+    return result.data
+
+@router.get("/latest", response_model=schemas.NetworkLatestFlowResponse)
+async def get_network_latest_flow(supabase: AsyncClient = Depends(get_async_supabase)):
+    """
+    Get the aggregated latest flow record for every station in one response.
+    Served from the in-memory store that the ingest path keeps up to date,
+    reloaded from flow_latest once per collection interval so rows ingested
+    by other instances show up too.
+    """
+    if not await sync_latest_flow(supabase):
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+
+    return latest_flow_store.network()
+
+@router.get("/export")
+async def export_flow_data(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    station_code: Optional[str] = None,
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+):
+    """
+    Stream flow_data rows for a time range as CSV or NDJSON, optionally gzipped.
+    Output starts immediately and memory use is constant for any range.
+    """
+    filename = f"flow_data.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    try:
+        # Connects and starts the query before any header is sent
+        body = await asyncio.to_thread(
+            stream_export,
+            "flow_data",
+            fmt=format,
+            compress=gzip,
+            start_time=start_time,
+            end_time=end_time,
+            station_code=station_code,
+        )
+    except RepositoryUnavailable:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+def _as_utc(value: datetime) -> datetime:
+    """Query times without an offset are taken as UTC."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+HISTORY_BUCKETS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600}
+MAX_HISTORY_POINTS = 2000
+
+# Runs on the SQLAlchemy engine, whose driver blocks: left as a sync route
+# so FastAPI runs it in the threadpool instead of on the event loop
+@router.get("/history", response_model=schemas.FlowHistoryResponse)
+def get_flow_history(
+    station_code: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    bucket: Literal["1m", "5m", "15m", "1h"] = "15m",
+    line_code: Optional[str] = None,
+):
+    """
+    Get time-bucketed flow history for a station (default: last 24 hours).
+    Each point carries sample count, headway and next-train stats, the
+    crowding level distribution and the share of delayed samples.
+    """
+    end_time = _as_utc(end_time) if end_time else datetime.now(timezone.utc)
+    start_time = _as_utc(start_time) if start_time else end_time - timedelta(hours=24)
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start_time must be before end_time")
+
+    bucket_seconds = HISTORY_BUCKETS[bucket]
+    if (end_time - start_time).total_seconds() / bucket_seconds > MAX_HISTORY_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large for {bucket} buckets (max {MAX_HISTORY_POINTS} points)"
+        )
+
+    args = (station_code, start_time, end_time, bucket_seconds, line_code)
+    try:
+        try:
+            points = flow_repository.history(*args)
+        except RepositoryUnavailable:
+            points = SupabaseFlowRepository(get_supabase()).history(*args)
+    except RepositoryUnavailable:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"History query failed: {str(e)}")
+
+    return {
+        "station_code": station_code,
+        "line_code": line_code,
+        "bucket": bucket,
+        "start_time": start_time,
+        "end_time": end_time,
+        "points": points,
+    }
 
 @router.get("/latest/{station_code}", response_model=schemas.FlowDataResponse)
-def get_latest_flow(station_code: str, supabase: Client = Depends(get_supabase)):
+async def get_latest_flow(
+    station_code: str,
+    request: Request,
+    response: Response,
+    supabase: AsyncClient = Depends(get_async_supabase)
+):
     """
     Get latest flow data for a station.
     Aggregates data across multiple lines if the station is an interchange.
     """
-    if not supabase:
-        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    # Served straight from memory when the background collector is running,
+    # cacheable until its next cycle
+    collector = get_collector()
+    if collector:
+        latest = collector.station_flow(station_code)
+        if latest:
+            cached = not_modified(
+                request, response, collector.cycles, latest["timestamp"],
+                max_age=collector.seconds_to_next_cycle(),
+                stale_while_revalidate=collector.interval,
+            )
+            return cached or latest
 
-    # Fetch last 20 records to ensure we catch all lines
-    response = (
-        supabase.table("flow_data")
-        .select("*")
-        .eq("station_code", station_code)
-        .order("timestamp", desc=True)
-        .limit(20)
-        .execute()
-    )
+    # One flow_latest row per line of the station
+    try:
+        rows = await asyncio.to_thread(flow_repository.latest_lines, station_code)
+    except RepositoryUnavailable:
+        if not supabase:
+            raise HTTPException(status_code=503, detail="Database connection unavailable")
+        rows = (await latest_lines_query(supabase, station_code).execute()).data
 
-    if not response.data:
+    if not rows:
         raise HTTPException(status_code=404, detail="No flow data found for this station")
 
-    data = response.data
-    
-    # Group by line_code (use 'default' if line_code is missing/null)
-    latest_per_line = {}
-    for entry in data:
-        line = entry.get("line_code") or "default"
-        if line not in latest_per_line:
-            latest_per_line[line] = entry
-    
-    # Aggregate
-    aggregated_entry = list(latest_per_line.values())[0].copy() # Start with one entry as base
-    
-    crowding_levels = []
-    frequencies = []
-    next_trains = []
-    delays = []
-    timestamps = []
-
-    level_map = {"low": 1, "medium": 2, "high": 3}
-    rev_level_map = {1: "low", 2: "medium", 3: "high"}
-
-    for line_entry in latest_per_line.values():
-        # Crowding
-        lvl = line_entry.get("crowding_level")
-        if lvl in level_map:
-            crowding_levels.append(level_map[lvl])
-        
-        # Frequency
-        freq = line_entry.get("train_frequency")
-        if freq is not None:
-            frequencies.append(freq)
-            
-        # Next Train
-        nt = line_entry.get("next_train_minutes")
-        if nt is not None:
-            next_trains.append(nt)
-            
-        # Delay
-        delays.append(line_entry.get("is_delay", False))
-        
-        # Timestamp
-        ts_str = line_entry.get("timestamp")
-        if ts_str:
-            timestamps.append(ts_str)
-
-    # Apply Aggregation Logic
-    if crowding_levels:
-        max_crowding = max(crowding_levels)
-        aggregated_entry["crowding_level"] = rev_level_map[max_crowding]
-    
-    if frequencies:
-        # For dashboard, show the BEST frequency (min headway) available
-        aggregated_entry["train_frequency"] = min(frequencies)
-        
-    if next_trains:
-        aggregated_entry["next_train_minutes"] = min(next_trains)
-        
-    aggregated_entry["is_delay"] = any(delays)
-    
-    # Use latest timestamp
-    if timestamps:
-        aggregated_entry["timestamp"] = sorted(timestamps, reverse=True)[0]
-
-    return aggregated_entry
+    return aggregate_station_flow(rows)
 
 @router.post("/", response_model=schemas.FlowDataResponse)
-def create_flow_data(flow_data: schemas.FlowDataCreate, supabase: Client = Depends(get_supabase)):
+async def create_flow_data(flow_data: schemas.FlowDataCreate, supabase: AsyncClient = Depends(get_async_supabase)):
     """Create new flow data entry"""
-    if not supabase:
-        raise HTTPException(status_code=503, detail="Database connection unavailable")
-
     # Calculate crowding level if not provided
-    if flow_data.crowding_level is None and flow_data.next_train_minutes is not None:
-        try:
-            is_holiday = is_today_holiday()
-            weather = get_weather_status()
-
-            # Ensure timestamp is a datetime object
-            hour = flow_data.timestamp.hour
-
-            flow_data.crowding_level = classify_crowding(
-                # NOTE: This endpoint receives pre-processed data where headway
-                # (calculated as seq 3 ttnt - seq 2 ttnt) has already been computed
-                # in the collection script. We use next_train_minutes here only as a
-                # fallback proxy when the actual headway calculation isn't available.
-                frequency=flow_data.next_train_minutes,
-                hour=hour,
-                is_holiday=is_holiday,
-                is_rainy=weather["is_rainy"],
-                is_delay=flow_data.is_delay or False
-            )
-        except Exception as e:
-            # Fallback or log error
-            print(f"Error calculating crowding level: {e}")
-            pass
+    await asyncio.to_thread(fill_crowding_levels, [flow_data])
+
+    data, error = await ainsert_flow_row(supabase, "flow_data", flow_data)
+    if error:
+        raise HTTPException(status_code=503 if error == DATABASE_UNAVAILABLE else 500, detail=error)
+    return data
+
+@router.post("/batch", response_model=List[schemas.FlowDataBatchResult])
+async def create_flow_data_batch(
+    rows: List[Dict[str, Any]] = Body(...),
+    supabase: AsyncClient = Depends(get_async_supabase)
+):
+    """
+    Create many flow data entries in one request (one collection cycle).
+
+    Rows are validated individually, missing crowding levels are classified
+    once per batch, and all valid rows are written with a single insert.
+    Returns one result per input row, in request order.
+    """
+    valid, errors = validate_flow_rows(rows)
+    await asyncio.to_thread(fill_crowding_levels, [row for _, row in valid])
+
+    inserted, insert_errors = await ainsert_flow_rows(supabase, "flow_data", valid)
+    errors.update(insert_errors)
+
+    results = []
+    for index in range(len(rows)):
+        if index in inserted:
+            data = inserted[index]
+            results.append({
+                "index": index,
+                "success": True,
+                "id": data.get("id"),
+                "station_code": data.get("station_code"),
+                "line_code": data.get("line_code"),
+                "crowding_level": data.get("crowding_level"),
+            })
+        else:
+            results.append({
+                "index": index,
+                "success": False,
+                "error": errors.get(index, "Row was not inserted"),
+            })
 
-    response = supabase.table("flow_data").insert(flow_data.model_dump(mode='json')).execute()
-    return response.data[0]
+    return results
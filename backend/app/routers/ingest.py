@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Body, Depends
+from typing import Any, Dict, List, Union
+from app.db.database import get_async_supabase
+from app.models import schemas
+from app.ml.ingest import aingest_flow_rows
+from supabase import AsyncClient
+
+router = APIRouter()
+
+
+@router.post("/", response_model=List[schemas.IngestResult])
+async def ingest_flow_data(
+    payload: Union[List[Dict[str, Any]], Dict[str, Any]] = Body(...),
+    supabase: AsyncClient = Depends(get_async_supabase),
+):
+    """
+    Ingest one record or a batch into both flow_data and training_flow_data.
+
+    Each record is enriched (crowding level, holiday, weather) once and
+    written to both tables; results report each target separately.
+    """
+    rows = payload if isinstance(payload, list) else [payload]
+    return await aingest_flow_rows(supabase, rows)
@@ -1,52 +1,200 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from datetime import datetime, timedelta
-from app.db.database import get_supabase
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from app.db.database import get_async_supabase
+from app.db.http_cache import not_modified
+from app.db.pagination import NEXT_CURSOR_HEADER, InvalidCursor, decode_cursor, encode_cursor, parse_timestamp
+from app.ml.prediction_cache import (
+    PREDICTION_POLL_SECONDS,
+    PredictionSnapshot,
+    group_by_station,
+    prediction_cache,
+    prediction_grid,
+)
 from app.models import schemas
-from supabase import Client
+from supabase import AsyncClient
 
 router = APIRouter()
 
-@router.get("/{station_code}", response_model=List[schemas.PredictionResponse])
-def get_predictions(
-    station_code: str,
-    hours_ahead: int = 24,
-    supabase: Client = Depends(get_supabase)
+PAGE_SIZE = 1000
+
+# A new forecast version is picked up within one poll; responses built on
+# an hourly axis also change when the hour turns
+PREDICTIONS_STALE_SECONDS = 600
+
+
+def _cached_predictions(
+    request: Request, response: Response, snapshot: PredictionSnapshot, now: datetime
+) -> Optional[Response]:
+    """Caching headers for a response served from `snapshot`; a 304 if the client is current."""
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    to_next_hour = 3600 - (now - hour).total_seconds()
+    return not_modified(
+        request, response, snapshot.version, hour.isoformat(),
+        max_age=min(PREDICTION_POLL_SECONDS, to_next_hour),
+        stale_while_revalidate=PREDICTIONS_STALE_SECONDS,
+    )
+
+@router.get("/", response_model=schemas.PredictionGridResponse)
+async def get_predictions_grid(
+    request: Request,
+    response: Response,
+    stations: Optional[str] = Query(default=None, description="Comma-separated station codes (default: all)"),
+    hours_ahead: int = Query(default=24, ge=1, le=168),
+    supabase: AsyncClient = Depends(get_async_supabase)
 ):
-    """Get predictions for a station for the next N hours"""
+    """
+    Predictions of many stations in one response: a shared hourly time axis
+    (the next `hours_ahead` whole hours) and one level array per station.
+    """
+    now = datetime.now(timezone.utc)
+    # One snapshot for the ETag and the body, even if a reload lands meanwhile
+    snapshot = prediction_cache.snapshot
+    if snapshot.ready:
+        cached = _cached_predictions(request, response, snapshot, now)
+        if cached:
+            return cached
+
+    station_codes = [code.strip() for code in stations.split(",") if code.strip()] if stations else None
+    start = now.replace(minute=0, second=0, microsecond=0)
+    timestamps = [start + timedelta(hours=h) for h in range(1, hours_ahead + 1)]
+
+    if snapshot.ready:
+        grid = prediction_grid(snapshot.select(station_codes), timestamps)
+        return {"version": snapshot.version, "hours_ahead": hours_ahead, **grid}
+
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
 
+    # One range query over (station_code, prediction_timestamp), paged by id
+    rows = []
+    last_id = 0
+    while True:
+        query = (
+            supabase.table("predictions")
+            .select("*")
+            .gte("prediction_timestamp", timestamps[0].isoformat())
+            .lte("prediction_timestamp", timestamps[-1].isoformat())
+            .gt("id", last_id)
+        )
+        if station_codes:
+            query = query.in_("station_code", station_codes)
+        page = (await query.order("id").limit(PAGE_SIZE).execute()).data
+        if not page:
+            break
+        rows.extend(page)
+        last_id = page[-1]["id"]
+
+    grid = prediction_grid(group_by_station(rows), timestamps)
+    return {"version": None, "hours_ahead": hours_ahead, **grid}
+
+@router.get("/{station_code}", response_model=List[schemas.PredictionResponse])
+async def get_predictions(
+    station_code: str,
+    request: Request,
+    response: Response,
+    hours_ahead: int = 24,
+    limit: int = Query(default=1000, le=1000),
+    cursor: Optional[str] = None,
+    supabase: AsyncClient = Depends(get_async_supabase)
+):
+    """
+    Get predictions for a station for the next N hours.
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one.
+    """
     start_time = datetime.utcnow()
     end_time = start_time + timedelta(hours=hours_ahead)
 
-    response = (
+    snapshot = prediction_cache.snapshot
+    if snapshot.ready:
+        not_modified_response = _cached_predictions(request, response, snapshot, start_time)
+        if not_modified_response:
+            return not_modified_response
+        # Served from memory; a published forecast covers every station
+        cached = snapshot.station(station_code)
+        rows = cached.between(start_time, end_time) if cached else []
+        if cursor:
+            try:
+                after = tuple(decode_cursor(cursor, datetime, int))
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            rows = [
+                row for row in rows
+                if (parse_timestamp(row["prediction_timestamp"]), row["id"]) > after
+            ]
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]["prediction_timestamp"], rows[-1]["id"])
+        return rows
+
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+
+    query = (
         supabase.table("predictions")
         .select("*")
         .eq("station_code", station_code)
         .gte("prediction_timestamp", start_time.isoformat())
         .lte("prediction_timestamp", end_time.isoformat())
-        .order("prediction_timestamp")
-        .execute()
     )
 
-    return response.data
+    if cursor:
+        try:
+            after_ts, after_id = decode_cursor(cursor, datetime, int)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        after_ts = after_ts.isoformat()
+        query = query.or_(
+            f'prediction_timestamp.gt."{after_ts}",'
+            f'and(prediction_timestamp.eq."{after_ts}",id.gt.{after_id})'
+        )
+
+    result = await query.order("prediction_timestamp").order("id").limit(limit).execute()
+    if len(result.data) == limit:
+        last = result.data[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last["prediction_timestamp"], last["id"])
+    return result.data
 
 @router.post("/", response_model=schemas.PredictionResponse)
-def create_prediction(prediction: schemas.PredictionCreate, supabase: Client = Depends(get_supabase)):
+async def create_prediction(prediction: schemas.PredictionCreate, supabase: AsyncClient = Depends(get_async_supabase)):
     """Create a new prediction"""
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
-    response = supabase.table("predictions").insert(prediction.model_dump(mode='json')).execute()
+    response = await supabase.table("predictions").insert(prediction.model_dump(mode='json')).execute()
     return response.data[0]
 
+@router.post("/publish")
+async def publish_predictions():
+    """
+    Reload the prediction cache now if a newer forecast version exists.
+    Called by the forecast job after it publishes a batch.
+    """
+    reloaded = await asyncio.to_thread(prediction_cache.refresh)
+    return {"reloaded": reloaded, **prediction_cache.stats()}
+
 @router.get("/latest/{station_code}", response_model=schemas.PredictionResponse)
-def get_latest_prediction(station_code: str, supabase: Client = Depends(get_supabase)):
+async def get_latest_prediction(
+    station_code: str,
+    request: Request,
+    response: Response,
+    supabase: AsyncClient = Depends(get_async_supabase)
+):
     """Get the most recent prediction for a station"""
+    snapshot = prediction_cache.snapshot
+    cached = snapshot.station(station_code)
+    if cached:
+        not_modified_response = not_modified(
+            request, response, snapshot.version,
+            max_age=PREDICTION_POLL_SECONDS,
+            stale_while_revalidate=PREDICTIONS_STALE_SECONDS,
+        )
+        return not_modified_response or cached.latest
+
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
 
-    response = (
+    response = await (
         supabase.table("predictions")
         .select("*")
         .eq("station_code", station_code)
@@ -1,54 +1,154 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from app.db.database import get_supabase
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from typing import List, Optional
+from app.db.database import get_async_supabase
+from app.db.http_cache import not_modified
+from app.db.pagination import NEXT_CURSOR_HEADER, InvalidCursor, decode_cursor, encode_cursor
 from app.models import schemas
 from app.ml.mtr_api import get_station_trains
-from supabase import Client
+from app.ml.collector import get_collector
+from app.ml.station_registry import STATION_REGISTRY_REFRESH_SECONDS, station_registry
+from supabase import AsyncClient
 
 router = APIRouter()
 
+# Stations change rarely; clients may reuse a listing for a few minutes
+STATIONS_MAX_AGE_SECONDS = 300
+
 @router.get("/", response_model=List[schemas.StationResponse])
-def get_stations(skip: int = 0, limit: int = 100, supabase: Client = Depends(get_supabase)):
-    """Get all stations"""
+async def get_stations(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    supabase: AsyncClient = Depends(get_async_supabase)
+):
+    """
+    Get all stations, ordered by code.
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one;
+    `skip` is kept for older clients.
+    """
+    if station_registry.ready:
+        cached = not_modified(
+            request, response, station_registry.snapshot.version,
+            max_age=STATIONS_MAX_AGE_SECONDS,
+            stale_while_revalidate=STATION_REGISTRY_REFRESH_SECONDS,
+        )
+        if cached:
+            return cached
+        after_code = None
+        if cursor:
+            try:
+                (after_code,) = decode_cursor(cursor, str)
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        stations = station_registry.page(limit, after_code=after_code, skip=skip)
+        if len(stations) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(stations[-1]["code"])
+        return stations
+
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
-    response = supabase.table("stations").select("*").range(skip, skip + limit - 1).execute()
-    return response.data
+
+    query = supabase.table("stations").select("*").order("code")
+    if cursor:
+        try:
+            (after_code,) = decode_cursor(cursor, str)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.gt("code", after_code).limit(limit)
+    else:
+        query = query.range(skip, skip + limit - 1)
+
+    result = await query.execute()
+    if len(result.data) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(result.data[-1]["code"])
+    return result.data
 
 @router.get("/{code}", response_model=schemas.StationResponse)
-def get_station(code: str, supabase: Client = Depends(get_supabase)):
+async def get_station(
+    code: str,
+    request: Request,
+    response: Response,
+    supabase: AsyncClient = Depends(get_async_supabase)
+):
     """Get station by code"""
+    if station_registry.ready:
+        cached = not_modified(
+            request, response, station_registry.snapshot.version,
+            max_age=STATIONS_MAX_AGE_SECONDS,
+            stale_while_revalidate=STATION_REGISTRY_REFRESH_SECONDS,
+        )
+        if cached:
+            return cached
+        station = station_registry.get(code)
+        if not station:
+            raise HTTPException(status_code=404, detail="Station not found")
+        return station
+
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
-    response = supabase.table("stations").select("*").eq("code", code).execute()
-    if not response.data:
+    result = await supabase.table("stations").select("*").eq("code", code).execute()
+    if not result.data:
         raise HTTPException(status_code=404, detail="Station not found")
-    return response.data[0]
+    return result.data[0]
 
 @router.post("/", response_model=schemas.StationResponse)
-def create_station(station: schemas.StationCreate, supabase: Client = Depends(get_supabase)):
+async def create_station(station: schemas.StationCreate, supabase: AsyncClient = Depends(get_async_supabase)):
     """Create a new station"""
     if not supabase:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
-    response = supabase.table("stations").insert(station.model_dump()).execute()
+    response = await supabase.table("stations").insert(station.model_dump()).execute()
+    await asyncio.to_thread(station_registry.refresh)
     return response.data[0]
 
+@router.post("/refresh")
+async def refresh_stations():
+    """Reload the in-memory station registry from the stations table"""
+    if not await asyncio.to_thread(station_registry.refresh):
+        raise HTTPException(status_code=503, detail="Could not reload stations")
+    return station_registry.stats()
+
 @router.get("/{code}/trains", response_model=schemas.StationTrainsResponse)
-def get_station_train_arrivals(code: str, supabase: Client = Depends(get_supabase)):
+async def get_station_train_arrivals(
+    code: str,
+    request: Request,
+    response: Response,
+    supabase: AsyncClient = Depends(get_async_supabase)
+):
     """Get real-time train arrivals for a station across all lines"""
-    try:
-        # Get station name from database
-        station_name = code
-        if supabase:
-            response = supabase.table("stations").select("name").eq("code", code.upper()).execute()
-            if response.data and len(response.data) > 0:
-                station_name = response.data[0]["name"]
+    # Served straight from memory when the background collector is running,
+    # cacheable until its next cycle
+    collector = get_collector()
+    if collector:
+        trains_data = collector.station_trains(code)
+        if trains_data:
+            cached = not_modified(
+                request, response, collector.cycles, trains_data["timestamp"],
+                max_age=collector.seconds_to_next_cycle(),
+                stale_while_revalidate=collector.interval,
+            )
+            return cached or trains_data
 
+    try:
         # Fetch train data from MTR API
-        trains_data = get_station_trains(code)
-        trains_data["station_name"] = station_name
+        # Upstream MTR calls are blocking; run them off the event loop
+        trains_data = await asyncio.to_thread(get_station_trains, code)
+        trains_data["station_name"] = await station_name(code.upper(), supabase)
 
         return trains_data
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch train arrivals: {str(e)}")
+
+
+async def station_name(code: str, supabase: Optional[AsyncClient]) -> str:
+    """Display name for a station code, from the registry or, until it has loaded, the database"""
+    if station_registry.ready:
+        return station_registry.name(code) or code
+    if supabase:
+        result = await supabase.table("stations").select("name").eq("code", code).execute()
+        if result.data:
+            return result.data[0]["name"]
+    return code
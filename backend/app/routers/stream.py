@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from app.db.database import get_async_supabase
+from app.ml.flow_stream import flow_broadcaster
+from app.ml.latest_flow import sync_latest_flow
+
+router = APIRouter()
+
+@router.get("/flow")
+async def stream_flow(request: Request):
+    """
+    Server-sent events of network crowding: a `snapshot` event with the
+    latest state of every station-line, then an `update` event per ingest
+    cycle carrying only the station-lines whose crowding, headway or delay
+    changed.
+    """
+    await sync_latest_flow(get_async_supabase())
+
+    queue = flow_broadcaster.subscribe()
+    return StreamingResponse(
+        flow_broadcaster.events(queue, request.is_disconnected),
+        media_type="text/event-stream",
+        # Keep proxies from caching or buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,41 +1,64 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
-from app.db.database import get_supabase
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from datetime import datetime
+from app.db.database import get_async_supabase
+from app.db.export import MEDIA_TYPES, stream_export
+from app.db.repository import RepositoryUnavailable
 from app.models import schemas
-from app.ml.crowding import classify_crowding
-from app.ml.external_data import is_today_holiday, get_weather_status
-from supabase import Client
+from app.ml.ingest import DATABASE_UNAVAILABLE, ainsert_flow_row, fill_crowding_levels
+from supabase import AsyncClient
 
 router = APIRouter()
 
 
 @router.post("/", response_model=schemas.FlowDataResponse)
-def create_training_flow_data(
-    flow_data: schemas.FlowDataCreate, supabase: Client = Depends(get_supabase)
+async def create_training_flow_data(
+    flow_data: schemas.FlowDataCreate, supabase: AsyncClient = Depends(get_async_supabase)
 ):
     """Insert flow data into training_flow_data table."""
-    if not supabase:
+    # Calculate crowding level if not provided
+    await asyncio.to_thread(fill_crowding_levels, [flow_data])
+
+    data, error = await ainsert_flow_row(supabase, "training_flow_data", flow_data)
+    if error:
+        raise HTTPException(status_code=503 if error == DATABASE_UNAVAILABLE else 500, detail=error)
+    return data
+
+
+@router.get("/export")
+async def export_training_flow_data(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    station_code: Optional[str] = None,
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+):
+    """
+    Stream training_flow_data rows for a time range as CSV or NDJSON,
+    optionally gzipped.
+    Output starts immediately and memory use is constant for any range.
+    """
+    filename = f"training_flow_data.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    try:
+        # Connects and starts the query before any header is sent
+        body = await asyncio.to_thread(
+            stream_export,
+            "training_flow_data",
+            fmt=format,
+            compress=gzip,
+            start_time=start_time,
+            end_time=end_time,
+            station_code=station_code,
+        )
+    except RepositoryUnavailable:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
 
-    # Calculate crowding level if not provided
-    if flow_data.crowding_level is None and flow_data.next_train_minutes is not None:
-        try:
-            is_holiday = is_today_holiday()
-            weather = get_weather_status()
-            hour = flow_data.timestamp.hour
-            flow_data.crowding_level = classify_crowding(
-                frequency=flow_data.next_train_minutes,
-                hour=hour,
-                is_holiday=is_holiday,
-                is_rainy=weather["is_rainy"],
-                is_delay=flow_data.is_delay or False,
-            )
-        except Exception as e:
-            print(f"Error calculating crowding level: {e}")
-
-    response = (
-        supabase.table("training_flow_data")
-        .insert(flow_data.model_dump(mode="json"))
-        .execute()
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers=headers,
     )
-
-    return response.data[0]
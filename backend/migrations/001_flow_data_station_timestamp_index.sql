@@ -0,0 +1,4 @@
+-- Supports the per-station range scans behind /api/flow/history and
+-- /api/flow/latest/{code}.
+CREATE INDEX IF NOT EXISTS idx_flow_data_station_timestamp
+    ON flow_data (station_code, timestamp DESC);
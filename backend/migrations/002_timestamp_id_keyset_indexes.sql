@@ -0,0 +1,7 @@
+-- Keyset scans over (timestamp, id), used by the crowding relabel backfill
+-- and other jobs that walk full history in order.
+CREATE INDEX IF NOT EXISTS idx_flow_data_timestamp_id
+    ON flow_data (timestamp, id);
+
+CREATE INDEX IF NOT EXISTS idx_training_flow_data_timestamp_id
+    ON training_flow_data (timestamp, id);
@@ -0,0 +1,10 @@
+-- Keyset pagination: every page of /api/flow/ and /api/predictions/{code}
+-- is an index range scan starting after the cursor's (timestamp, id).
+CREATE INDEX IF NOT EXISTS idx_flow_data_station_timestamp_id
+    ON flow_data (station_code, timestamp, id);
+
+-- Superseded by the index above
+DROP INDEX IF EXISTS idx_flow_data_station_timestamp;
+
+CREATE INDEX IF NOT EXISTS idx_predictions_station_timestamp_id
+    ON predictions (station_code, prediction_timestamp, id);
@@ -0,0 +1,10 @@
+-- The forecast job upserts one prediction per station and hour:
+-- ON CONFLICT (station_code, prediction_timestamp) needs a unique index.
+DELETE FROM predictions p
+USING predictions newer
+WHERE newer.station_code = p.station_code
+  AND newer.prediction_timestamp = p.prediction_timestamp
+  AND newer.id > p.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_station_timestamp_unique
+    ON predictions (station_code, prediction_timestamp);
@@ -0,0 +1,8 @@
+-- One row per published forecast batch. The API polls the newest id and
+-- reloads its in-memory prediction cache when it changes.
+CREATE TABLE IF NOT EXISTS prediction_versions (
+    id BIGSERIAL PRIMARY KEY,
+    published_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    hours_ahead INTEGER NOT NULL,
+    predictions INTEGER NOT NULL
+);
@@ -0,0 +1,69 @@
+-- Latest flow_data row per (station_code, line_code), maintained by
+-- triggers in the same statement as each insert, so /api/flow/latest reads
+-- one row per line and the whole network is a single scan of a small table.
+CREATE TABLE IF NOT EXISTS flow_latest (
+    station_code TEXT NOT NULL,
+    line_code TEXT,
+    id BIGINT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    next_train_minutes DOUBLE PRECISION,
+    train_frequency DOUBLE PRECISION,
+    crowding_level TEXT,
+    is_delay BOOLEAN
+);
+
+-- Rows without a line share one slot per station
+CREATE UNIQUE INDEX IF NOT EXISTS idx_flow_latest_station_line
+    ON flow_latest (station_code, (COALESCE(line_code, '')));
+
+-- Statement-level: one upsert per batch insert, not one per row. Also runs
+-- on UPDATE so relabelling a station-line's latest row is reflected.
+CREATE OR REPLACE FUNCTION flow_latest_upsert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO flow_latest (
+        station_code, line_code, id, timestamp,
+        next_train_minutes, train_frequency, crowding_level, is_delay
+    )
+    SELECT DISTINCT ON (station_code, COALESCE(line_code, ''))
+        station_code, line_code, id, timestamp,
+        next_train_minutes, train_frequency, crowding_level, is_delay
+    FROM new_rows
+    WHERE station_code IS NOT NULL AND timestamp IS NOT NULL
+    ORDER BY station_code, COALESCE(line_code, ''), timestamp DESC, id DESC
+    ON CONFLICT (station_code, (COALESCE(line_code, ''))) DO UPDATE SET
+        id = EXCLUDED.id,
+        timestamp = EXCLUDED.timestamp,
+        next_train_minutes = EXCLUDED.next_train_minutes,
+        train_frequency = EXCLUDED.train_frequency,
+        crowding_level = EXCLUDED.crowding_level,
+        is_delay = EXCLUDED.is_delay
+    -- Late or backfilled rows never replace a newer one
+    WHERE (EXCLUDED.timestamp, EXCLUDED.id) >= (flow_latest.timestamp, flow_latest.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flow_latest_on_insert ON flow_data;
+CREATE TRIGGER flow_latest_on_insert
+    AFTER INSERT ON flow_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION flow_latest_upsert();
+
+DROP TRIGGER IF EXISTS flow_latest_on_update ON flow_data;
+CREATE TRIGGER flow_latest_on_update
+    AFTER UPDATE ON flow_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION flow_latest_upsert();
+
+-- Backfill from existing rows (served by idx_flow_data_station_timestamp_id)
+INSERT INTO flow_latest (
+    station_code, line_code, id, timestamp,
+    next_train_minutes, train_frequency, crowding_level, is_delay
+)
+SELECT DISTINCT ON (station_code, COALESCE(line_code, ''))
+    station_code, line_code, id, timestamp,
+    next_train_minutes, train_frequency, crowding_level, is_delay
+FROM flow_data
+WHERE station_code IS NOT NULL AND timestamp IS NOT NULL
+ORDER BY station_code, COALESCE(line_code, ''), timestamp DESC, id DESC
+ON CONFLICT (station_code, (COALESCE(line_code, ''))) DO NOTHING;
@@ -0,0 +1,145 @@
+-- Daily range partitions on timestamp for flow_data and training_flow_data.
+-- Retention then detaches and drops whole days (app.db.partitions) instead
+-- of deleting rows, which left bloat behind and timed out on large days.
+--
+-- The existing table is not copied: it is renamed to <table>_legacy and
+-- attached as the partition for everything before the cutover (start of
+-- the day after tomorrow, UTC), which is dropped as a whole once it expires.
+-- Indexes matching the parent's are reused; only the (id, timestamp)
+-- primary key is built on it. Daily partitions from the cutover on are
+-- created here and then kept ahead by the API's partition manager; rows
+-- for a day without a partition land in <table>_default.
+--
+-- Run the statements one by one (psql's default autocommit), not in one
+-- transaction: the full-table check is validated first under a lock that
+-- still allows reads and writes, so neither SET NOT NULL nor the attach has
+-- to scan the table while holding the exclusive lock.
+
+CREATE OR REPLACE FUNCTION partition_cutover() RETURNS TIMESTAMPTZ AS $$
+    -- One day of slack, so the cutover computed by partition_by_day is never
+    -- earlier than the bound validated by an earlier statement
+    SELECT (date_trunc('day', now() AT TIME ZONE 'UTC') + interval '2 days') AT TIME ZONE 'UTC';
+$$ LANGUAGE sql STABLE;
+
+-- Added NOT VALID (no scan), then validated in a separate statement
+CREATE OR REPLACE FUNCTION add_partition_bound(tbl TEXT, validate BOOLEAN DEFAULT false) RETURNS void AS $$
+DECLARE
+    bound TEXT := tbl || '_partition_bound';
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = tbl::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    IF validate THEN
+        EXECUTE format('ALTER TABLE %I VALIDATE CONSTRAINT %I', tbl, bound);
+    ELSIF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = tbl::regclass AND conname = bound) THEN
+        EXECUTE format(
+            'ALTER TABLE %I ADD CONSTRAINT %I CHECK (timestamp IS NOT NULL AND timestamp < %L) NOT VALID',
+            tbl, bound, partition_cutover()
+        );
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION partition_by_day(tbl TEXT, days_ahead INTEGER DEFAULT 7) RETURNS void AS $$
+DECLARE
+    legacy TEXT := tbl || '_legacy';
+    cutover TIMESTAMPTZ := partition_cutover();
+    identity CHAR;
+    seq TEXT;
+    last_id BIGINT;
+    is_called BOOLEAN;
+    idx RECORD;
+    day TIMESTAMPTZ;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = tbl::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    -- Taken now rather than by the RENAME, so no insert can draw an id
+    -- between reading the sequence and the copy below
+    EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', tbl);
+    SELECT attidentity INTO identity FROM pg_attribute WHERE attrelid = tbl::regclass AND attname = 'id';
+    seq := pg_get_serial_sequence(tbl, 'id');
+    IF seq IS NOT NULL THEN
+        EXECUTE format('SELECT last_value, is_called FROM %s', seq) INTO last_id, is_called;
+    END IF;
+
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, legacy);
+    -- Free the index names for the parent's indexes
+    FOR idx IN SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = legacy LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', idx.indexname, left(idx.indexname, 56) || '_legacy');
+    END LOOP;
+    -- Range partitions have no slot for a NULL key; proven by the validated
+    -- bound check, so no scan
+    EXECUTE format('ALTER TABLE %I ALTER COLUMN timestamp SET NOT NULL', legacy);
+    -- Replaced by the parent's (id, timestamp) key on attach
+    FOR idx IN SELECT conname FROM pg_constraint WHERE conrelid = legacy::regclass AND contype = 'p' LOOP
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', legacy, idx.conname);
+    END LOOP;
+
+    -- Not INCLUDING ALL: the bound check and the legacy indexes must not be
+    -- copied to the parent
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING IDENTITY) PARTITION BY RANGE (timestamp)',
+        tbl, legacy
+    );
+    IF identity IN ('a', 'd') THEN
+        -- The parent got a fresh identity sequence: continue from the old one,
+        -- which goes away with the legacy column's identity (a partition may
+        -- not have its own)
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN id DROP IDENTITY', legacy);
+        PERFORM setval(pg_get_serial_sequence(tbl, 'id'), last_id, is_called);
+    ELSIF seq IS NOT NULL THEN
+        -- Keep the serial sequence alive when the legacy partition is dropped
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, tbl);
+    END IF;
+    -- A unique key on a partitioned table must include the partition key
+    EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, timestamp)', tbl);
+    EXECUTE format('CREATE INDEX %I ON %I (timestamp, id)', 'idx_' || tbl || '_timestamp_id', tbl);
+
+    -- The validated bound check implies the partition constraint: no scan
+    EXECUTE format(
+        'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (MINVALUE) TO (%L)',
+        tbl, legacy, cutover
+    );
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT IF EXISTS %I', legacy, tbl || '_partition_bound');
+
+    FOR i IN 0..days_ahead LOOP
+        day := cutover + i * interval '1 day';
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+            tbl || '_p' || to_char(day AT TIME ZONE 'UTC', 'YYYYMMDD'), tbl, day, day + interval '1 day'
+        );
+    END LOOP;
+    -- Catches inserts if partition maintenance falls behind; the manager
+    -- moves such rows into their day's partition when it creates it
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', tbl || '_default', tbl);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT add_partition_bound('flow_data');
+SELECT add_partition_bound('training_flow_data');
+SELECT add_partition_bound('flow_data', validate => true);
+SELECT add_partition_bound('training_flow_data', validate => true);
+
+-- flow_latest triggers (006) cannot stay on a partition: recreated on the parent
+DROP TRIGGER IF EXISTS flow_latest_on_insert ON flow_data;
+DROP TRIGGER IF EXISTS flow_latest_on_update ON flow_data;
+
+SELECT partition_by_day('flow_data');
+SELECT partition_by_day('training_flow_data');
+
+-- Per-station keyset scans (003), on flow_data only
+CREATE INDEX IF NOT EXISTS idx_flow_data_station_timestamp_id
+    ON flow_data (station_code, timestamp, id);
+
+CREATE TRIGGER flow_latest_on_insert
+    AFTER INSERT ON flow_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION flow_latest_upsert();
+
+CREATE TRIGGER flow_latest_on_update
+    AFTER UPDATE ON flow_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION flow_latest_upsert();
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+# app.db.database refuses to import without one; tests never connect to it
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://test@localhost/test")
+
+
+def fake_response(data):
+    return type("Response", (), {"data": data})()
+
+
+class FakeQuery:
+    """
+    Chainable query over the fake client's rows. eq and in_ filter the
+    rows; every filter call is recorded in `filters`.
+    """
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.rows = list(client.rows)
+        self.filters = []
+        self.size = None
+        self.deleting = False
+
+    def _record(self, kind, *args):
+        self.filters.append((kind,) + args)
+        return self
+
+    def select(self, *args):
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def limit(self, size):
+        self.size = size
+        return self
+
+    def delete(self):
+        self.deleting = True
+        return self
+
+    def eq(self, column, value):
+        self.rows = [row for row in self.rows if row.get(column) == value]
+        return self._record("eq", column, value)
+
+    def in_(self, column, values):
+        self.rows = [row for row in self.rows if row.get(column) in values]
+        return self._record("in", column, values)
+
+    def lt(self, *args):
+        return self._record("lt", *args)
+
+    def or_(self, expression):
+        return self._record("or", expression)
+
+    async def execute(self):
+        if self.deleting:
+            deleted = {id(row) for row in self.rows}
+            self.client.rows = [row for row in self.client.rows if id(row) not in deleted]
+            return fake_response([])
+        return fake_response(self.rows[:self.size])
+
+
+class FakeRpc:
+    def __init__(self, result):
+        self.result = result
+
+    async def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return fake_response(self.result)
+
+
+class FakeAsyncSupabase:
+    """
+    Stand-in for the async Supabase client: every table reads `rows`, and
+    rpc() returns (or raises) `rpc_result`. Every query built is kept in
+    `queries`.
+    """
+
+    def __init__(self, rows=(), rpc_result=None):
+        self.rows = list(rows)
+        self.rpc_result = rpc_result
+        self.queries = []
+
+    def table(self, name):
+        query = FakeQuery(self, name)
+        self.queries.append(query)
+        return query
+
+    def rpc(self, name, params):
+        return FakeRpc(self.rpc_result)
+
+
+@pytest.fixture
+def fake_supabase():
+    """FakeAsyncSupabase, to build with the rows the test needs."""
+    return FakeAsyncSupabase
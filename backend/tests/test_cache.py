@@ -0,0 +1,219 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.ml import cache as cache_module
+from app.ml.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module.time, "monotonic", fake)
+    return fake
+
+
+class CountingLoader:
+    def __init__(self, *values) -> None:
+        self.values = list(values)
+        self.calls = 0
+
+    def __call__(self, key):
+        self.calls += 1
+        value = self.values.pop(0) if len(self.values) > 1 else self.values[0]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def test_fresh_entry_is_served_without_reloading(clock):
+    loader = CountingLoader("a")
+    cache = TTLCache(loader, ttl=10)
+
+    assert cache.get("k") == "a"
+    clock.now += 9
+    assert cache.get("k") == "a"
+    assert loader.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_concurrent_misses_share_one_load():
+    release = threading.Event()
+    calls = []
+
+    def loader(key):
+        calls.append(key)
+        release.wait(5)
+        return f"value-{key}"
+
+    cache = TTLCache(loader, ttl=10)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(cache.get, "k") for _ in range(8)]
+        # Every caller is either loading or waiting on the in-flight load
+        deadline = time.monotonic() + 5
+        while cache.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert results == ["value-k"] * 8
+    assert calls == ["k"]
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 7
+
+
+def test_stale_value_is_served_while_one_refresh_runs(clock):
+    loader = CountingLoader("old", "new")
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    # Holds the background refresh until the stale reads are done
+    executor.submit(release.wait, 5)
+    cache = TTLCache(loader, ttl=10, stale_ttl=20, executor=executor)
+
+    assert cache.get("k") == "old"
+    clock.now += 15
+    assert cache.get("k") == "old"
+    assert cache.get("k") == "old"
+    release.set()
+    executor.shutdown(wait=True)
+
+    assert loader.calls == 2
+    assert cache.stats()["stale_hits"] == 2
+    assert cache.stats()["refreshes"] == 1
+    assert cache.get("k") == "new"
+
+
+def test_entry_past_stale_window_is_reloaded_synchronously(clock):
+    loader = CountingLoader("old", "new")
+    cache = TTLCache(loader, ttl=10, stale_ttl=20)
+
+    assert cache.get("k") == "old"
+    clock.now += 31
+    assert cache.peek("k") is None
+    assert cache.get("k") == "new"
+    assert cache.stats()["misses"] == 2
+
+
+def test_none_is_cached_only_for_negative_ttl(clock):
+    loader = CountingLoader(None, "value")
+    cache = TTLCache(loader, ttl=10, stale_ttl=20, negative_ttl=5)
+
+    assert cache.get("k") is None
+    clock.now += 4
+    assert cache.get("k") is None
+    assert loader.calls == 1
+    assert cache.stats()["negative_hits"] == 1
+
+    # Never served stale: reloaded as soon as the negative TTL runs out
+    clock.now += 2
+    assert cache.get("k") == "value"
+    assert loader.calls == 2
+
+
+def test_failed_refresh_keeps_last_good_value(clock):
+    loader = CountingLoader("good", RuntimeError("upstream down"))
+    cache = TTLCache(loader, ttl=10, stale_ttl=20, negative_ttl=5)
+
+    assert cache.get("k") == "good"
+    clock.now += 15
+    assert cache.refresh("k") is None
+    assert cache.get("k") == "good"
+    assert cache.stats()["load_errors"] == 1
+
+
+class RecordingExecutor:
+    """Queues background refreshes so a test can run them by hand."""
+
+    def __init__(self) -> None:
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append((fn, args))
+
+    def run_all(self) -> None:
+        while self.submitted:
+            fn, args = self.submitted.pop(0)
+            fn(*args)
+
+
+def test_failed_refresh_is_not_retried_until_negative_ttl(clock):
+    loader = CountingLoader("good", RuntimeError("upstream down"))
+    executor = RecordingExecutor()
+    cache = TTLCache(loader, ttl=10, stale_ttl=20, negative_ttl=5, executor=executor)
+
+    assert cache.get("k") == "good"
+    clock.now += 15
+    assert cache.get("k") == "good"
+    executor.run_all()
+    assert loader.calls == 2
+
+    # Right after the failure: the last good value, no new refresh
+    assert cache.get("k") == "good"
+    assert cache.get("k") == "good"
+    assert executor.submitted == []
+    assert loader.calls == 2
+
+    # Retried once the back-off runs out, still within the stale window
+    clock.now += 5
+    assert cache.get("k") == "good"
+    assert len(executor.submitted) == 1
+
+
+def test_failed_refresh_back_off_ends_with_the_stale_window(clock):
+    loader = CountingLoader("good", RuntimeError("upstream down"))
+    cache = TTLCache(loader, ttl=10, stale_ttl=20, negative_ttl=5)
+
+    assert cache.get("k") == "good"
+    clock.now += 28
+    assert cache.refresh("k") is None
+    clock.now += 2
+    assert cache.peek("k") is None
+
+
+def test_tuple_keys_are_passed_as_loader_arguments():
+    cache = TTLCache(lambda line, station: f"{line}-{station}", ttl=10)
+    assert cache.get(("TWL", "TST")) == "TWL-TST"
+
+
+def test_lru_entry_is_evicted_beyond_maxsize():
+    cache = TTLCache(lambda key: key.upper(), ttl=10, maxsize=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+
+    assert cache.peek("a") == "A"
+    assert cache.peek("b") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_coalesced_wait_gives_up_after_wait_timeout():
+    release = threading.Event()
+
+    def loader(key):
+        release.wait(5)
+        return "late"
+
+    cache = TTLCache(loader, ttl=10, wait_timeout=0.05)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        owner = pool.submit(cache.get, "k")
+        while cache.stats()["inflight"] == 0:
+            time.sleep(0.01)
+
+        assert cache.get("k") is None
+        assert cache.refresh("k") is None
+        assert cache.stats()["wait_timeouts"] == 2
+
+        release.set()
+        assert owner.result(timeout=5) == "late"
+    assert cache.get("k") == "late"
@@ -0,0 +1,57 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_async_supabase
+from app.db.partitions import NotPartitioned
+from app.db.repository import RepositoryUnavailable
+from app.main import app
+from app.routers import flow_data
+
+
+def cleanup(monkeypatch, error, supabase):
+    def drop_expired(table, cutoff):
+        raise error
+
+    monkeypatch.setattr(flow_data.partition_manager, "drop_expired", drop_expired)
+    app.dependency_overrides[get_async_supabase] = lambda: supabase
+    try:
+        return TestClient(app).delete("/api/flow/cleanup", params={"hours": 24})
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_partitions_are_dropped_when_partitioned(monkeypatch):
+    monkeypatch.setattr(flow_data.partition_manager, "drop_expired", lambda table, cutoff: ["flow_data_p20260301"])
+
+    body = TestClient(app).delete("/api/flow/cleanup").json()
+
+    assert body["partitions_dropped"] == 1
+    assert body["partitions"] == ["flow_data_p20260301"]
+
+
+@pytest.mark.parametrize("error", [NotPartitioned("not partitioned"), RepositoryUnavailable("no postgres")])
+def test_unpartitioned_or_unreachable_falls_back_to_rpc(monkeypatch, fake_supabase, error):
+    response = cleanup(monkeypatch, error, fake_supabase([], rpc_result=12))
+
+    assert response.status_code == 200
+    assert response.json()["deleted_count"] == 12
+
+
+def test_missing_rpc_falls_back_to_batched_deletes(monkeypatch, fake_supabase):
+    supabase = fake_supabase([{"id": i} for i in range(2500)], rpc_result=RuntimeError("no such function"))
+
+    response = cleanup(monkeypatch, NotPartitioned("not partitioned"), supabase)
+
+    assert response.json()["deleted_count"] == 2500
+    assert response.json()["message"] == "Cleanup complete (batched)"
+    assert supabase.rows == []
+
+
+def test_fallback_without_supabase_is_503(monkeypatch):
+    assert cleanup(monkeypatch, RepositoryUnavailable("no postgres"), None).status_code == 503
+
+
+def test_other_partition_errors_are_500(monkeypatch, fake_supabase):
+    response = cleanup(monkeypatch, RuntimeError("lock timeout"), fake_supabase([], rpc_result=0))
+
+    assert response.status_code == 500
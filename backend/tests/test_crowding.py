@@ -0,0 +1,89 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from app.ml.crowding import (
+    CROWDING_LEVELS,
+    DEFAULT_THRESHOLDS,
+    CrowdingThresholds,
+    classify_crowding,
+    classify_crowding_batch,
+)
+
+CUSTOM_THRESHOLDS = CrowdingThresholds(
+    morning_rush=(6, 10),
+    evening_rush=(16, 20),
+    rush_high=2.0,
+    rush_medium=5.0,
+    off_peak_medium=3.5,
+    rain_adjustment=1.0,
+)
+
+# Every cutoff, with and without the rain adjustment, plus the values either side
+EDGE_HEADWAYS = sorted({
+    value
+    for thresholds in (DEFAULT_THRESHOLDS, CUSTOM_THRESHOLDS)
+    for cutoff in (thresholds.rush_high, thresholds.rush_medium, thresholds.off_peak_medium)
+    for base in (cutoff, cutoff + thresholds.rain_adjustment)
+    for value in (base, np.nextafter(base, -np.inf), np.nextafter(base, np.inf))
+} | {2.5, 3.0, 4.0, 0.0, -1.0})
+SPECIAL_HEADWAYS = [np.nan, np.inf, -np.inf]
+
+
+def assert_matches_scalar(frequency, hour, is_holiday, is_rainy, is_delay, thresholds):
+    codes = classify_crowding_batch(
+        frequency=frequency,
+        hour=hour,
+        is_holiday=is_holiday,
+        is_rainy=is_rainy,
+        is_delay=is_delay,
+        thresholds=thresholds,
+    )
+    expected = [
+        classify_crowding(f, h, is_holiday=bool(hol), is_rainy=bool(rain), is_delay=bool(delay), thresholds=thresholds)
+        for f, h, hol, rain, delay in zip(frequency, hour, is_holiday, is_rainy, is_delay)
+    ]
+    assert [CROWDING_LEVELS[code] for code in codes] == expected
+
+
+@pytest.mark.parametrize("thresholds", [DEFAULT_THRESHOLDS, CUSTOM_THRESHOLDS], ids=["default", "custom"])
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_matches_scalar_on_random_rows(thresholds, seed):
+    rng = np.random.default_rng(seed)
+    n = 5000
+    frequency = rng.uniform(-1, 12, n)
+    # Sprinkle in cutoff values and NaN/inf
+    picks = rng.random(n)
+    frequency[picks < 0.2] = rng.choice(EDGE_HEADWAYS, int((picks < 0.2).sum()))
+    special = picks > 0.95
+    frequency[special] = rng.choice(SPECIAL_HEADWAYS, int(special.sum()))
+
+    assert_matches_scalar(
+        frequency,
+        rng.integers(0, 24, n),
+        rng.random(n) < 0.3,
+        rng.random(n) < 0.3,
+        rng.random(n) < 0.2,
+        thresholds,
+    )
+
+
+@pytest.mark.parametrize("thresholds", [DEFAULT_THRESHOLDS, CUSTOM_THRESHOLDS], ids=["default", "custom"])
+def test_batch_matches_scalar_on_every_edge_and_flag_combination(thresholds):
+    headways = EDGE_HEADWAYS + SPECIAL_HEADWAYS
+    combos = list(itertools.product(headways, range(24), (False, True), (False, True), (False, True)))
+    frequency, hour, is_holiday, is_rainy, is_delay = (np.array(column) for column in zip(*combos))
+
+    assert_matches_scalar(frequency, hour, is_holiday, is_rainy, is_delay, thresholds)
+
+
+def test_scalar_flags_broadcast_against_columns():
+    frequency = np.array([2.0, 3.5, 5.0])
+    hour = np.array([8, 8, 8])
+
+    codes = classify_crowding_batch(frequency, hour, is_holiday=False, is_rainy=True, is_delay=False)
+
+    assert [CROWDING_LEVELS[code] for code in codes] == [
+        classify_crowding(f, 8, is_rainy=True) for f in frequency
+    ]
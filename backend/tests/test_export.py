@@ -0,0 +1,91 @@
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import export
+from app.main import app
+
+ROWS = [
+    (1, "TST", "TWL", datetime(2026, 3, 2, 8, 15, tzinfo=timezone.utc), 2.0, 3.0, "medium", False),
+    (2, "CEN", "ISL", datetime(2026, 3, 2, 8, 16, tzinfo=timezone.utc), None, 4.0, "low", True),
+]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = list(ROWS)
+
+    def execute(self, query, params):
+        if self.conn.fail_query:
+            raise RuntimeError("relation does not exist")
+
+    def fetchmany(self, size):
+        page, self.rows = self.rows[:size], self.rows[size:]
+        return page
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, fail_query=False):
+        self.fail_query = fail_query
+        self.closed = False
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEngine:
+    def __init__(self, conn=None):
+        self.conn = conn
+
+    def raw_connection(self):
+        if self.conn is None:
+            raise RuntimeError("could not connect to server")
+        return self.conn
+
+
+@pytest.mark.parametrize("path", ["/api/flow/export", "/api/training-flow/export"])
+def test_export_streams_rows(monkeypatch, path):
+    conn = FakeConnection()
+    monkeypatch.setattr(export, "engine", FakeEngine(conn))
+
+    response = TestClient(app).get(path, params={"gzip": True})
+
+    assert response.status_code == 200
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert lines[0] == ",".join(export.EXPORT_COLUMNS)
+    assert lines[1].startswith("1,TST,TWL,2026-03-02T08:15:00+00:00")
+    assert len(lines) == 3
+    assert conn.closed
+
+
+def test_export_is_503_when_the_database_is_down(monkeypatch):
+    monkeypatch.setattr(export, "engine", FakeEngine())
+
+    response = TestClient(app).get("/api/flow/export", params={"gzip": True})
+
+    assert response.status_code == 503
+
+
+def test_export_is_503_and_releases_the_connection_when_the_query_fails(monkeypatch):
+    conn = FakeConnection(fail_query=True)
+    monkeypatch.setattr(export, "engine", FakeEngine(conn))
+
+    response = TestClient(app).get("/api/training-flow/export", params={"format": "ndjson"})
+
+    assert response.status_code == 503
+    assert conn.closed
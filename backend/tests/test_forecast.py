@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.ml import external_data, forecast
+from app.ml.forecast import HOURS_OF_WEEK, SeasonalProfile
+
+NOW = datetime(2026, 3, 2, 6, 30, tzinfo=timezone.utc)
+
+
+def one_station_profile() -> SeasonalProfile:
+    profile = SeasonalProfile()
+    profile.stations = ["TST"]
+    profile.lines = ["TWL"]
+    profile.counts = np.zeros((1, 1, HOURS_OF_WEEK, 2, 3), dtype=np.int64)
+    profile.counts[..., 0] = 4  # always low
+    profile.headway_sum = np.full((1, 1, HOURS_OF_WEEK, 2), 8.0)
+    profile.headway_n = np.full((1, 1, HOURS_OF_WEEK, 2), 4, dtype=np.int64)
+    return profile
+
+
+def test_empty_profile_writes_nothing(monkeypatch):
+    def fetch_weather_status():
+        pytest.fail("weather fetched for an empty profile")
+
+    monkeypatch.setattr(external_data, "fetch_weather_status", fetch_weather_status)
+
+    assert forecast.write_predictions(SeasonalProfile(), 24, now=NOW) == (0, None)
+
+
+def test_forecast_uses_a_freshly_fetched_observation(monkeypatch):
+    fetched = []
+    monkeypatch.setattr(
+        external_data,
+        "fetch_weather_status",
+        lambda: fetched.append(True) or {"is_rainy": True, "warnings": [], "temperature": 20},
+    )
+    monkeypatch.setattr(forecast, "get_public_holidays", lambda: set())
+    seen = {}
+
+    class StopBeforeWrite(Exception):
+        pass
+
+    profile = one_station_profile()
+    original = profile.forecast
+
+    def recording_forecast(*args, **kwargs):
+        seen.update(kwargs)
+        original(*args, **kwargs)
+        raise StopBeforeWrite
+
+    monkeypatch.setattr(profile, "forecast", recording_forecast)
+    try:
+        forecast.write_predictions(profile, 3, now=NOW)
+    except StopBeforeWrite:
+        pass
+
+    assert fetched == [True]
+    assert seen["is_rainy"] is True
+
+
+def test_rain_raises_level_from_expected_headway():
+    profile = one_station_profile()
+    profile.headway_sum[:] = 4 * 4.2  # 4.2 minutes: low when dry, medium in the rush with rain
+    # 08:00 HKT on a Monday
+    target = [datetime(2026, 3, 2, 0, 0, tzinfo=timezone.utc)]
+
+    dry = profile.forecast(target, holidays=set(), is_rainy=False)
+    wet = profile.forecast(target, holidays=set(), is_rainy=True)
+
+    assert dry["level"].tolist() == [[0]]
+    assert wet["level"].tolist() == [[1]]
@@ -0,0 +1,170 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_async_supabase
+from app.db.repository import RepositoryUnavailable
+from app.main import app
+from app.ml import ingest
+from app.ml.latest_flow import LatestFlowStore
+
+NOW = datetime(2026, 3, 2, 8, 15, tzinfo=timezone.utc).isoformat()
+
+
+def flow_row(station_code="TST", line_code="TWL", **extra):
+    return {"station_code": station_code, "line_code": line_code, "timestamp": NOW, **extra}
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def insert(self, payload):
+        self.payload = payload
+        return self
+
+    def execute(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        if any(row["station_code"] == "BAD" for row in rows):
+            raise RuntimeError("violates check constraint")
+        stored = []
+        for row in rows:
+            self.client.next_id += 1
+            stored.append({**row, "id": self.client.next_id})
+        self.client.tables.setdefault(self.name, []).extend(stored)
+        return type("Response", (), {"data": stored})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.next_id = 0
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    """Postgres unreachable, so every write goes through the Supabase fallback."""
+    def unavailable(table, payload):
+        raise RepositoryUnavailable("no postgres")
+
+    monkeypatch.setattr(ingest.flow_repository, "insert_rows", unavailable)
+    monkeypatch.setattr(ingest, "latest_flow_store", LatestFlowStore())
+    monkeypatch.setattr(ingest, "is_today_holiday", lambda: False)
+    monkeypatch.setattr(ingest, "get_weather_status", lambda: {"is_rainy": False})
+    return FakeSupabase()
+
+
+def test_validate_flow_rows_keeps_request_order_and_reports_bad_rows():
+    valid, errors = ingest.validate_flow_rows([flow_row(), {"station_code": "X"}, flow_row("CEN")])
+
+    assert [index for index, _ in valid] == [0, 2]
+    assert list(errors) == [1]
+    assert "timestamp" in errors[1]
+
+
+def test_fill_crowding_levels_only_classifies_missing_levels(supabase):
+    rows = [
+        ingest.schemas.FlowDataCreate.model_validate(flow_row(next_train_minutes=2.0)),
+        ingest.schemas.FlowDataCreate.model_validate(flow_row(next_train_minutes=2.0, crowding_level="low")),
+        ingest.schemas.FlowDataCreate.model_validate(flow_row()),
+    ]
+    ingest.fill_crowding_levels(rows)
+
+    # 08:15 on a weekday is rush hour: a 2 minute headway is high
+    assert [row.crowding_level for row in rows] == ["high", "low", None]
+
+
+def test_ingest_results_report_each_row_and_target(supabase):
+    rows = [flow_row(next_train_minutes=3.0), {"station_code": "X"}, flow_row("BAD"), flow_row("CEN", "ISL")]
+
+    results = ingest.ingest_flow_rows(supabase, rows)
+
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [result["success"] for result in results] == [True, False, False, True]
+    assert "targets" not in results[1]
+    assert set(results[0]["targets"]) == {"flow_data", "training_flow_data"}
+    assert results[2]["targets"]["flow_data"] == {"success": False, "error": "violates check constraint"}
+    assert results[3]["station_code"] == "CEN" and results[3]["line_code"] == "ISL"
+    # Bulk insert rejected, so the good rows were retried one by one
+    assert len(supabase.tables["flow_data"]) == 2
+    assert len(supabase.tables["training_flow_data"]) == 2
+
+
+def test_insert_flow_rows_keys_outcomes_by_request_index(supabase):
+    valid, _ = ingest.validate_flow_rows([{"station_code": "X"}, flow_row(), flow_row("CEN")])
+
+    inserted, errors = ingest.insert_flow_rows(supabase, "flow_data", valid)
+
+    assert sorted(inserted) == [1, 2]
+    assert errors == {}
+    assert inserted[2]["station_code"] == "CEN"
+    assert {row["station_code"] for row in ingest.latest_flow_store.rows()} == {"TST", "CEN"}
+
+
+def test_insert_flow_rows_prefers_postgres(supabase, monkeypatch):
+    calls = []
+
+    def insert_rows(table, payload):
+        calls.append((table, len(payload)))
+        return {0: {**payload[0], "id": 7}}, {1: "rejected"}
+
+    monkeypatch.setattr(ingest.flow_repository, "insert_rows", insert_rows)
+    valid, _ = ingest.validate_flow_rows([flow_row(), flow_row("CEN")])
+
+    inserted, errors = ingest.insert_flow_rows(supabase, "training_flow_data", valid)
+
+    assert calls == [("training_flow_data", 2)]
+    assert inserted[0]["id"] == 7
+    assert errors == {1: "rejected"}
+    assert supabase.tables == {}
+
+
+def test_insert_flow_rows_without_any_writer_reports_every_row(supabase):
+    valid, _ = ingest.validate_flow_rows([flow_row(), flow_row("CEN")])
+
+    inserted, errors = ingest.insert_flow_rows(None, "flow_data", valid)
+
+    assert inserted == {}
+    assert errors == {0: "Database connection unavailable", 1: "Database connection unavailable"}
+
+
+@pytest.fixture
+def postgres_only(monkeypatch):
+    """No Supabase client; Postgres accepts every row."""
+    def insert_rows(table, payload):
+        return {pos: {**row, "id": pos + 1} for pos, row in enumerate(payload)}, {}
+
+    monkeypatch.setattr(ingest.flow_repository, "insert_rows", insert_rows)
+    monkeypatch.setattr(ingest, "latest_flow_store", LatestFlowStore())
+    app.dependency_overrides[get_async_supabase] = lambda: None
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("path", ["/api/flow/", "/api/training-flow/"])
+def test_single_row_post_writes_through_postgres(postgres_only, path):
+    response = postgres_only.post(path, json=flow_row())
+
+    assert response.status_code == 200
+    assert response.json()["id"] == 1
+
+
+def test_batch_and_ingest_accept_rows_without_supabase(postgres_only):
+    assert postgres_only.post("/api/flow/batch", json=[flow_row()]).json()[0]["success"] is True
+    assert postgres_only.post("/api/ingest/", json=flow_row()).json()[0]["success"] is True
+
+
+def test_single_row_post_without_any_writer_is_503(supabase):
+    app.dependency_overrides[get_async_supabase] = lambda: None
+    try:
+        response = TestClient(app).post("/api/flow/", json=flow_row())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == ingest.DATABASE_UNAVAILABLE
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.db.repository import RepositoryUnavailable
+from app.ml import latest_flow
+from app.ml.latest_flow import LatestFlowStore, sync_latest_flow
+
+
+def flow_row(station_code="TST", timestamp="2026-03-02T08:15:00+00:00", **extra):
+    return {"id": 1, "station_code": station_code, "line_code": "TWL", "timestamp": timestamp,
+            "crowding_level": "low", **extra}
+
+
+class FlowLatestTable:
+    """flow_latest as another instance's ingests leave it."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = 0
+
+    def __call__(self, station_code=None):
+        self.reads += 1
+        if isinstance(self.rows, Exception):
+            raise self.rows
+        return list(self.rows)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = LatestFlowStore()
+    monkeypatch.setattr(latest_flow, "latest_flow_store", store)
+    return store
+
+
+def sync(monkeypatch, table):
+    monkeypatch.setattr(latest_flow.flow_repository, "latest_lines", table)
+    return asyncio.run(sync_latest_flow(None))
+
+
+def test_store_is_reloaded_once_per_interval(store, monkeypatch):
+    table = FlowLatestTable([flow_row()])
+
+    assert sync(monkeypatch, table) is True
+    # Another instance ingests a newer row: not read again within the interval
+    table.rows = [flow_row(timestamp="2026-03-02T08:15:30+00:00", crowding_level="high")]
+    assert sync(monkeypatch, table) is True
+    assert table.reads == 1
+
+    store.defer_sync(0)
+    assert sync(monkeypatch, table) is True
+    assert table.reads == 2
+    assert store.network()["stations"]["TST"]["crowding_level"] == "high"
+
+
+def test_reloading_unchanged_rows_keeps_the_version(store, monkeypatch):
+    published = []
+    store.add_listener(published.append)
+    table = FlowLatestTable([flow_row(), flow_row("CEN")])
+
+    sync(monkeypatch, table)
+    version = store.version
+    store.defer_sync(0)
+    sync(monkeypatch, table)
+
+    assert store.version == version
+    assert len(published) == 1
+
+
+def test_relabelled_row_replaces_the_one_with_the_same_timestamp(store):
+    store.update([flow_row()])
+    store.update([flow_row(crowding_level="medium")])
+
+    assert store.rows()[0]["crowding_level"] == "medium"
+    assert store.version == 2
+
+
+def test_failed_reload_serves_the_last_rows_and_backs_off(store, monkeypatch):
+    sync(monkeypatch, FlowLatestTable([flow_row()]))
+    store.defer_sync(0)
+    down = FlowLatestTable(RepositoryUnavailable("no postgres"))
+
+    assert sync(monkeypatch, down) is True
+    assert sync(monkeypatch, down) is True
+    assert down.reads == 1
+    assert store.rows()[0]["station_code"] == "TST"
+
+
+def test_empty_store_without_a_backend_is_not_ready(store, monkeypatch):
+    down = FlowLatestTable(RepositoryUnavailable("no postgres"))
+
+    assert sync(monkeypatch, down) is False
+    # Nothing to serve yet: every request tries again
+    assert sync(monkeypatch, down) is False
+    assert down.reads == 2
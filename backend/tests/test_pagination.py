@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_async_supabase
+from app.db.pagination import NEXT_CURSOR_HEADER, InvalidCursor, decode_cursor, encode_cursor
+from app.main import app
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2026-03-02T08:15:00+00:00", 42)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, datetime, int) == [datetime(2026, 3, 2, 8, 15, tzinfo=timezone.utc), 42]
+    assert decode_cursor(encode_cursor("TST"), str) == ["TST"]
+
+
+def test_timestamps_without_offset_are_utc():
+    (after_ts,) = decode_cursor(encode_cursor("2026-03-02T08:15:00"), datetime)
+    assert after_ts == datetime(2026, 3, 2, 8, 15, tzinfo=timezone.utc)
+
+    (after_ts,) = decode_cursor(encode_cursor("2026-03-02T08:15:00Z"), datetime)
+    assert after_ts.tzinfo is not None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    raw_cursor({"timestamp": "2026-03-02T08:15:00+00:00"}),
+    raw_cursor(["2026-03-02T08:15:00+00:00"]),
+    raw_cursor(["2026-03-02T08:15:00+00:00", 42, 1]),
+    raw_cursor(["2026-03-02T08:15:00+00:00", "42"]),
+    raw_cursor(["2026-03-02T08:15:00+00:00", "1),id.gt.0"]),
+    raw_cursor(["2026-03-02T08:15:00+00:00", True]),
+    raw_cursor(["2026-03-02T08:15:00+00:00", 4.5]),
+    raw_cursor(['2026-03-02",station_code.neq."x', 42]),
+    raw_cursor([1700000000, 42]),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, datetime, int)
+
+
+def test_station_cursor_must_be_a_string():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(raw_cursor([7]), str)
+
+
+@pytest.fixture
+def client(fake_supabase):
+    rows = [
+        {"id": 9, "station_code": "TST", "timestamp": "2026-03-02T08:15:00+00:00"},
+        {"id": 8, "station_code": "TST", "timestamp": "2026-03-02T08:14:00+00:00"},
+    ]
+    supabase = fake_supabase(rows)
+    app.dependency_overrides[get_async_supabase] = lambda: supabase
+    yield TestClient(app), supabase
+    app.dependency_overrides.clear()
+
+
+def test_flow_list_cursor_filter_is_built_from_parsed_values(client):
+    client, supabase = client
+    first = client.get("/api/flow/", params={"limit": 2})
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+
+    assert client.get("/api/flow/", params={"limit": 2, "cursor": cursor}).status_code == 200
+    assert supabase.queries[-1].filters[-1] == (
+        "or",
+        'timestamp.lt."2026-03-02T08:14:00+00:00",and(timestamp.eq."2026-03-02T08:14:00+00:00",id.lt.8)',
+    )
+
+
+@pytest.mark.parametrize("values", [
+    ["2026-03-02T08:14:00+00:00", "8),station_code.eq.(x"],
+    ['2026-03-02T08:14:00+00:00",id.gt."0', 8],
+])
+def test_flow_list_rejects_injected_cursor_with_400(client, values):
+    client, supabase = client
+    response = client.get("/api/flow/", params={"cursor": raw_cursor(values)})
+
+    assert response.status_code == 400
+    assert not any(kind == "or" for query in supabase.queries for kind, *_ in query.filters)
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+from app.ml import prediction_cache as prediction_cache_module
+from app.ml.prediction_cache import PredictionCache
+
+NOW = datetime(2026, 3, 2, 8, tzinfo=timezone.utc)
+
+
+def rows_for(version, station_code="TST"):
+    return [
+        {
+            "id": version * 10 + h,
+            "station_code": station_code,
+            "prediction_timestamp": (NOW + timedelta(hours=h)).isoformat(),
+            "predicted_crowding": "medium",
+            "confidence": 0.5,
+        }
+        for h in range(3)
+    ]
+
+
+def make_cache(monkeypatch, published):
+    monkeypatch.setattr(prediction_cache_module, "get_supabase", lambda: object())
+    cache = PredictionCache()
+    monkeypatch.setattr(cache, "_latest_version", lambda supabase: published["version"])
+    monkeypatch.setattr(cache, "_load_rows", lambda supabase: rows_for(published["version"]))
+    return cache
+
+
+def test_refresh_swaps_version_and_stations_together(monkeypatch):
+    published = {"version": 1}
+    cache = make_cache(monkeypatch, published)
+
+    assert cache.refresh()
+    before = cache.snapshot
+
+    published["version"] = 2
+    assert cache.refresh()
+    after = cache.snapshot
+
+    # A reader holding the old snapshot keeps a consistent version and body
+    assert before.version == 1
+    assert before.station("TST").rows[0]["id"] == 10
+    assert after.version == 2
+    assert after.station("TST").rows[0]["id"] == 20
+    assert cache.version == 2
+
+
+def test_refresh_without_new_version_keeps_the_snapshot(monkeypatch):
+    cache = make_cache(monkeypatch, {"version": 1})
+
+    assert cache.refresh()
+    snapshot = cache.snapshot
+    assert not cache.refresh()
+    assert cache.snapshot is snapshot
+    assert cache.refresh(force=True)
+    assert cache.snapshot is not snapshot
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from app.ml.crowding import classify_crowding
+from app.ml.relabel import derive_labels
+
+# Rush hour, 2.7 minute headway: medium when dry, high with the rain adjustment
+HOUR = 8
+HEADWAY = 2.7
+
+
+def derive(labels, assume_rainy=None):
+    n = len(labels)
+    return derive_labels(
+        frequency=np.full(n, HEADWAY),
+        hour=np.full(n, HOUR),
+        is_holiday=np.zeros(n, dtype=bool),
+        is_delay=np.zeros(n, dtype=bool),
+        labels=labels,
+        assume_rainy=assume_rainy,
+    )
+
+
+def test_headway_is_rain_sensitive():
+    dry = classify_crowding(HEADWAY, HOUR)
+    rainy = classify_crowding(HEADWAY, HOUR, is_rainy=True)
+    assert dry != rainy
+
+
+def test_labels_explained_by_either_weather_are_kept():
+    dry = classify_crowding(HEADWAY, HOUR)
+    rainy = classify_crowding(HEADWAY, HOUR, is_rainy=True)
+    wrong = next(level for level in ("low", "medium", "high") if level not in (dry, rainy))
+
+    new_labels, changed = derive([dry, rainy, wrong, None])
+
+    assert changed.tolist() == [2, 3]
+    assert new_labels[2] == dry and new_labels[3] == dry
+
+
+@pytest.mark.parametrize("assume_rainy", [False, True])
+def test_forced_weather_rewrites_the_other_label(assume_rainy):
+    dry = classify_crowding(HEADWAY, HOUR)
+    rainy = classify_crowding(HEADWAY, HOUR, is_rainy=True)
+
+    new_labels, changed = derive([dry, rainy], assume_rainy=assume_rainy)
+
+    assert changed.tolist() == ([1] if not assume_rainy else [0])
+    assert set(new_labels) == {rainy if assume_rainy else dry}
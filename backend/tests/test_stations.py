@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_async_supabase
+from app.main import app
+from app.ml.station_registry import StationRegistry, build_snapshot
+from app.routers import stations
+
+STATIONS = [{"id": 1, "code": "TST", "name": "Tsim Sha Tsui"}]
+
+
+@pytest.fixture
+def client(monkeypatch, fake_supabase):
+    """Registry not loaded yet, no collector: every lookup falls back to the database."""
+    supabase = fake_supabase(STATIONS)
+    monkeypatch.setattr(stations, "station_registry", StationRegistry())
+    monkeypatch.setattr(stations, "get_collector", lambda: None)
+    monkeypatch.setattr(stations, "get_station_trains", lambda code: {"station_code": code, "timestamp": "2026-03-02T08:15:00+00:00", "lines": []})
+    app.dependency_overrides[get_async_supabase] = lambda: supabase
+    yield TestClient(app), supabase
+    app.dependency_overrides.clear()
+
+
+def test_station_detail_falls_back_to_database(client):
+    client, _ = client
+
+    assert client.get("/api/stations/TST").json()["name"] == "Tsim Sha Tsui"
+    assert client.get("/api/stations/XXX").status_code == 404
+
+
+def test_train_arrivals_name_falls_back_to_database(client):
+    client, supabase = client
+
+    assert client.get("/api/stations/tst/trains").json()["station_name"] == "Tsim Sha Tsui"
+    assert client.get("/api/stations/XXX/trains").json()["station_name"] == "XXX"
+    assert len(supabase.queries) == 2
+
+
+def test_train_arrivals_name_comes_from_loaded_registry(client, monkeypatch):
+    client, supabase = client
+    registry = StationRegistry()
+    registry._snapshot = build_snapshot(STATIONS)
+    monkeypatch.setattr(stations, "station_registry", registry)
+
+    assert client.get("/api/stations/tst/trains").json()["station_name"] == "Tsim Sha Tsui"
+    assert len(supabase.queries) == 0
@@ -7,6 +7,7 @@ import { Map, LayoutGrid, Network } from 'lucide-react';
 import { stationsApi, flowDataApi, type Station, type FlowData } from '@/lib/api';
 import { Header } from '@/components/dashboard/header';
 import { CrowdingBadge } from '@/components/dashboard/crowding-badge';
+import { useFlowStream } from '@/hooks/use-flow-stream';
 import { cn } from '@/lib/utils';
 import Link from 'next/link';
 import { SystemMap } from '@/components/map/system-map';
@@ -36,15 +37,25 @@ export default function MapPage() {
     },
   });
 
-  const { data: flowDataMap } = useQuery({
+  // Pushed by the API; polling is the fallback while the stream is down
+  const streamedFlow = useFlowStream();
+
+  const { data: polledFlow } = useQuery({
     queryKey: ['allFlowData', stations?.map((s) => s.code)],
     queryFn: async () => {
       if (!stations) return new globalThis.Map<string, FlowData | null>();
 
       const flowMap = new globalThis.Map<string, FlowData | null>();
-      // To prevent spamming the "mock" API too hard in parallel if there are many stations, 
-      // we could batch this, but for now we'll rely on the mock being fast.
-      // In a real app with 90+ stations, we'd want a bulk endpoint.
+      try {
+        const response = await flowDataApi.getNetworkLatest();
+        stations.forEach((station) => {
+          flowMap.set(station.code, response.data.stations[station.code] ?? null);
+        });
+        return flowMap;
+      } catch {
+        // Fall back to per-station requests (with mock data) if the bulk endpoint fails
+      }
+
       await Promise.all(
         stations.map(async (station) => {
           try {
@@ -57,9 +68,10 @@ export default function MapPage() {
       );
       return flowMap;
     },
-    enabled: !!stations && stations.length > 0,
+    enabled: !!stations && stations.length > 0 && !streamedFlow,
     refetchInterval: 10000,
   });
+  const flowDataMap = streamedFlow ?? polledFlow;
 
   // Group stations by line
   // We use the order in lineStyles to define the display order
@@ -12,6 +12,7 @@ import { LineFilter } from '@/components/dashboard/line-filter';
 import { CrowdingOverview } from '@/components/dashboard/crowding-overview';
 import { ServiceStatusBanner } from '@/components/dashboard/service-status-banner';
 import { useMTRStatus } from '@/hooks/use-mtr-status';
+import { useFlowStream } from '@/hooks/use-flow-stream';
 import { cn } from '@/lib/utils';
 
 export default function Dashboard() {
@@ -33,14 +34,26 @@ export default function Dashboard() {
     },
   });
 
-  // Fetch flow data for all stations
-  const { data: flowDataMap } = useQuery({
+  // Flow data for all stations is pushed by the API; polling is the
+  // fallback while the stream is down
+  const streamedFlow = useFlowStream();
+
+  const { data: polledFlow } = useQuery({
     queryKey: ['allFlowData', stations?.map((s) => s.code)],
     queryFn: async () => {
       if (!stations) return new globalThis.Map<string, FlowData | null>();
 
       const flowMap = new globalThis.Map<string, FlowData | null>();
-      // Use parallel fetch but catches errors individually
+      try {
+        const response = await flowDataApi.getNetworkLatest();
+        stations.forEach((station) => {
+          flowMap.set(station.code, response.data.stations[station.code] ?? null);
+        });
+        return flowMap;
+      } catch {
+        // Fall back to per-station requests (with mock data) if the bulk endpoint fails
+      }
+
       await Promise.all(
         stations.map(async (station) => {
           try {
@@ -53,9 +66,10 @@ export default function Dashboard() {
       );
       return flowMap;
     },
-    enabled: !!stations && stations.length > 0,
+    enabled: !!stations && stations.length > 0 && !streamedFlow,
     refetchInterval: 10000,
   });
+  const flowDataMap = streamedFlow ?? polledFlow;
 
   // Get unique lines
   const lines = useMemo(() => {
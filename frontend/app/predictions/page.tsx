@@ -18,7 +18,7 @@ import {
   CartesianGrid,
   Legend,
 } from 'recharts';
-import { stationsApi, type Station } from '@/lib/api';
+import { stationsApi, predictionsApi, type PredictionGrid, type Station } from '@/lib/api';
 import { GridBackground } from '@/components/effects/grid-background';
 import { Header } from '@/components/dashboard/header';
 import { UnderDevelopmentBanner } from '@/components/dashboard/under-development-banner';
@@ -61,6 +61,24 @@ function generatePredictionData(stations: Station[]) {
   return hours;
 }
 
+// Chart rows from the bulk predictions endpoint (levels plotted as 1-3)
+function gridToPredictionData(grid: PredictionGrid) {
+  return grid.timestamps.map((timestamp, i) => {
+    const hour = new Date(timestamp);
+    const dataPoint: Record<string, string | number> = {
+      time: formatHKTime(hour),
+      hour: hour.getHours(),
+    };
+    Object.entries(grid.stations).forEach(([code, levels]) => {
+      const level = levels[i];
+      if (level !== null && level !== undefined) {
+        dataPoint[code] = level + 1;
+      }
+    });
+    return dataPoint;
+  });
+}
+
 // Get peak hours for a station's predictions
 function analyzePredictions(predictions: Record<string, string | number>[], stationCode: string) {
   const highHours = predictions
@@ -92,7 +110,23 @@ export default function PredictionsPage() {
   });
 
   const selectedStations = stations?.slice(0, 5) || [];
-  const predictionData = stations
+  const selectedCodes = selectedStations.map((station) => station.code);
+
+  // One request for every selected station instead of one per station
+  const { data: predictionGrid } = useQuery({
+    queryKey: ['predictions', 'network', selectedCodes],
+    queryFn: async () => {
+      const response = await predictionsApi.getNetwork(selectedCodes, 24);
+      return response.data;
+    },
+    enabled: selectedCodes.length > 0,
+  });
+
+  const hasPredictions =
+    !!predictionGrid && Object.keys(predictionGrid.stations).length > 0;
+  const predictionData = hasPredictions
+    ? gridToPredictionData(predictionGrid)
+    : stations
     ? generatePredictionData(selectedStations)
     : [];
 
@@ -31,6 +31,7 @@ import {
 import { stationsApi, flowDataApi, predictionsApi, type Prediction } from '@/lib/api';
 import { useTrainArrivals } from '@/hooks/use-train-arrivals';
 import { useMTRStatus } from '@/hooks/use-mtr-status';
+import { useFlowStream } from '@/hooks/use-flow-stream';
 import { GridBackground } from '@/components/effects/grid-background';
 import { Header } from '@/components/dashboard/header';
 import { ServiceStatusBanner } from '@/components/dashboard/service-status-banner';
@@ -106,9 +107,10 @@ export default function StationDetailPage() {
     return foundStation?.name || code;
   };
 
-  // Fetch latest flow data
+  // Latest flow data is pushed by the API; polling is the fallback
+  const streamedFlow = useFlowStream();
   const {
-    data: flowData,
+    data: polledFlow,
     refetch: refetchFlow,
   } = useQuery({
     queryKey: ['flow', stationCode],
@@ -120,8 +122,10 @@ export default function StationDetailPage() {
         return null;
       }
     },
+    enabled: !streamedFlow,
     refetchInterval: 10000, // Refetch every 10 seconds
   });
+  const flowData = streamedFlow?.get(stationCode) ?? polledFlow;
 
   // Fetch historical flow data
   const { data: historicalData } = useQuery({
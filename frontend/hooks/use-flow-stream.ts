@@ -0,0 +1,69 @@
+import { useEffect, useState } from 'react';
+import { flowDataApi, type FlowData, type FlowLineUpdate, type FlowStreamEvent } from '@/lib/api';
+
+const LEVELS = ['low', 'medium', 'high'] as const;
+
+// Same interchange rules as the API: highest crowding, best headway,
+// soonest next train, delayed if any line is delayed, newest timestamp
+function aggregateStation(lines: FlowLineUpdate[]): FlowData {
+  const levels = lines
+    .map((line) => (line.crowding_level ? LEVELS.indexOf(line.crowding_level) : -1))
+    .filter((level) => level >= 0);
+  const frequencies = lines.flatMap((line) => (line.train_frequency != null ? [line.train_frequency] : []));
+  const nextTrains = lines.flatMap((line) => (line.next_train_minutes != null ? [line.next_train_minutes] : []));
+  const newest = lines.reduce((a, b) => (b.timestamp > a.timestamp ? b : a));
+
+  return {
+    id: newest.id,
+    station_code: newest.station_code,
+    timestamp: newest.timestamp,
+    crowding_level: levels.length ? LEVELS[Math.max(...levels)] : lines[0].crowding_level,
+    train_frequency: frequencies.length ? Math.min(...frequencies) : undefined,
+    next_train_minutes: nextTrains.length ? Math.min(...nextTrains) : undefined,
+    is_delay: lines.some((line) => line.is_delay),
+  };
+}
+
+/**
+ * Latest flow per station, pushed by the API instead of polled.
+ * Returns null until the first snapshot arrives and while disconnected,
+ * so callers can fall back to polling.
+ */
+export function useFlowStream(enabled: boolean = true) {
+  const [flowMap, setFlowMap] = useState<Map<string, FlowData> | null>(null);
+
+  useEffect(() => {
+    if (!enabled || typeof EventSource === 'undefined') return;
+
+    // station code -> line code -> latest entry
+    const lines = new Map<string, Map<string, FlowLineUpdate>>();
+    let stations = new Map<string, FlowData>();
+    const source = new EventSource(flowDataApi.streamUrl);
+
+    const apply = (event: MessageEvent, reset: boolean) => {
+      const data: FlowStreamEvent = JSON.parse(event.data);
+      if (reset) {
+        lines.clear();
+        stations = new Map();
+      }
+      const touched = new Set<string>();
+      data.lines.forEach((line) => {
+        if (!lines.has(line.station_code)) lines.set(line.station_code, new Map());
+        lines.get(line.station_code)!.set(line.line_code ?? 'default', line);
+        touched.add(line.station_code);
+      });
+      stations = new Map(stations);
+      touched.forEach((code) => stations.set(code, aggregateStation([...lines.get(code)!.values()])));
+      setFlowMap(stations);
+    };
+
+    source.addEventListener('snapshot', (event) => apply(event as MessageEvent, true));
+    source.addEventListener('update', (event) => apply(event as MessageEvent, false));
+    // EventSource reconnects by itself and gets a fresh snapshot
+    source.onerror = () => setFlowMap(null);
+
+    return () => source.close();
+  }, [enabled]);
+
+  return flowMap;
+}
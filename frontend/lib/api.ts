@@ -30,6 +30,29 @@ export interface FlowData {
   is_delay?: boolean;
 }
 
+export interface NetworkLatestFlow {
+  version: number;
+  updated_at: string | null;
+  stations: Record<string, FlowData>;
+}
+
+// One station-line entry of the /api/stream/flow events
+export interface FlowLineUpdate {
+  id: number;
+  station_code: string;
+  line_code: string | null;
+  timestamp: string;
+  crowding_level?: 'low' | 'medium' | 'high';
+  train_frequency?: number;
+  next_train_minutes?: number;
+  is_delay?: boolean;
+}
+
+export interface FlowStreamEvent {
+  seq: number;
+  lines: FlowLineUpdate[];
+}
+
 export interface Prediction {
   id: number;
   station_code: string;
@@ -39,6 +62,16 @@ export interface Prediction {
   created_at: string;
 }
 
+export interface PredictionGrid {
+  version: number | null;
+  hours_ahead: number;
+  levels: Array<'low' | 'medium' | 'high'>;
+  timestamps: string[];
+  // Per station, index into `levels` for each timestamp (null = no prediction)
+  stations: Record<string, Array<number | null>>;
+  confidence: Record<string, Array<number | null>>;
+}
+
 export interface TrainArrival {
   platform: string;
   destination: string;
@@ -76,6 +109,10 @@ export const stationsApi = {
 };
 
 export const flowDataApi = {
+  // Latest aggregated record for every station in one request
+  getNetworkLatest: () => api.get<NetworkLatestFlow>('/api/flow/latest'),
+  // Server-sent events: a `snapshot`, then `update`s of changed station-lines
+  streamUrl: `${API_URL}/api/stream/flow`,
   getLatest: (stationCode: string) => {
     // Mock random flow data for prototype feel if API fails (optional but good for demo)
     // We try to call real API first, if it fails, return mock
@@ -153,6 +190,14 @@ export const predictionsApi = {
     }),
   getLatest: (stationCode: string) =>
     api.get<Prediction>(`/api/predictions/latest/${stationCode}`),
+  // Many stations (default: all) in one column-oriented response
+  getNetwork: (stationCodes?: string[], hoursAhead: number = 24) =>
+    api.get<PredictionGrid>('/api/predictions/', {
+      params: {
+        hours_ahead: hoursAhead,
+        ...(stationCodes?.length ? { stations: stationCodes.join(',') } : {}),
+      },
+    }),
 };
 
 export const trainsApi = {
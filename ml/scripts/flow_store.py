@@ -0,0 +1,208 @@
+"""
+Columnar, day-partitioned local store of flow_data.
+
+Each UTC day is a directory of typed NumPy column files that open
+memory-mapped, so loading a month is a handful of mmap calls rather than
+a CSV parse. Station and line codes are dictionary-encoded against a
+store-wide dictionary that only ever grows, so codes stay stable across
+partitions and runs.
+
+Layout:
+    flow_store/
+        dictionary.json          {"stations": [...], "lines": [...]}
+        2026-01-31/
+            id.npy               int64
+            station.npy          uint16 (index into stations)
+            line.npy             uint8  (index into lines, "" for none)
+            timestamp.npy        int64  (microseconds since epoch, UTC)
+            next_train.npy       float32 (NaN for null)
+            headway.npy          float32 (NaN for null)
+            crowding.npy         uint8  (0 low, 1 medium, 2 high, 3 null)
+            is_delay.npy         bool
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+ML_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_STORE_DIR = ML_ROOT / "data" / "flow_store"
+
+COLUMN_TYPES = {
+    "id": np.int64,
+    "station": np.uint16,
+    "line": np.uint8,
+    "timestamp": np.int64,
+    "next_train": np.float32,
+    "headway": np.float32,
+    "crowding": np.uint8,
+    "is_delay": np.bool_,
+}
+
+CROWDING_LEVELS = ["low", "medium", "high", "null"]
+CROWDING_CODES = {level: code for code, level in enumerate(CROWDING_LEVELS)}
+CROWDING_NULL = CROWDING_CODES["null"]
+
+US_PER_HOUR = 3600 * 1_000_000
+US_PER_DAY = 24 * US_PER_HOUR
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_us(value: datetime) -> int:
+    """Microseconds since the epoch for an aware datetime."""
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_us(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+class FlowStore:
+    def __init__(self, root: Path = DEFAULT_STORE_DIR) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._dictionary_path = self.root / "dictionary.json"
+        if self._dictionary_path.exists():
+            dictionary = json.loads(self._dictionary_path.read_text())
+        else:
+            dictionary = {"stations": [], "lines": [""]}
+        self.stations: List[str] = dictionary["stations"]
+        self.lines: List[str] = dictionary["lines"]
+
+    def _save_dictionary(self) -> None:
+        tmp_path = self._dictionary_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"stations": self.stations, "lines": self.lines}))
+        os.replace(tmp_path, self._dictionary_path)
+
+    def _encode(self, values: Iterable[Optional[str]], vocabulary: List[str], dtype) -> np.ndarray:
+        values = np.array([value or "" for value in values], dtype=object)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        index = {value: code for code, value in enumerate(vocabulary)}
+        for value in uniques:
+            if value not in index:
+                index[value] = len(vocabulary)
+                vocabulary.append(value)
+        if len(vocabulary) > np.iinfo(dtype).max + 1:
+            raise ValueError(f"Dictionary overflow for {np.dtype(dtype).name} codes")
+        mapping = np.array([index[value] for value in uniques], dtype=dtype)
+        return mapping[inverse.reshape(-1)] if len(values) else np.empty(0, dtype=dtype)
+
+    def columns_from_records(self, records: Dict[str, list]) -> Dict[str, np.ndarray]:
+        """
+        Encode raw column lists (as read from flow_data) into typed arrays.
+        Expects keys id, station_code, line_code, timestamp (aware datetimes
+        or epoch microseconds), next_train_minutes, train_frequency,
+        crowding_level and is_delay.
+        """
+        timestamps = [
+            value if isinstance(value, (int, np.integer)) else to_us(value)
+            for value in records["timestamp"]
+        ]
+        columns = {
+            "id": np.array(records["id"], dtype=np.int64),
+            "station": self._encode(records["station_code"], self.stations, np.uint16),
+            "line": self._encode(records["line_code"], self.lines, np.uint8),
+            "timestamp": np.array(timestamps, dtype=np.int64),
+            "next_train": np.array(
+                [np.nan if v is None else v for v in records["next_train_minutes"]], dtype=np.float32
+            ),
+            "headway": np.array(
+                [np.nan if v is None else v for v in records["train_frequency"]], dtype=np.float32
+            ),
+            "crowding": np.array(
+                [CROWDING_CODES.get(v or "null", CROWDING_NULL) for v in records["crowding_level"]],
+                dtype=np.uint8,
+            ),
+            "is_delay": np.array([bool(v) for v in records["is_delay"]], dtype=np.bool_),
+        }
+        self._save_dictionary()
+        return columns
+
+    def days(self) -> List[date]:
+        return sorted(
+            date.fromisoformat(path.name)
+            for path in self.root.iterdir()
+            if path.is_dir() and not path.name.startswith(".")
+        )
+
+    def load_day(self, day: date) -> Dict[str, np.ndarray]:
+        """Memory-mapped columns of one day partition."""
+        directory = self.root / day.isoformat()
+        return {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r")
+            for name in COLUMN_TYPES
+        }
+
+    def load(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Columns for start <= timestamp < end, concatenated across days."""
+        parts = []
+        for day in self.days():
+            day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+            if start and day_start + timedelta(days=1) <= start:
+                continue
+            if end and day_start >= end:
+                continue
+            parts.append(self.load_day(day))
+
+        if not parts:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_TYPES.items()}
+
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMN_TYPES}
+        mask = np.ones(len(columns["timestamp"]), dtype=bool)
+        if start:
+            mask &= columns["timestamp"] >= to_us(start)
+        if end:
+            mask &= columns["timestamp"] < to_us(end)
+        if mask.all():
+            return columns
+        return {name: values[mask] for name, values in columns.items()}
+
+    def write(self, columns: Dict[str, np.ndarray]) -> List[date]:
+        """
+        Merge rows into their day partitions, de-duplicated on id (newer
+        values win), and return the days touched. Each partition is
+        rewritten to a temporary directory and swapped in, so readers never
+        see a half-written day.
+        """
+        if not len(columns["timestamp"]):
+            return []
+
+        day_index = columns["timestamp"] // US_PER_DAY
+        touched = []
+        for day_value in np.unique(day_index):
+            mask = day_index == day_value
+            day = (EPOCH + timedelta(days=int(day_value))).date()
+            new = {name: columns[name][mask] for name in COLUMN_TYPES}
+
+            directory = self.root / day.isoformat()
+            if directory.exists():
+                old = self.load_day(day)
+                merged = {name: np.concatenate([new[name], old[name]]) for name in COLUMN_TYPES}
+                # np.unique keeps the first occurrence, i.e. the new row
+                _, keep = np.unique(merged["id"], return_index=True)
+                new = {name: values[keep] for name, values in merged.items()}
+
+            order = np.lexsort((new["id"], new["timestamp"]))
+            tmp_dir = self.root / f".{day.isoformat()}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            tmp_dir.mkdir()
+            for name, dtype in COLUMN_TYPES.items():
+                np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(new[name][order], dtype=dtype))
+
+            if directory.exists():
+                stale_dir = self.root / f".{day.isoformat()}.old"
+                shutil.rmtree(stale_dir, ignore_errors=True)
+                os.replace(directory, stale_dir)
+                os.replace(tmp_dir, directory)
+                shutil.rmtree(stale_dir)
+            else:
+                os.replace(tmp_dir, directory)
+            touched.append(day)
+        return touched
@@ -2,21 +2,35 @@
 """
 Phase 1 data analysis for AI prediction roadmap.
 Exports last-30-days flow_data and writes a data quality report.
+
+Runs are incremental: only rows past the watermark saved in
+ml/data/phase1_state.npz are fetched, appended to the columnar store,
+merged into the report aggregates and appended to the CSV export. Use
+--full to rebuild from scratch and rewrite the export.
 """
 from __future__ import annotations
 
+import argparse
 import csv
 import gzip
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import psycopg2
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 
+from flow_store import CROWDING_LEVELS, FlowStore, from_us
+from phase1_state import DEFAULT_STATE_PATH, ReportState
+
 ML_ROOT = Path(__file__).resolve().parents[1]
 ROOT = ML_ROOT.parent
 ENV_PATH = ROOT / "backend" / ".env"
@@ -34,22 +48,65 @@ REPORT_DIR = ML_ROOT / "docs"
 EXPORT_DIR = ML_ROOT / "data"
 REPORT_DIR.mkdir(parents=True, exist_ok=True)
 EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+STATE_PATH = DEFAULT_STATE_PATH
+
+
+Params = Union[dict, Sequence[Tuple[str, object]]]
+
+# flow_data columns kept in the columnar store
+STORE_FIELDS = [
+    "id",
+    "station_code",
+    "line_code",
+    "timestamp",
+    "next_train_minutes",
+    "train_frequency",
+    "crowding_level",
+    "is_delay",
+]
+
+EXPORT_COLUMNS = [
+    "station_code",
+    "timestamp",
+    "crowding_level",
+    "next_train_minutes",
+    "train_frequency",
+    "line_code",
+    "is_delay",
+]
+
+DEFAULT_SHARDS = 8
+# Supabase caps responses at 1000 rows by default (db-max-rows)
+DEFAULT_PAGE_SIZE = 1000
 
 
 class SupabaseRestClient:
-    def __init__(self, url: str, key: str) -> None:
+    def __init__(self, url: str, key: str, pool_size: int = DEFAULT_SHARDS) -> None:
         self.base_url = url.rstrip("/") + "/rest/v1"
         self.headers = {
             "apikey": key,
             "Authorization": f"Bearer {key}",
             "Content-Type": "application/json",
         }
-
-    def get(self, table: str, params: dict, prefer_count: bool = False) -> requests.Response:
+        self.pool_size = pool_size
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        # One keep-alive session per worker thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+            self._local.session = session
+        return session
+
+    def get(self, table: str, params: Params, prefer_count: bool = False) -> requests.Response:
         headers = dict(self.headers)
         if prefer_count:
             headers["Prefer"] = "count=exact"
-        response = requests.get(
+        response = self.session.get(
             f"{self.base_url}/{table}",
             params=params,
             headers=headers,
@@ -77,23 +134,55 @@ class SupabaseRestClient:
             return None
         return data[0]
 
-    def fetch_all(self, table: str, params: dict, page_size: int = 5000) -> List[dict]:
+    def fetch_all(self, table: str, params: dict, key: str = "id", page_size: int = DEFAULT_PAGE_SIZE) -> List[dict]:
+        """Fetch every matching row, paging by keyset on a unique `key` column."""
         items: List[dict] = []
-        offset = 0
+        last = None
         while True:
-            page_params = dict(params)
-            page_params["limit"] = page_size
-            page_params["offset"] = offset
-            response = self.get(table, params=page_params)
-            page = response.json()
+            page_params = [(k, v) for k, v in params.items() if k != "order"]
+            page_params += [("order", f"{key}.asc"), ("limit", page_size)]
+            if last is not None:
+                page_params.append((key, f"gt.{last}"))
+            page = self.get(table, params=page_params).json()
             if not page:
                 break
             items.extend(page)
-            if len(page) < page_size:
-                break
-            offset += page_size
+            last = page[-1][key]
         return items
 
+    def iter_time_range(
+        self,
+        table: str,
+        start: datetime,
+        end: datetime,
+        select: str = "*",
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[List[dict]]:
+        """
+        Yield pages of rows with start <= timestamp < end in (timestamp, id)
+        order. Each page starts strictly after the previous page's last
+        row, so every request is an index range scan instead of an OFFSET.
+        """
+        base = [
+            ("select", select),
+            ("timestamp", f"gte.{start.isoformat()}"),
+            ("timestamp", f"lt.{end.isoformat()}"),
+            ("order", "timestamp.asc,id.asc"),
+            ("limit", page_size),
+        ]
+        after: Optional[Tuple[str, int]] = None
+        while True:
+            params = list(base)
+            if after:
+                ts, row_id = after
+                params.append(("or", f'(timestamp.gt."{ts}",and(timestamp.eq."{ts}",id.gt.{row_id}))'))
+            page = self.get(table, params=params).json()
+            # Stop on an empty page only: the server may cap page size below ours
+            if not page:
+                break
+            yield page
+            after = (page[-1]["timestamp"], page[-1]["id"])
+
 
 def fetch_one(query: str, params: Optional[dict] = None) -> dict:
     if not engine:
@@ -117,387 +206,208 @@ def fmt_dt(value: Optional[datetime]) -> str:
     return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
 
-def write_csv_gz(query: str, export_path: Path) -> None:
-    if not DATABASE_URL:
-        raise RuntimeError("DATABASE_URL not set")
-    with psycopg2.connect(DATABASE_URL) as conn:
-        with conn.cursor() as cur:
-            with gzip.open(export_path, "wt", newline="") as gz:
-                cur.copy_expert(query, gz)
-
-
 def parse_ts(value: str) -> datetime:
     if value.endswith("Z"):
         value = value.replace("Z", "+00:00")
     return datetime.fromisoformat(value)
 
 
-def supabase_report(client: SupabaseRestClient) -> Tuple[int, Optional[datetime], Optional[datetime]]:
-    total_rows = client.count("flow_data")
-    min_row = client.fetch_first(
-        "flow_data",
-        {"select": "timestamp", "order": "timestamp.asc", "limit": 1},
-    )
-    max_row = client.fetch_first(
-        "flow_data",
-        {"select": "timestamp", "order": "timestamp.desc", "limit": 1},
-    )
-    min_ts = parse_ts(min_row["timestamp"]) if min_row else None
-    max_ts = parse_ts(max_row["timestamp"]) if max_row else None
-    return total_rows, min_ts, max_ts
-
-
-def run_sql_analysis(run_ts: datetime) -> int:
-    columns = [
-        row["column_name"]
-        for row in fetch_all(
-            """
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = 'flow_data'
-            ORDER BY ordinal_position;
-            """
-        )
-    ]
-
-    overall = fetch_one(
-        """
-        SELECT
-            MIN(timestamp) AS min_ts,
-            MAX(timestamp) AS max_ts,
-            COUNT(*) AS total_rows,
-            COUNT(*) FILTER (WHERE crowding_level IS NULL) AS null_crowding
-        FROM flow_data;
-        """
-    )
-
-    total_rows = overall["total_rows"]
-    if total_rows == 0:
-        report_path = REPORT_DIR / "phase1-data-quality-report.md"
-        report_path.write_text(
-            "# Phase 1 Data Analysis\n\n"
-            f"Run date (UTC): {fmt_dt(run_ts)}\n\n"
-            "No rows found in `flow_data`. Phase 1 cannot proceed until data is collected.\n"
-        )
-        print(f"Wrote report: {report_path}")
-        return 0
-
-    station_stats = fetch_all(
-        """
-        SELECT
-            station_code,
-            COUNT(*) AS rows,
-            MIN(timestamp) AS min_ts,
-            MAX(timestamp) AS max_ts,
-            COUNT(DISTINCT DATE(timestamp)) AS days_with_data,
-            COUNT(*) FILTER (WHERE crowding_level IS NULL) AS null_crowding
-        FROM flow_data
-        GROUP BY station_code
-        ORDER BY station_code;
-        """
-    )
-
-    coverage = fetch_all(
-        """
-        WITH bounds AS (SELECT MAX(timestamp) AS max_ts FROM flow_data),
-        hours AS (
-            SELECT station_code, date_trunc('hour', timestamp) AS hour_bucket
-            FROM flow_data, bounds
-            WHERE timestamp >= bounds.max_ts - interval '30 days'
-        )
-        SELECT
-            s.code AS station_code,
-            COUNT(DISTINCT h.hour_bucket) AS hours_with_data,
-            30*24 AS expected_hours,
-            ROUND(
-                100.0 * (1 - COALESCE(COUNT(DISTINCT h.hour_bucket), 0)::float / (30*24)),
-                2
-            ) AS missing_pct
-        FROM stations s
-        LEFT JOIN hours h ON h.station_code = s.code
-        GROUP BY s.code
-        ORDER BY missing_pct DESC, station_code;
-        """
-    )
-
-    overall_dist = fetch_all(
-        """
-        WITH bounds AS (SELECT MAX(timestamp) AS max_ts FROM flow_data)
-        SELECT crowding_level, COUNT(*) AS count
-        FROM flow_data, bounds
-        WHERE timestamp >= bounds.max_ts - interval '30 days'
-        GROUP BY crowding_level
-        ORDER BY crowding_level;
-        """
-    )
-
-    station_dist = fetch_all(
-        """
-        WITH bounds AS (SELECT MAX(timestamp) AS max_ts FROM flow_data),
-        recent AS (
-            SELECT station_code, crowding_level
-            FROM flow_data, bounds
-            WHERE timestamp >= bounds.max_ts - interval '30 days'
-        )
-        SELECT station_code, crowding_level, COUNT(*) AS count
-        FROM recent
-        GROUP BY station_code, crowding_level
-        ORDER BY station_code, crowding_level;
-        """
-    )
-
-    station_stats_map = {row["station_code"]: row for row in station_stats}
-    coverage_map = {row["station_code"]: row for row in coverage}
-
-    dist_map: Dict[str, Dict[str, int]] = {}
-    for row in station_dist:
-        dist_map.setdefault(row["station_code"], {})[row["crowding_level"] or "null"] = row["count"]
-
-    total_stations = len(station_stats)
-    stations_under_30 = []
-    stations_missing_over_20 = []
-    stations_ok = []
-    for station, stats in station_stats_map.items():
-        days_with_data = stats["days_with_data"] or 0
-        missing_pct = coverage_map.get(station, {}).get("missing_pct", 100.0)
-        if days_with_data < 30:
-            stations_under_30.append((station, days_with_data))
-        if missing_pct > 20:
-            stations_missing_over_20.append((station, missing_pct))
-        if days_with_data >= 30 and missing_pct <= 20:
-            stations_ok.append(station)
-
-    def sort_desc(items):
-        return sorted(items, key=lambda x: x[1], reverse=True)
-
-    stations_under_30 = sort_desc(stations_under_30)
-    stations_missing_over_20 = sort_desc(stations_missing_over_20)
-
-    # Top stations by high crowding share (last 30 days)
-    high_share = []
-    for station, counts in dist_map.items():
-        total = sum(counts.values())
-        if total == 0:
-            continue
-        high = counts.get("high", 0)
-        high_share.append((station, round(100.0 * high / total, 2), total))
-    high_share = sorted(high_share, key=lambda x: x[1], reverse=True)
-
-    # Export last 30 days of flow_data (selected columns)
-    export_cols = [
-        col
-        for col in [
-            "station_code",
-            "timestamp",
-            "crowding_level",
-            "next_train_minutes",
-            "train_frequency",
-            "line_code",
-            "is_delay",
-        ]
-        if col in columns
-    ]
-    export_path = EXPORT_DIR / "flow_data_last_30_days.csv.gz"
-    export_query = (
-        "COPY ("
-        "WITH bounds AS (SELECT MAX(timestamp) AS max_ts FROM flow_data) "
-        f"SELECT {', '.join(export_cols)} "
-        "FROM flow_data, bounds "
-        "WHERE timestamp >= bounds.max_ts - interval '30 days' "
-        "ORDER BY timestamp"
-        ") TO STDOUT WITH CSV HEADER"
-    )
-    write_csv_gz(export_query, export_path)
-
-    # Build report
+def write_empty_report(run_ts: datetime) -> int:
     report_path = REPORT_DIR / "phase1-data-quality-report.md"
-    overall_null_pct = (
-        round(100.0 * overall["null_crowding"] / total_rows, 2) if total_rows else 0.0
-    )
-
-    overall_dist_map = {row["crowding_level"] or "null": row["count"] for row in overall_dist}
-
-    lines = []
-    lines.append("# Phase 1 Data Analysis\n")
-    lines.append(f"Run date (UTC): {fmt_dt(run_ts)}\n")
-    lines.append("## Dataset Overview\n")
-    lines.append(f"- Total rows: {total_rows}\n")
-    lines.append(f"- Date range: {fmt_dt(overall['min_ts'])} → {fmt_dt(overall['max_ts'])}\n")
-    lines.append(f"- Distinct stations (flow_data): {total_stations}\n")
-    lines.append(
-        f"- Null `crowding_level`: {overall['null_crowding']} ({overall_null_pct}%)\n"
-    )
-    lines.append(f"- Columns in `flow_data`: {', '.join(columns)}\n")
-
-    lines.append("## 30-Day Coverage (Hourly Buckets)\n")
-    lines.append(
-        f"- Window: {fmt_dt(overall['max_ts'])} minus 30 days\n"
-    )
-    lines.append(f"- Stations meeting ≥30 days data AND ≤20% missing: {len(stations_ok)}\n")
-    lines.append(
-        f"- Stations <30 days of data: {len(stations_under_30)}\n"
-    )
-    if stations_under_30:
-        lines.append("\nTop stations with <30 days (by days with data):\n")
-        lines.append("| Station | Days with data |\n|---|---|\n")
-        for station, days in stations_under_30[:10]:
-            lines.append(f"| {station} | {days} |\n")
-    lines.append(
-        f"\n- Stations with >20% missing hours: {len(stations_missing_over_20)}\n"
-    )
-    if stations_missing_over_20:
-        lines.append("\nTop stations by missing % (last 30 days):\n")
-        lines.append("| Station | Missing % |\n|---|---|\n")
-        for station, pct in stations_missing_over_20[:10]:
-            lines.append(f"| {station} | {pct} |\n")
-
-    lines.append("\n## Crowding Distribution (Last 30 Days)\n")
-    lines.append("| Level | Count |\n|---|---|\n")
-    for level in ["low", "medium", "high", "null"]:
-        if level in overall_dist_map:
-            lines.append(f"| {level} | {overall_dist_map[level]} |\n")
-
-    lines.append("\nTop stations by `high` crowding share (last 30 days):\n")
-    lines.append("| Station | High % | Samples |\n|---|---|\n")
-    for station, pct, total in high_share[:10]:
-        lines.append(f"| {station} | {pct} | {total} |\n")
-
-    lines.append("\n## Export\n")
-    lines.append(
-        f"- Exported last 30 days to `{export_path.relative_to(ROOT)}` "
-        f"(columns: {', '.join(export_cols)})\n"
+    report_path.write_text(
+        "# Phase 1 Data Analysis\n\n"
+        f"Run date (UTC): {fmt_dt(run_ts)}\n\n"
+        "No rows found in `flow_data`. Phase 1 cannot proceed until data is collected.\n"
     )
-
-    report_path.write_text("".join(lines))
     print(f"Wrote report: {report_path}")
     return 0
 
 
-def run_supabase_analysis(run_ts: datetime, client: SupabaseRestClient) -> int:
-    total_rows, min_ts, max_ts = supabase_report(client)
-    null_crowding = client.count("flow_data", {"crowding_level": "is.null"})
+def fetch_shard(
+    client: SupabaseRestClient,
+    start: datetime,
+    end: datetime,
+    page_size: int,
+) -> Tuple[int, Dict[str, list]]:
+    """
+    Fetch one time shard of flow_data. Returns the row count and the rows
+    as raw column lists for the columnar store.
+    """
+    records: Dict[str, list] = {name: [] for name in STORE_FIELDS}
+    rows = 0
+    for page in client.iter_time_range("flow_data", start, end, page_size=page_size):
+        for row in page:
+            rows += 1
+            if not row.get("station_code") or not row.get("timestamp"):
+                continue
+            for name in STORE_FIELDS:
+                records[name].append(row.get(name))
+            records["timestamp"][-1] = parse_ts(row["timestamp"])
+    return rows, records
+
+
+def sync_from_db(store: FlowStore, state: ReportState, start: datetime) -> int:
+    """Stream rows past the watermark (or from `start` on a first run) from Postgres."""
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set")
 
-    if total_rows == 0 or not max_ts:
-        report_path = REPORT_DIR / "phase1-data-quality-report.md"
-        report_path.write_text(
-            "# Phase 1 Data Analysis\n\n"
-            f"Run date (UTC): {fmt_dt(run_ts)}\n\n"
-            "No rows found in `flow_data`. Phase 1 cannot proceed until data is collected.\n"
-        )
-        print(f"Wrote report: {report_path}")
-        return 0
+    if state.watermark_ts is not None:
+        condition = "(timestamp, id) > (%s, %s)"
+        params: tuple = (from_us(state.watermark_ts), state.watermark_id)
+    else:
+        condition = "timestamp >= %s"
+        params = (start,)
 
-    stations = client.fetch_all(
-        "stations",
-        {"select": "code", "order": "code.asc"},
-        page_size=1000,
-    )
-    station_codes = [row["code"] for row in stations if row.get("code")]
+    merged = 0
+    with psycopg2.connect(DATABASE_URL) as conn:
+        with conn.cursor(name="phase1_sync") as cur:
+            cur.itersize = 50000
+            cur.execute(
+                f"SELECT {', '.join(STORE_FIELDS)} FROM flow_data "
+                f"WHERE {condition} AND station_code IS NOT NULL "
+                "ORDER BY timestamp, id",
+                params,
+            )
+            while True:
+                rows = cur.fetchmany(200000)
+                if not rows:
+                    break
+                records = dict(zip(STORE_FIELDS, map(list, zip(*rows))))
+                columns = store.columns_from_records(records)
+                store.write(columns)
+                merged += state.merge(columns, store.stations)
+    return merged
+
+
+def sync_from_supabase(
+    client: SupabaseRestClient,
+    store: FlowStore,
+    state: ReportState,
+    start: datetime,
+    end: datetime,
+    shards: int,
+    page_size: int,
+) -> int:
+    """
+    Fetch rows past the watermark (or from `start` on a first run) over the
+    REST API, split into equal time shards fetched concurrently. Each shard
+    is written to the store as soon as it arrives; the report aggregates
+    merge shards in order, so the watermark only ever moves forward and
+    only shards finished ahead of an earlier one wait, as typed columns.
+    """
+    if state.watermark_ts is not None:
+        # Rows sharing the watermark timestamp are re-fetched and skipped by merge()
+        start = from_us(state.watermark_ts)
+    if start >= end:
+        return 0
 
-    window_start = max_ts - timedelta(days=30)
-    window_start_str = window_start.isoformat()
-
-    desired_cols = [
-        "station_code",
-        "timestamp",
-        "crowding_level",
-        "next_train_minutes",
-        "train_frequency",
-        "line_code",
-        "is_delay",
+    shard_span = (end - start) / shards
+    bounds = [
+        (start + shard_span * i, end if i == shards - 1 else start + shard_span * (i + 1))
+        for i in range(shards)
     ]
 
-    export_path = EXPORT_DIR / "flow_data_last_30_days.csv.gz"
-    export_cols: Optional[List[str]] = None
-    fields_set: set[str] = set()
-
-    station_days: Dict[str, set] = {code: set() for code in station_codes}
-    station_hours: Dict[str, set] = {code: set() for code in station_codes}
-    station_dist: Dict[str, Dict[str, int]] = {
-        code: {"low": 0, "medium": 0, "high": 0, "null": 0} for code in station_codes
-    }
-    station_rows: Dict[str, int] = {code: 0 for code in station_codes}
-    station_null: Dict[str, int] = {code: 0 for code in station_codes}
-
-    overall_dist: Dict[str, int] = {"low": 0, "medium": 0, "high": 0, "null": 0}
-
-    def ensure_station(code: str) -> None:
-        if code not in station_days:
-            station_days[code] = set()
-            station_hours[code] = set()
-            station_dist[code] = {"low": 0, "medium": 0, "high": 0, "null": 0}
-            station_rows[code] = 0
-            station_null[code] = 0
-
-    window_count = client.count("flow_data", {"timestamp": f"gte.{window_start_str}"})
-
-    with gzip.open(export_path, "wt", newline="") as gz:
+    fetch_started = time.monotonic()
+    fetched_rows = 0
+    merged = 0
+    pending: Dict[int, Dict[str, np.ndarray]] = {}
+    next_shard = 0
+    with ThreadPoolExecutor(max_workers=shards) as pool:
+        futures = {
+            pool.submit(fetch_shard, client, shard_start, shard_end, page_size): shard
+            for shard, (shard_start, shard_end) in enumerate(bounds)
+        }
+        for future in as_completed(futures):
+            # Drop the future and the raw rows once they are encoded
+            shard = futures.pop(future)
+            rows, records = future.result()
+            fetched_rows += rows
+            columns = store.columns_from_records(records)
+            del future, records
+            store.write(columns)
+            pending[shard] = columns
+            while next_shard in pending:
+                merged += state.merge(pending.pop(next_shard), store.stations)
+                next_shard += 1
+    fetch_elapsed = time.monotonic() - fetch_started
+
+    rate = fetched_rows / fetch_elapsed if fetch_elapsed else 0.0
+    print(
+        f"Fetched {fetched_rows} rows in {fetch_elapsed:.1f}s "
+        f"({rate:,.0f} rows/s, {shards} shards)"
+    )
+    return merged
+
+
+def write_export(
+    store: FlowStore,
+    start: datetime,
+    end: datetime,
+    export_path: Path,
+    after: Optional[Tuple[int, int]] = None,
+) -> None:
+    """
+    Write the window as CSV (sorted by timestamp) from the columnar store.
+    With `after`, a (timestamp, id) watermark, only later rows are appended
+    to the existing export as a new gzip member, without a header.
+    """
+    if after is not None:
+        start = max(start, from_us(after[0]))
+    columns = store.load(start, end)
+    if after is not None:
+        ts, ids = columns["timestamp"], columns["id"]
+        fresh = (ts > after[0]) | ((ts == after[0]) & (ids > after[1]))
+        columns = {name: values[fresh] for name, values in columns.items()}
+    stations = np.array(store.stations, dtype=object)
+    lines = np.array([line or None for line in store.lines], dtype=object)
+    timestamps = np.datetime_as_string(columns["timestamp"].astype("datetime64[us]"), timezone="UTC")
+    crowding = np.array(CROWDING_LEVELS[:-1] + [None], dtype=object)
+
+    def floats(values: np.ndarray) -> list:
+        return [None if np.isnan(value) else value for value in values.tolist()]
+
+    with gzip.open(export_path, "wt" if after is None else "at", newline="") as gz:
         writer = csv.writer(gz)
-
-        offset = 0
-        page_size = 1000
-        while offset < window_count:
-            params = {
-                "select": "*",
-                "order": "timestamp.asc",
-                "timestamp": f"gte.{window_start_str}",
-                "limit": page_size,
-                "offset": offset,
-            }
-            response = client.get("flow_data", params=params)
-            page = response.json()
-            if not page:
-                break
-
-            for row in page:
-                fields_set.update(row.keys())
-                if export_cols is None:
-                    export_cols = [c for c in desired_cols if c in row] or sorted(row.keys())
-                    writer.writerow(export_cols)
-
-                if export_cols:
-                    writer.writerow([row.get(col, "") for col in export_cols])
-
-                station_code = row.get("station_code")
-                if not station_code:
-                    continue
-                ensure_station(station_code)
-                station_rows[station_code] += 1
-
-                level = row.get("crowding_level") or "null"
-                if level not in overall_dist:
-                    level = "null"
-                overall_dist[level] += 1
-                station_dist[station_code][level] += 1
-                if level == "null":
-                    station_null[station_code] += 1
-
-                ts_val = row.get("timestamp")
-                if not ts_val:
-                    continue
-                ts = parse_ts(ts_val)
-                station_days[station_code].add(ts.date())
-                station_hours[station_code].add(ts.replace(minute=0, second=0, microsecond=0))
-
-            offset += len(page)
-
-        if export_cols is None:
-            export_cols = desired_cols
-            writer.writerow(export_cols)
-
+        if after is None:
+            writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(zip(
+            stations[columns["station"]],
+            timestamps,
+            crowding[columns["crowding"]],
+            floats(columns["next_train"]),
+            floats(columns["headway"]),
+            lines[columns["line"]],
+            columns["is_delay"].tolist(),
+        ))
+
+
+def write_report(
+    run_ts: datetime,
+    state: ReportState,
+    station_codes: List[str],
+    columns: List[str],
+    export_path: Path,
+) -> None:
+    stats = state.window(days=30)
     if not station_codes:
-        station_codes = list(station_days.keys())
+        station_codes = sorted(stats)
 
     total_stations = len(station_codes)
     expected_hours = 30 * 24
+    empty = {"rows": 0, "null": 0, "days": 0, "hours": 0, "dist": dict.fromkeys(CROWDING_LEVELS, 0)}
+
+    overall_dist: Dict[str, int] = dict.fromkeys(CROWDING_LEVELS, 0)
+    for station_stats in stats.values():
+        for level, count in station_stats["dist"].items():
+            overall_dist[level] += count
 
     stations_under_30 = []
     stations_missing_over_20 = []
     stations_ok = []
     for station in station_codes:
-        days_with_data = len(station_days.get(station, set()))
-        hours_with_data = len(station_hours.get(station, set()))
-        missing_pct = round(100.0 * (1 - (hours_with_data / expected_hours)), 2)
+        station_stats = stats.get(station, empty)
+        days_with_data = station_stats["days"]
+        missing_pct = round(100.0 * (1 - (station_stats["hours"] / expected_hours)), 2)
         if days_with_data < 30:
             stations_under_30.append((station, days_with_data))
         if missing_pct > 20:
@@ -511,8 +421,10 @@ def run_supabase_analysis(run_ts: datetime, client: SupabaseRestClient) -> int:
     stations_under_30 = sort_desc(stations_under_30)
     stations_missing_over_20 = sort_desc(stations_missing_over_20)
 
+    # Top stations by high crowding share (last 30 days)
     high_share = []
-    for station, counts in station_dist.items():
+    for station, station_stats in stats.items():
+        counts = station_stats["dist"]
         total = sum(counts.values())
         if total == 0:
             continue
@@ -520,17 +432,17 @@ def run_supabase_analysis(run_ts: datetime, client: SupabaseRestClient) -> int:
         high_share.append((station, round(100.0 * high / total, 2), total))
     high_share = sorted(high_share, key=lambda x: x[1], reverse=True)
 
-    columns = sorted(fields_set) if fields_set else desired_cols
-
-    report_path = REPORT_DIR / "phase1-data-quality-report.md"
+    total_rows = state.total_rows
+    null_crowding = state.null_rows
     overall_null_pct = round(100.0 * null_crowding / total_rows, 2) if total_rows else 0.0
 
+    report_path = REPORT_DIR / "phase1-data-quality-report.md"
     lines = []
     lines.append("# Phase 1 Data Analysis\n")
     lines.append(f"Run date (UTC): {fmt_dt(run_ts)}\n")
     lines.append("## Dataset Overview\n")
-    lines.append(f"- Total rows: {total_rows}\n")
-    lines.append(f"- Date range: {fmt_dt(min_ts)} → {fmt_dt(max_ts)}\n")
+    lines.append(f"- Total rows (processed since {fmt_dt(state.first_ts)}): {total_rows}\n")
+    lines.append(f"- Date range: {fmt_dt(state.first_ts)} → {fmt_dt(state.last_ts)}\n")
     lines.append(f"- Distinct stations (stations table): {total_stations}\n")
     lines.append(
         f"- Null `crowding_level`: {null_crowding} ({overall_null_pct}%)\n"
@@ -538,7 +450,7 @@ def run_supabase_analysis(run_ts: datetime, client: SupabaseRestClient) -> int:
     lines.append(f"- Columns in `flow_data`: {', '.join(columns)}\n")
 
     lines.append("## 30-Day Coverage (Hourly Buckets)\n")
-    lines.append(f"- Window: {fmt_dt(max_ts)} minus 30 days\n")
+    lines.append(f"- Window: {fmt_dt(state.last_ts)} minus 30 days\n")
     lines.append(f"- Stations meeting ≥30 days data AND ≤20% missing: {len(stations_ok)}\n")
     lines.append(f"- Stations <30 days of data: {len(stations_under_30)}\n")
     if stations_under_30:
@@ -566,17 +478,137 @@ def run_supabase_analysis(run_ts: datetime, client: SupabaseRestClient) -> int:
 
     lines.append("\n## Export\n")
     lines.append(
-        f"- Exported last 30 days to `{export_path.relative_to(ROOT)}` "
-        f"(columns: {', '.join(export_cols or desired_cols)})\n"
+        f"- Exported to `{export_path.relative_to(ROOT)}` "
+        f"(columns: {', '.join(EXPORT_COLUMNS)}): the last 30 days as of the last "
+        "--full run, with new rows appended by every run since\n"
     )
 
     report_path.write_text("".join(lines))
     print(f"Wrote report: {report_path}")
+
+
+def finish_run(
+    run_ts: datetime,
+    store: FlowStore,
+    state: ReportState,
+    merged: int,
+    started: float,
+    station_codes: List[str],
+    columns: List[str],
+    since: Optional[Tuple[int, int]],
+) -> int:
+    state.save(STATE_PATH)
+    print(
+        f"Merged {merged} new rows in {time.monotonic() - started:.1f}s "
+        f"(watermark: {fmt_dt(state.last_ts)})"
+    )
+    if state.last_ts is None:
+        return write_empty_report(run_ts)
+
+    export_path = EXPORT_DIR / "flow_data_last_30_days.csv.gz"
+    window_end = state.last_ts + timedelta(microseconds=1)
+    window_start = state.last_ts - timedelta(days=30)
+    # The full window is only rewritten by --full (or a first run);
+    # incremental runs append the rows they merged
+    if since is None or not export_path.exists():
+        write_export(store, window_start, window_end, export_path)
+    elif merged:
+        write_export(store, window_start, window_end, export_path, after=since)
+    write_report(run_ts, state, station_codes, columns, export_path)
     return 0
 
 
+def run_sql_analysis(run_ts: datetime, state: ReportState) -> int:
+    started = time.monotonic()
+    since = state.watermark
+    columns = [
+        row["column_name"]
+        for row in fetch_all(
+            """
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'flow_data'
+            ORDER BY ordinal_position;
+            """
+        )
+    ]
+    max_ts = fetch_one("SELECT MAX(timestamp) AS max_ts FROM flow_data;")["max_ts"]
+    if not max_ts and state.last_ts is None:
+        return write_empty_report(run_ts)
+
+    station_codes = [row["code"] for row in fetch_all("SELECT code FROM stations ORDER BY code;")]
+
+    store = FlowStore()
+    merged = 0
+    if max_ts:
+        merged = sync_from_db(store, state, max_ts - timedelta(days=30))
+    return finish_run(run_ts, store, state, merged, started, station_codes, columns, since)
+
+
+def run_supabase_analysis(
+    run_ts: datetime,
+    client: SupabaseRestClient,
+    state: ReportState,
+    shards: int = DEFAULT_SHARDS,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> int:
+    started = time.monotonic()
+    since = state.watermark
+    max_row = client.fetch_first(
+        "flow_data",
+        {"select": "*", "order": "timestamp.desc", "limit": 1},
+    )
+    if not max_row and state.last_ts is None:
+        return write_empty_report(run_ts)
+
+    stations = client.fetch_all(
+        "stations",
+        {"select": "code"},
+        key="code",
+    )
+    station_codes = [row["code"] for row in stations if row.get("code")]
+
+    store = FlowStore()
+    merged = 0
+    columns: List[str] = []
+    if max_row:
+        columns = sorted(max_row.keys())
+        max_ts = parse_ts(max_row["timestamp"])
+        merged = sync_from_supabase(
+            client,
+            store,
+            state,
+            max_ts - timedelta(days=30),
+            max_ts + timedelta(microseconds=1),
+            shards,
+            page_size,
+        )
+    return finish_run(run_ts, store, state, merged, started, station_codes, columns, since)
+
+
 def main() -> int:
+    parser = argparse.ArgumentParser(description="Phase 1 data export and quality report.")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=DEFAULT_SHARDS,
+        help="Concurrent time shards for the Supabase REST export (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help="Rows per REST request (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Discard the saved watermark and rebuild from the last 30 days",
+    )
+    args = parser.parse_args()
+
     run_ts = datetime.now(timezone.utc)
+    state = ReportState() if args.full else ReportState.load(STATE_PATH)
 
     use_db = False
     if engine:
@@ -588,14 +620,14 @@ def main() -> int:
             use_db = False
 
     if use_db:
-        return run_sql_analysis(run_ts)
+        return run_sql_analysis(run_ts, state)
 
     key = SUPABASE_SERVICE_ROLE_KEY or SUPABASE_PUBLISHABLE_KEY
     if not SUPABASE_URL or not key:
         raise SystemExit("No DB connection and no Supabase credentials available.")
 
-    client = SupabaseRestClient(SUPABASE_URL, key)
-    return run_supabase_analysis(run_ts, client)
+    client = SupabaseRestClient(SUPABASE_URL, key, pool_size=args.shards)
+    return run_supabase_analysis(run_ts, client, state, shards=args.shards, page_size=args.page_size)
 
 
 if __name__ == "__main__":
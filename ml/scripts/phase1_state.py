@@ -0,0 +1,207 @@
+"""
+Persisted incremental state for the phase-1 data-quality report.
+
+Holds a (timestamp, id) watermark of the last processed flow_data row and
+per-station partial aggregates: seen UTC day and hour buckets as bitmaps
+and crowding counts per day. Each run merges only rows past the
+watermark, so the report is regenerated without rescanning flow_data.
+Rows that arrive late with a timestamp behind the watermark are not
+picked up; run with --full to rebuild.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from flow_store import CROWDING_LEVELS, CROWDING_NULL, US_PER_DAY, US_PER_HOUR, from_us
+
+ML_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_STATE_PATH = ML_ROOT / "data" / "phase1_state.npz"
+
+
+class ReportState:
+    """
+    Aggregates are indexed by station (in `stations` order) and by day or
+    hour since `origin_day`, the first UTC day seen:
+
+        hour_bits   bool   [station, hour]   hour bucket has data
+        day_bits    bool   [station, day]    day has data
+        day_counts  uint32 [station, day, 4] rows per crowding level
+    """
+
+    def __init__(self) -> None:
+        self.watermark_ts: Optional[int] = None
+        self.watermark_id = -1
+        self.origin_day: Optional[int] = None
+        self.min_ts: Optional[int] = None
+        self.max_ts: Optional[int] = None
+        self.stations: List[str] = []
+        self.hour_bits = np.zeros((0, 0), dtype=bool)
+        self.day_bits = np.zeros((0, 0), dtype=bool)
+        self.day_counts = np.zeros((0, 0, len(CROWDING_LEVELS)), dtype=np.uint32)
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_STATE_PATH) -> "ReportState":
+        state = cls()
+        if not path.exists():
+            return state
+
+        with np.load(path, allow_pickle=False) as data:
+            meta = data["meta"]
+            if meta[0] >= 0:
+                state.watermark_ts, state.watermark_id, state.origin_day, state.min_ts, state.max_ts = (
+                    int(value) for value in meta
+                )
+            state.stations = data["stations"].tolist()
+            n_days = data["day_counts"].shape[1]
+            state.day_counts = data["day_counts"]
+            state.day_bits = np.unpackbits(data["day_bits"], axis=1, count=n_days).astype(bool)
+            state.hour_bits = np.unpackbits(data["hour_bits"], axis=1, count=n_days * 24).astype(bool)
+        return state
+
+    def save(self, path: Path = DEFAULT_STATE_PATH) -> None:
+        # Write-then-rename so a crash never leaves a truncated state file
+        meta = (
+            [self.watermark_ts, self.watermark_id, self.origin_day, self.min_ts, self.max_ts]
+            if self.watermark_ts is not None
+            else [-1] * 5
+        )
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                meta=np.array(meta, dtype=np.int64),
+                stations=np.array(self.stations, dtype=str),
+                day_counts=self.day_counts,
+                day_bits=np.packbits(self.day_bits, axis=1),
+                hour_bits=np.packbits(self.hour_bits, axis=1),
+            )
+        os.replace(tmp_path, path)
+
+    @property
+    def watermark(self) -> Optional[Tuple[int, int]]:
+        """(timestamp, id) of the last processed row, None before the first."""
+        if self.watermark_ts is None:
+            return None
+        return self.watermark_ts, self.watermark_id
+
+    @property
+    def total_rows(self) -> int:
+        return int(self.day_counts.sum())
+
+    @property
+    def null_rows(self) -> int:
+        return int(self.day_counts[:, :, CROWDING_NULL].sum())
+
+    @property
+    def first_ts(self) -> Optional[datetime]:
+        return from_us(self.min_ts) if self.min_ts is not None else None
+
+    @property
+    def last_ts(self) -> Optional[datetime]:
+        return from_us(self.max_ts) if self.max_ts is not None else None
+
+    def _resize(self, n_stations: int, n_days: int, shift_days: int = 0) -> None:
+        """Grow the aggregates, shifting existing days right by shift_days."""
+        old_stations, old_days = self.day_counts.shape[:2]
+        if (n_stations, n_days, shift_days) == (old_stations, old_days, 0):
+            return
+
+        def grown(array: np.ndarray, per_day: int) -> np.ndarray:
+            shape = (n_stations, n_days * per_day) + array.shape[2:]
+            out = np.zeros(shape, dtype=array.dtype)
+            start = shift_days * per_day
+            out[:old_stations, start:start + array.shape[1]] = array
+            return out
+
+        self.day_counts = grown(self.day_counts, 1)
+        self.day_bits = grown(self.day_bits, 1)
+        self.hour_bits = grown(self.hour_bits, 24)
+
+    def merge(self, columns: Dict[str, np.ndarray], station_names: List[str]) -> int:
+        """
+        Merge flow_store columns (station codes index `station_names`) and
+        advance the watermark. Rows at or behind the watermark are skipped.
+        Returns the number of rows merged.
+        """
+        ts = columns["timestamp"]
+        ids = columns["id"]
+        if self.watermark_ts is not None:
+            fresh = (ts > self.watermark_ts) | ((ts == self.watermark_ts) & (ids > self.watermark_id))
+            if not fresh.all():
+                columns = {name: values[fresh] for name, values in columns.items()}
+                ts = columns["timestamp"]
+                ids = columns["id"]
+        if not len(ts):
+            return 0
+
+        index = {name: idx for idx, name in enumerate(self.stations)}
+        lookup = np.zeros(len(station_names), dtype=np.int64)
+        for code in np.unique(columns["station"]):
+            name = station_names[code]
+            if name not in index:
+                index[name] = len(self.stations)
+                self.stations.append(name)
+            lookup[code] = index[name]
+        station = lookup[columns["station"]]
+
+        day = ts // US_PER_DAY
+        first_day = int(day.min())
+        shift = 0
+        if self.origin_day is None:
+            self.origin_day = first_day
+        elif first_day < self.origin_day:
+            shift = self.origin_day - first_day
+            self.origin_day = first_day
+        day = day - self.origin_day
+        hour = ts // US_PER_HOUR - self.origin_day * 24
+
+        n_stations = len(self.stations)
+        n_days = max(self.day_counts.shape[1] + shift, int(day.max()) + 1)
+        self._resize(n_stations, n_days, shift)
+
+        self.day_bits[station, day] = True
+        self.hour_bits[station, hour] = True
+        n_levels = len(CROWDING_LEVELS)
+        counts = np.bincount(
+            (station * n_days + day) * n_levels + columns["crowding"],
+            minlength=n_stations * n_days * n_levels,
+        )
+        self.day_counts += counts.reshape(n_stations, n_days, n_levels).astype(np.uint32)
+
+        last = np.lexsort((ids, ts))[-1]
+        self.watermark_ts = int(ts[last])
+        self.watermark_id = int(ids[last])
+        self.min_ts = int(ts.min()) if self.min_ts is None else min(self.min_ts, int(ts.min()))
+        self.max_ts = int(ts.max()) if self.max_ts is None else max(self.max_ts, int(ts.max()))
+        return len(ts)
+
+    def window(self, days: int = 30) -> Dict[str, Dict]:
+        """
+        Per-station aggregates over the `days` UTC days (and days * 24 hour
+        buckets) ending with the latest processed row, keyed by station code.
+        """
+        if self.max_ts is None:
+            return {}
+        end_day = self.max_ts // US_PER_DAY - self.origin_day
+        end_hour = self.max_ts // US_PER_HOUR - self.origin_day * 24
+        day_slice = slice(max(0, end_day - days + 1), end_day + 1)
+        hour_slice = slice(max(0, end_hour - days * 24 + 1), end_hour + 1)
+
+        dist = self.day_counts[:, day_slice].sum(axis=1, dtype=np.int64)
+        days_seen = self.day_bits[:, day_slice].sum(axis=1)
+        hours_seen = self.hour_bits[:, hour_slice].sum(axis=1)
+        return {
+            code: {
+                "rows": int(dist[idx].sum()),
+                "null": int(dist[idx, CROWDING_NULL]),
+                "days": int(days_seen[idx]),
+                "hours": int(hours_seen[idx]),
+                "dist": dict(zip(CROWDING_LEVELS, dist[idx].tolist())),
+            }
+            for idx, code in enumerate(self.stations)
+        }